@@ -0,0 +1,280 @@
+# Load-test and latency benchmark for the compile API
+#
+# Starts the backend in a uvicorn subprocess, drives each scenario at rising
+# concurrency levels and prints a JSON report. Run from the backend directory:
+#
+#   python -m benchmarks.compile_bench --fake-typst --concurrency 1,4,16 --output bench.json
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fixtures import resume_payload
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+FAKE_TYPST = Path(__file__).resolve().parent / "fake_typst.py"
+
+# (method, path, body, headers) for request number i
+RequestFactory = Callable[[int], Tuple[str, str, Optional[bytes], Dict[str, str]]]
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))
+    return ordered[rank]
+
+def scenarios(template: str, unique: bool) -> Dict[str, RequestFactory]:
+    """Request factories per endpoint; with unique=True every request defeats the cache."""
+    main_typ = (BACKEND_DIR.parent / "templates" / template / "main.typ").read_text()
+
+    def compile_request(index: int):
+        content = main_typ + (f"\n// request {index}\n" if unique else "")
+        body = urlencode({"content": content}).encode()
+        return "POST", f"/templates/{template}/compile", body, {"Content-Type": "application/x-www-form-urlencoded"}
+
+    def compile_json_request(index: int):
+        body = json.dumps(resume_payload(index if unique else 0, template)).encode()
+        return "POST", f"/templates/{template}/compile-json", body, {"Content-Type": "application/json"}
+
+    def preview_request(index: int):
+        return "GET", f"/templates/{template}/preview", None, {}
+
+    def list_request(index: int):
+        return "GET", "/templates/", None, {}
+
+    return {
+        "compile": compile_request,
+        "compile-json": compile_json_request,
+        "preview": preview_request,
+        "templates": list_request,
+    }
+
+class ProcessSampler:
+    """Samples the server's peak RSS and its typst child processes from /proc (Linux only)."""
+
+    def __init__(self, pid: int, interval: float = 0.01):
+        self.pid = pid
+        self.interval = interval
+        self.peak_children = 0
+        self.seen_children = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "ProcessSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def peak_rss_kb(self) -> Optional[int]:
+        try:
+            for line in Path(f"/proc/{self.pid}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+        except OSError:
+            pass
+        return None
+
+    def _children(self) -> List[int]:
+        children = []
+        for task in Path(f"/proc/{self.pid}/task").glob("*/children"):
+            try:
+                children.extend(int(pid) for pid in task.read_text().split())
+            except OSError:
+                continue
+        return children
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                children = self._children()
+            except OSError:
+                return
+            self.peak_children = max(self.peak_children, len(children))
+            self.seen_children.update(children)
+            self._stop.wait(self.interval)
+
+def run_level(port: int, factory: RequestFactory, concurrency: int, requests: int,
+              first_index: int = 0) -> Dict[str, Any]:
+    """Send `requests` requests with `concurrency` keep-alive clients and collect timings."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    bytes_received = 0
+    lock = threading.Lock()
+    # Request indices keep growing across levels so unique documents stay unique
+    counter = iter(range(first_index, first_index + requests))
+
+    def worker():
+        nonlocal bytes_received
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            method, path, body, headers = factory(index)
+            started = time.perf_counter()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+                bytes_received += len(payload)
+        connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "bytes_received": bytes_received,
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Backend exited during startup")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Backend did not start in time")
+
+def start_backend(port: int, env: Dict[str, str], log_file) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+    )
+
+def fake_typst_env(workdir: Path, delay: float) -> Dict[str, str]:
+    """Put a `typst` shim that runs fake_typst.py first on PATH."""
+    bin_dir = workdir / "bin"
+    bin_dir.mkdir()
+    shim = bin_dir / "typst"
+    shim.write_text(f"#!/bin/sh\nexec {sys.executable} {FAKE_TYPST} \"$@\"\n")
+    shim.chmod(0o755)
+    return {
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "FAKE_TYPST_DELAY": str(delay),
+        "FAKE_TYPST_COUNTER": str(workdir / "typst-invocations.log"),
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Flash Resume compile API.")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="requests per scenario and level")
+    parser.add_argument("--scenarios", default="compile,compile-json,preview,templates")
+    parser.add_argument("--template", default="minimal-1")
+    parser.add_argument("--cached", action="store_true", help="repeat identical documents instead of unique ones")
+    parser.add_argument("--fake-typst", action="store_true", help="use benchmarks/fake_typst.py instead of typst")
+    parser.add_argument("--fake-delay", type=float, default=0.05, help="seconds per fake compile")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--server-log", help="keep the backend's log in this file (discarded by default)")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+    selected = [name for name in args.scenarios.split(",") if name]
+    factories = scenarios(args.template, unique=not args.cached)
+    unknown = set(selected) - set(factories)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="flash-resume-bench-") as tmp:
+        workdir = Path(tmp)
+        # Every benchmark client shares one address, so per-client rate limits are off
+        env = {**os.environ, "PYTHONUNBUFFERED": "1", "FLASH_RESUME_PRECOMPUTE_THUMBNAILS": "0",
+               "FLASH_RESUME_COMPILES_PER_MINUTE": "0"}
+        if args.fake_typst:
+            env.update(fake_typst_env(workdir, args.fake_delay))
+        invocation_log = workdir / "typst-invocations.log"
+
+        port = free_port()
+        log_file = open(args.server_log or workdir / "server.log", "w")
+        backend = start_backend(port, env, log_file)
+        next_index = 0
+        report: Dict[str, Any] = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "typst": "fake" if args.fake_typst else "system",
+            "template": args.template,
+            "cached": args.cached,
+            "requests_per_level": args.requests,
+            "results": [],
+        }
+        try:
+            wait_until_up(port, backend)
+            for name in selected:
+                for level in levels:
+                    before = len(invocation_log.read_text().splitlines()) if invocation_log.exists() else 0
+                    with ProcessSampler(backend.pid) as sampler:
+                        result = run_level(port, factories[name], level, args.requests, next_index)
+                    next_index += args.requests
+                    result["scenario"] = name
+                    result["subprocesses"] = {
+                        "peak_concurrent": sampler.peak_children,
+                        "spawned_observed": len(sampler.seen_children),
+                    }
+                    if invocation_log.exists():
+                        result["subprocesses"]["typst_invocations"] = len(invocation_log.read_text().splitlines()) - before
+                    result["server_peak_rss_kb"] = sampler.peak_rss_kb()
+                    report["results"].append(result)
+                    print(f"{name:>13} c={level:<3} p50={result['latency_ms']['p50']}ms "
+                          f"p99={result['latency_ms']['p99']}ms {result['throughput_rps']} req/s",
+                          file=sys.stderr)
+        finally:
+            backend.terminate()
+            backend.wait(timeout=10)
+            log_file.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# Stand-in for the typst CLI so the API can be benchmarked without a real toolchain.
+#
+# Supports `--version`, `fonts`, `compile` (and its `--help`) and `watch` with the arguments the backend
+# passes. Output is a tiny but valid PDF (or PNG/SVG) whose size scales with the input.
+# Set FAKE_TYPST_DELAY (seconds) to emulate compile time and FAKE_TYPST_COUNTER to a file
+# path to have every compile append a line to it.
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+from pathlib import Path
+from typing import Optional
+
+VALUE_OPTIONS = {"--root", "--format", "--pages", "--ppi", "--font-path", "--input", "--timings"}
+
+def minimal_pdf(text: str) -> bytes:
+    stream = f"BT /F1 10 Tf 72 720 Td ({len(text)} bytes of source) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.7\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+def minimal_png() -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff")) + chunk(b"IEND", b"")
+
+def parse(args):
+    options, positional = {}, []
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg.startswith("--") and "=" in arg:
+            name, value = arg.split("=", 1)
+            options[name] = value
+            index += 1
+        elif arg in VALUE_OPTIONS:
+            options[arg] = args[index + 1]
+            index += 2
+        elif arg.startswith("--"):
+            options[arg] = True
+            index += 1
+        else:
+            positional.append(arg)
+            index += 1
+    return options, positional
+
+def write_timings(path: str, delay: float):
+    # Same shape as typst's Chrome trace: nested begin/end pairs in microseconds
+    phases = [("eval", 0.3), ("layout", 0.6), ("export", 0.1)]
+    events = [{"name": "compile", "ph": "B", "ts": 0, "pid": 1, "tid": 1}]
+    now = 0.0
+    for name, share in phases:
+        events.append({"name": name, "ph": "B", "ts": now, "pid": 1, "tid": 1})
+        now += delay * share * 1e6
+        events.append({"name": name, "ph": "E", "ts": now, "pid": 1, "tid": 1})
+    events.append({"name": "compile", "ph": "E", "ts": now, "pid": 1, "tid": 1})
+    Path(path).write_text(json.dumps(events))
+
+def write_output(source: Path, output: str, output_format: str, timings: Optional[str] = None):
+    text = source.read_text()
+    delay = float(os.environ.get("FAKE_TYPST_DELAY", "0.05"))
+    time.sleep(delay)
+    if timings:
+        write_timings(timings, delay)
+    counter = os.environ.get("FAKE_TYPST_COUNTER")
+    if counter:
+        with open(counter, "a") as handle:
+            handle.write(f"{os.getpid()}\n")
+    output = output.replace("{p}", "1").replace("{0p}", "1")
+    if output_format == "png":
+        Path(output).write_bytes(minimal_png())
+    elif output_format == "svg":
+        Path(output).write_text('<svg xmlns="http://www.w3.org/2000/svg" width="1" height="1"/>')
+    else:
+        Path(output).write_bytes(minimal_pdf(text))
+
+def main(args) -> int:
+    if args[:1] == ["--version"]:
+        print("typst 0.13.1 (fake)")
+        return 0
+    if args[:1] == ["fonts"]:
+        print("New Computer Modern\nLibertinus Serif\nDejaVu Sans Mono")
+        return 0
+    if args[:1] == ["compile"] and "--help" in args:
+        print("  -f, --format <FORMAT>  The format of the output file [possible values: pdf, png, svg]")
+        return 0
+    if not args or args[0] not in ("compile", "c", "watch", "w"):
+        print(f"error: unsupported fake typst invocation: {args}", file=sys.stderr)
+        return 2
+
+    options, positional = parse(args[1:])
+    source = Path(positional[0])
+    output = positional[1] if len(positional) > 1 else str(source.with_suffix(".pdf"))
+    output_format = options.get("--format") or Path(output).suffix.lstrip(".") or "pdf"
+
+    if args[0] in ("compile", "c"):
+        write_output(source, output, output_format, options.get("--timings"))
+        return 0
+
+    last_mtime = None
+    while True:
+        mtime = source.stat().st_mtime_ns
+        if mtime != last_mtime:
+            last_mtime = mtime
+            write_output(source, output, output_format)
+            print("[00:00:00] compiled successfully in 1ms", file=sys.stderr, flush=True)
+        time.sleep(0.01)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
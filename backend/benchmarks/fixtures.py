@@ -0,0 +1,73 @@
+# Realistic ResumeData payloads for benchmarking
+
+import copy
+from typing import Any, Dict
+
+BASE_RESUME: Dict[str, Any] = {
+    "personalInfo": {
+        "firstname": "Alex",
+        "lastname": "Johnson",
+        "email": "alex.johnson@techcorp.com",
+        "homepage": "https://alexjohnson.tech",
+        "phone": "(+1) 555-123-4567",
+        "github": "alexjohnson-ml",
+        "linkedin": "alexjohnsontech",
+        "address": "456 Innovation Drive, San Francisco, CA 94105",
+        "positions": ["Senior ML Engineer", "Research Scientist"],
+    },
+    "theme": "minimal-1",
+    "sections": [
+        {
+            "type": "education",
+            "title": "Education",
+            "items": [
+                {
+                    "type": "education",
+                    "data": {
+                        "school": "Stanford University",
+                        "degree": "M.S. in Computer Science (Machine Learning)",
+                        "date": "August 2015 - May 2017",
+                        "location": "Stanford, CA",
+                        "gpa": "3.9/4.0",
+                    },
+                }
+            ],
+        },
+        {
+            "type": "experience",
+            "title": "Experience",
+            "items": [
+                {
+                    "type": "experience",
+                    "data": {
+                        "company": f"Company {index}",
+                        "position": "Machine Learning Engineer",
+                        "date": f"{2010 + index} - {2011 + index}",
+                        "location": "San Francisco, CA",
+                        "description": [
+                            "Architected and deployed scalable ML pipelines processing 10M+ daily transactions",
+                            "Led a cross-functional team of 8 engineers to ship a real-time recommendation system",
+                            "Reduced model deployment time from weeks to hours using Kubernetes and Docker",
+                        ],
+                    },
+                }
+                for index in range(6)
+            ],
+        },
+        {
+            "type": "skills",
+            "title": "Skills",
+            "items": [
+                {"type": "skill", "data": {"category": "Languages", "skills": "Python, C++, Go, Rust, TypeScript"}},
+                {"type": "skill", "data": {"category": "ML", "skills": "PyTorch, JAX, XGBoost, Ray, MLflow"}},
+            ],
+        },
+    ],
+}
+
+def resume_payload(variant: int = 0, template: str = "minimal-1") -> Dict[str, Any]:
+    """A resume that differs per variant, so distinct variants never share a cache entry."""
+    payload = copy.deepcopy(BASE_RESUME)
+    payload["theme"] = template
+    payload["personalInfo"]["firstname"] = f"Alex {variant}"
+    return payload
@@ -0,0 +1,171 @@
+# Cold-start benchmark: import-time profile and time until the backend is ready
+#
+# Profiles `import main` with `python -X importtime`, then starts uvicorn and measures
+# how long the instance takes to listen, to report ready on /health/ready and to
+# serve its first preview. Run from the backend directory:
+#
+#   python -m benchmarks.startup_bench --fake-typst --runs 5 --output startup.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import http.client
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.compile_bench import BACKEND_DIR, fake_typst_env, free_port, start_backend
+
+# Module prefixes that belong to this backend rather than its dependencies
+OWN_PACKAGES = ("main", "models", "routes", "services", "utils")
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) per line of `-X importtime` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def import_profile(env: Dict[str, str], top: int) -> Dict[str, Any]:
+    """Profile one `import main` in a fresh interpreter."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - started
+    modules = parse_importtime(result.stderr)
+    by_package: Dict[str, int] = {}
+    for name, self_us, _ in modules:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    own = {package: us for package, us in by_package.items() if package in OWN_PACKAGES}
+    return {
+        "interpreter_wall_ms": round(wall * 1000, 1),
+        "import_main_ms": round(next((cumulative for name, _, cumulative in modules if name == "main"), 0) / 1000, 1),
+        "own_code_ms": round(sum(own.values()) / 1000, 1),
+        "by_package_ms": {package: round(us / 1000, 1)
+                          for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]},
+        "slowest_modules_ms": {name: round(self_us / 1000, 1)
+                               for name, self_us, _ in sorted(modules, key=lambda item: -item[1])[:top]},
+    }
+
+def get(port: int, path: str) -> Tuple[int, bytes]:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+def time_to_ready(env: Dict[str, str], template: str, timeout: float, log_path: Path) -> Dict[str, Any]:
+    """Start the backend and time it until it listens, reports ready and serves a preview."""
+    port = free_port()
+    with open(log_path, "a") as log_file:
+        started = time.perf_counter()
+        backend = start_backend(port, env, log_file)
+        marks: Dict[str, Optional[float]] = {"listening": None, "ready": None}
+        try:
+            deadline = started + timeout
+            while time.perf_counter() < deadline and marks["ready"] is None:
+                if backend.poll() is not None:
+                    raise RuntimeError("Backend exited during startup")
+                try:
+                    status, _ = get(port, "/health/ready")
+                except OSError:
+                    time.sleep(0.01)
+                    continue
+                if marks["listening"] is None:
+                    marks["listening"] = time.perf_counter() - started
+                if status == 200:
+                    marks["ready"] = time.perf_counter() - started
+                else:
+                    time.sleep(0.01)
+
+            preview_ms = None
+            _, readiness = get(port, "/health/ready")
+            if marks["ready"] is not None:
+                first = time.perf_counter()
+                get(port, f"/templates/{template}/preview")
+                preview_ms = round((time.perf_counter() - first) * 1000, 1)
+        finally:
+            backend.terminate()
+            backend.wait(timeout=10)
+
+    return {
+        "listening_ms": round(marks["listening"] * 1000, 1) if marks["listening"] is not None else None,
+        "ready_ms": round(marks["ready"] * 1000, 1) if marks["ready"] is not None else None,
+        "first_preview_ms": preview_ms,
+        "readiness": json.loads(readiness),
+    }
+
+def summarize(samples: List[Optional[float]]) -> Dict[str, Optional[float]]:
+    values = [sample for sample in samples if sample is not None]
+    if not values:
+        return {"median": None, "min": None, "max": None}
+    return {"median": round(statistics.median(values), 1), "min": min(values), "max": max(values)}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Flash Resume cold starts.")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--top", type=int, default=15, help="modules and packages listed in the profile")
+    parser.add_argument("--template", default="minimal-1", help="template previewed once the instance is ready")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for readiness per run")
+    parser.add_argument("--no-precompile", action="store_true", help="skip precompiling previews at startup")
+    parser.add_argument("--fake-typst", action="store_true", help="use benchmarks/fake_typst.py instead of typst")
+    parser.add_argument("--fake-delay", type=float, default=0.05, help="seconds per fake compile")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="flash-resume-startup-") as tmp:
+        workdir = Path(tmp)
+        env = {
+            **os.environ,
+            "PYTHONUNBUFFERED": "1",
+            "FLASH_RESUME_PRECOMPUTE_THUMBNAILS": "0" if args.no_precompile else "1",
+            # A fresh cache per run, so every start pays for its own warm-up
+            "FLASH_RESUME_CACHE_DIR": "",
+        }
+        if args.fake_typst:
+            env.update(fake_typst_env(workdir, args.fake_delay))
+
+        # The first interpreter writes bytecode caches; later runs measure a normal deploy
+        import_profile(env, args.top)
+        profiles = [import_profile(env, args.top) for _ in range(args.runs)]
+        starts = [time_to_ready(env, args.template, args.timeout, workdir / "server.log") for _ in range(args.runs)]
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "typst": "fake" if args.fake_typst else "system",
+        "runs": args.runs,
+        "precompile": not args.no_precompile,
+        "import_main_ms": summarize([profile["import_main_ms"] for profile in profiles]),
+        "own_code_ms": summarize([profile["own_code_ms"] for profile in profiles]),
+        "listening_ms": summarize([start["listening_ms"] for start in starts]),
+        "ready_ms": summarize([start["ready_ms"] for start in starts]),
+        "first_preview_ms": summarize([start["first_preview_ms"] for start in starts]),
+        # The median run's details
+        "import_profile": sorted(profiles, key=lambda profile: profile["import_main_ms"])[len(profiles) // 2],
+        "readiness": starts[-1]["readiness"],
+    }
+    print(f"import main {report['import_main_ms']['median']}ms, listening {report['listening_ms']['median']}ms, "
+          f"ready {report['ready_ms']['median']}ms, first preview {report['first_preview_ms']['median']}ms",
+          file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,83 @@
 # Flash Resume - Modular Typst Compiler API
 # Refactored for better maintainability and separation of concerns
 
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 
+from services.batch_compiler import BatchCompiler
+from services.client_scheduler import ClientScheduler, ClientSchedulerMiddleware, parse_weights
+from services.compile_pool import CompilePool
+from services.compile_workspace import default_scratch_root
+from services.font_index import FontIndex
+from services.health import ReadinessCheck, TypstProbe
+from services.job_queue import JobQueue, create_job_store
+from services.metrics import MetricsMiddleware, MetricsRegistry
+from services.pdf_cache import PDFCache
+from services.template_bundle import TemplateBundler
 from services.template_service import TemplateService
 from services.typst_compiler import TypstCompiler
+from services.variant_compiler import VariantCompiler
+from services.preset_service import PresetService
+from services.warmup import StartupWarmup
+from services.watch_pool import TypstWatchPool
 from routes.template_routes import create_template_router
 from routes.legacy_routes import create_legacy_router
-from utils.helpers import setup_logging
+from routes.batch_routes import create_batch_router
+from routes.health_routes import create_health_router
+from routes.job_routes import create_job_router
+from routes.metrics_routes import create_metrics_router
+from routes.preview_routes import create_preview_router
+from routes.preset_routes import create_preset_router
+from utils.helpers import env_int, setup_logging
 
 # Setup logging
 setup_logging()
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    typst_probe.start()
+    template_service.start()
+    # Set FLASH_RESUME_PRECOMPUTE_THUMBNAILS=0 to skip precompiling previews and thumbnails
+    warmup_task = asyncio.create_task(warmup.run(precompile=bool(env_int("FLASH_RESUME_PRECOMPUTE_THUMBNAILS", 1))))
+    # Set to 0 when jobs are run by a separate `python worker.py` process
+    job_queue.start(env_int("FLASH_RESUME_JOB_WORKERS", compile_pool.max_concurrency))
+    yield
+    await job_queue.close()
+    await typst_probe.close()
+    await template_service.close()
+    warmup_task.cancel()
+    await asyncio.gather(warmup_task, return_exceptions=True)
+    if watch_pool is not None:
+        await watch_pool.close()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Flash Resume - Typst Compiler API", 
     version="2.0.0",
-    description="Modular resume generation API with template support"
+    description="Modular resume generation API with template support",
+    lifespan=lifespan
+)
+
+# Per-client compile budgets and fair shares; FLASH_RESUME_COMPILES_PER_MINUTE=0 disables the limits.
+# Added first so it runs inside CORS and metrics, which then see and decorate its 429s.
+client_scheduler = ClientScheduler(
+    rate=env_int("FLASH_RESUME_COMPILES_PER_MINUTE", 120) / 60,
+    burst=env_int("FLASH_RESUME_COMPILE_BURST", 30),
+    cached_cost=env_int("FLASH_RESUME_CACHED_COST_PCT", 5) / 100,
+    weights=parse_weights(os.environ.get("FLASH_RESUME_CLIENT_WEIGHTS")),
+    trust_forwarded=bool(env_int("FLASH_RESUME_TRUST_FORWARDED", 0)),
+    # Comma-separated keys whose X-API-Key gets its own budget; other clients are keyed by address
+    api_keys=[key.strip() for key in os.environ.get("FLASH_RESUME_API_KEYS", "").split(",") if key.strip()],
+    max_sessions=env_int("FLASH_RESUME_PREVIEW_SESSIONS_PER_CLIENT", 4)
 )
+app.add_middleware(ClientSchedulerMiddleware, scheduler=client_scheduler)
 
 # Add CORS middleware
 app.add_middleware(
@@ -28,16 +86,145 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Cache", "Content-Range", "Accept-Ranges", "Server-Timing", "Retry-After"],
 )
 
+# Per-request stage timings (Server-Timing header) and the /metrics registry
+metrics_registry = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+
 # Initialize services
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
-template_service = TemplateService(TEMPLATES_DIR)
-typst_compiler = TypstCompiler(TEMPLATES_DIR)
+# Multi-worker deployments (see serve.py) treat templates/ as read-only
+template_service = TemplateService(TEMPLATES_DIR, read_only=bool(env_int("FLASH_RESUME_TEMPLATES_READ_ONLY", 0)))
+preset_service = PresetService(TEMPLATES_DIR / "presets", template_service)
+compile_pool = CompilePool(
+    max_concurrency=env_int("FLASH_RESUME_COMPILE_CONCURRENCY", os.cpu_count() or 2),
+    max_queue=env_int("FLASH_RESUME_COMPILE_QUEUE", 32),
+    timeout=env_int("FLASH_RESUME_COMPILE_TIMEOUT", 30),
+    scheduler=client_scheduler
+)
+CACHE_DIR = os.environ.get("FLASH_RESUME_CACHE_DIR")
+pdf_cache = PDFCache(
+    max_memory_bytes=env_int("FLASH_RESUME_CACHE_MB", 64) * 1024 * 1024,
+    disk_dir=Path(CACHE_DIR) if CACHE_DIR else None,
+    max_item_bytes=env_int("FLASH_RESUME_CACHE_ITEM_MB", 8) * 1024 * 1024,
+    max_disk_bytes=env_int("FLASH_RESUME_CACHE_DISK_MB", 1024) * 1024 * 1024
+)
+# Optional warm-process backend for live preview sessions ("oneshot" or "watch")
+COMPILER_BACKEND = os.environ.get("FLASH_RESUME_COMPILER_BACKEND", "oneshot")
+watch_pool = None
+if COMPILER_BACKEND == "watch":
+    watch_pool = TypstWatchPool(
+        max_processes=env_int("FLASH_RESUME_WATCH_MAX_PROCESSES", 4),
+        idle_timeout=env_int("FLASH_RESUME_WATCH_IDLE_TIMEOUT", 300),
+        timeout=env_int("FLASH_RESUME_COMPILE_TIMEOUT", 30)
+    )
+# Fonts the templates use, passed to typst instead of scanning system fonts on every run
+font_index = FontIndex(TEMPLATES_DIR) if env_int("FLASH_RESUME_FONT_INDEX", 1) else None
+# Read-only content-hashed copies of the templates on tmpfs, shared by every compile workspace
+template_bundler = TemplateBundler() if env_int("FLASH_RESUME_TEMPLATE_BUNDLES", 1) else None
+typst_compiler = TypstCompiler(
+    TEMPLATES_DIR,
+    compile_pool,
+    cache=pdf_cache,
+    watch_pool=watch_pool,
+    template_service=template_service,
+    typst_timings=bool(env_int("FLASH_RESUME_TYPST_TIMINGS", 0)),
+    font_index=font_index,
+    bundler=template_bundler
+)
+warmup = StartupWarmup(template_service, typst_compiler, font_index, lock_dir=pdf_cache.disk_dir,
+                       preset_service=preset_service)
+batch_compiler = BatchCompiler(
+    template_service,
+    typst_compiler,
+    max_items=env_int("FLASH_RESUME_BATCH_MAX_ITEMS", 1000)
+)
+variant_compiler = VariantCompiler(
+    template_service,
+    typst_compiler,
+    max_variants=env_int("FLASH_RESUME_MAX_VARIANTS", 32)
+)
+
+# Asynchronous compile jobs; FLASH_RESUME_JOB_STORE is an SQLite path to share jobs between processes
+job_queue = JobQueue(
+    create_job_store(os.environ.get("FLASH_RESUME_JOB_STORE")),
+    template_service,
+    typst_compiler,
+    results_dir=Path(os.environ.get("FLASH_RESUME_JOB_DIR") or default_scratch_root() / "jobs"),
+    result_ttl=env_int("FLASH_RESUME_JOB_RESULT_TTL", 600),
+    max_queued=env_int("FLASH_RESUME_JOB_MAX_QUEUED", 1000),
+    stale_after=4 * compile_pool.timeout
+)
+
+# Health endpoints read a periodically refreshed typst probe instead of spawning typst per request
+typst_probe = TypstProbe(refresh_interval=env_int("FLASH_RESUME_TYPST_PROBE_INTERVAL", 60))
+readiness = ReadinessCheck(
+    typst_probe,
+    compile_pool,
+    pdf_cache,
+    job_queue,
+    warmup,
+    max_saturation=env_int("FLASH_RESUME_READY_MAX_SATURATION_PCT", 90) / 100,
+    scheduler=client_scheduler
+)
+
+# Service state read at scrape time
+metrics_registry.callback("compile_queue_depth", "Compiles waiting for a pool slot.",
+                          lambda: compile_pool.waiting)
+metrics_registry.callback("compile_active", "Typst processes currently running.",
+                          lambda: compile_pool.active)
+metrics_registry.callback("compile_max_concurrency", "Configured compile pool size.",
+                          lambda: compile_pool.max_concurrency)
+metrics_registry.callback(
+    "compiles_total", "Typst compiles by outcome.",
+    lambda: {outcome: count for outcome, count in compile_pool.stats().items()
+             if outcome in ("completed", "failed", "timed_out", "rejected", "cancelled")},
+    metric_type="counter", label_name="outcome"
+)
+metrics_registry.callback("cache_lookups_total", "Compile cache lookups by result.",
+                          lambda: {"hit": pdf_cache.hits, "miss": pdf_cache.misses},
+                          metric_type="counter", label_name="result")
+metrics_registry.callback("cache_memory_bytes", "Bytes held by the in-memory cache tier.",
+                          lambda: pdf_cache.memory_bytes)
+metrics_registry.callback("cache_entries", "Entries in the in-memory cache tier.",
+                          lambda: pdf_cache.stats()["entries"])
+metrics_registry.callback("cache_disk_bytes", "Bytes in the disk cache tier, as last counted by this process.",
+                          lambda: pdf_cache.disk_bytes)
+metrics_registry.callback("cache_disk_evictions_total", "Disk cache entries removed to stay within budget.",
+                          lambda: pdf_cache.disk_evictions, metric_type="counter")
+metrics_registry.callback("client_requests_total", "Compile-endpoint charges admitted, by cost kind.",
+                          lambda: dict(client_scheduler.admitted), metric_type="counter", label_name="kind")
+metrics_registry.callback("client_rate_limited_total", "Requests and preview sessions rejected with 429, by kind.",
+                          lambda: dict(client_scheduler.limited), metric_type="counter", label_name="kind")
+metrics_registry.callback("client_buckets", "Clients with a tracked rate budget.",
+                          lambda: client_scheduler.stats()["clients"])
+metrics_registry.callback("compile_backlogged_clients", "Clients with compiles waiting for a pool slot.",
+                          lambda: compile_pool.stats()["backlogged_clients"])
+metrics_registry.callback("jobs", "Compile jobs by status.",
+                          lambda: {status: count for status, count in job_queue.stats().items() if status != "workers"},
+                          label_name="status")
+if watch_pool is not None:
+    metrics_registry.callback("watch_sessions", "Live-preview sessions with a warm typst process.",
+                              lambda: watch_pool.stats()["sessions"])
 
 # Include routers
-app.include_router(create_template_router(template_service, typst_compiler))
-app.include_router(create_legacy_router(template_service, typst_compiler, TEMPLATES_DIR))
+app.include_router(create_metrics_router(metrics_registry))
+app.include_router(create_health_router(readiness))
+app.include_router(create_batch_router(batch_compiler, variant_compiler, client_scheduler))
+app.include_router(create_job_router(job_queue))
+app.include_router(create_template_router(template_service, typst_compiler, preset_service))
+app.include_router(create_preset_router(preset_service))
+app.include_router(create_preview_router(
+    template_service,
+    typst_compiler,
+    debounce=env_int("FLASH_RESUME_PREVIEW_DEBOUNCE_MS", 300) / 1000,
+    scheduler=client_scheduler,
+    # Longest a revision waits for a pause in typing before it is compiled anyway
+    max_wait=env_int("FLASH_RESUME_PREVIEW_MAX_WAIT_MS", 2000) / 1000
+))
+app.include_router(create_legacy_router(template_service, typst_compiler, TEMPLATES_DIR, warmup, typst_probe))
 
 if __name__ == "__main__":
     import uvicorn
@@ -27,10 +27,64 @@ class ResumeSection(BaseModel):
     title: str
     items: List[ResumeSectionItem]
 
+# Per-request changes layered over a template's conf.json; nothing is written to disk
+class TemplateOverrides(BaseModel):
+    style: Dict[str, Any] = {}
+    formatting: Dict[str, Any] = {}
+    features: Dict[str, Any] = {}
+    advanced: Dict[str, Any] = {}
+    output: Dict[str, Any] = {}
+
 class ResumeData(BaseModel):
     personalInfo: PersonalInfo
     sections: List[ResumeSection]
     theme: str
+    overrides: Optional[TemplateOverrides] = None
+
+class BatchCompileItem(BaseModel):
+    template: str
+    resume: ResumeData
+    filename: Optional[str] = None
+
+class BatchCompileRequest(BaseModel):
+    items: List[BatchCompileItem]
+
+# Letter text for "coverletter" variants, rendered with the candidate's personal info
+class CoverLetter(BaseModel):
+    job_position: str = ""
+    addressee: str = ""
+    dear: str = ""
+    paragraphs: List[str] = []
+
+# One document of a variants compile; the template defaults to the resume's theme
+class CompileVariant(BaseModel):
+    template: Optional[str] = None
+    language: Optional[str] = None
+    kind: str = "resume"
+    filename: Optional[str] = None
+
+class VariantsRequest(BaseModel):
+    resume: ResumeData
+    coverLetter: Optional[CoverLetter] = None
+    variants: List[CompileVariant]
+
+# A compile submitted to the job queue: JSON resume data or Typst source for one template
+class JobRequest(BaseModel):
+    template: str
+    resume: Optional[ResumeData] = None
+    content: Optional[str] = None
+    overrides: Optional[TemplateOverrides] = None
+    priority: str = "bulk"
+
+# One revision of a document sent over a live-preview WebSocket: either JSON resume data or Typst source
+class PreviewUpdate(BaseModel):
+    revision: Optional[int] = None
+    resume: Optional[ResumeData] = None
+    content: Optional[str] = None
+    overrides: Optional[TemplateOverrides] = None
+    format: str = "pdf"
+    page: int = 1
+    ppi: int = 72
 
 class TemplateStyle(BaseModel):
     primary_font: str = "New Computer Modern"
@@ -66,6 +120,13 @@ class TemplateAdvanced(BaseModel):
     justify_text: bool = False
     hyphenation: bool = False
 
+# Optional post-processing of compile inputs and outputs; everything is off by default
+class TemplateOutput(BaseModel):
+    optimize_images: bool = False
+    max_image_px: int = 600
+    image_quality: int = 85
+    compress_previews: bool = False
+
 class TemplateConfig(BaseModel):
     name: str
     displayName: str
@@ -77,3 +138,4 @@ class TemplateConfig(BaseModel):
     formatting: TemplateFormatting
     features: TemplateFeatures
     advanced: TemplateAdvanced
+    output: TemplateOutput = TemplateOutput()
@@ -0,0 +1,41 @@
+# API routes for bulk compilation
+
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from services.batch_compiler import BatchCompiler
+from services.client_scheduler import ClientScheduler
+from services.variant_compiler import VariantCompiler
+from models import BatchCompileRequest, VariantsRequest
+
+def create_batch_router(batch_compiler: BatchCompiler, variant_compiler: VariantCompiler,
+                        scheduler: Optional[ClientScheduler] = None) -> APIRouter:
+    router = APIRouter(prefix="/templates", tags=["batch"])
+
+    @router.post("/batch-compile")
+    async def batch_compile(batch: BatchCompileRequest):
+        """Compile many resume × template pairs and stream the PDFs back as a ZIP."""
+        batch_compiler.validate(batch.items)
+        if scheduler is not None:
+            # Paid once for every item, before streaming starts, rather than per compile
+            scheduler.charge_bulk(len(batch.items))
+        return StreamingResponse(
+            batch_compiler.stream_zip(batch.items),
+            media_type="application/zip",
+            headers={"Content-Disposition": "attachment; filename=resumes.zip"}
+        )
+
+    @router.post("/compile-variants")
+    async def compile_variants(request: VariantsRequest):
+        """Compile one resume in several languages, document kinds and templates, returned as a ZIP."""
+        variant_compiler.validate(request)
+        if scheduler is not None:
+            scheduler.charge_bulk(len(request.variants))
+        return StreamingResponse(
+            variant_compiler.stream_zip(request),
+            media_type="application/zip",
+            headers={"Content-Disposition": "attachment; filename=variants.zip"}
+        )
+
+    return router
@@ -0,0 +1,22 @@
+# API routes for liveness and readiness probes
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from services.health import ReadinessCheck
+
+def create_health_router(readiness: ReadinessCheck) -> APIRouter:
+    router = APIRouter(prefix="/health", tags=["health"])
+
+    @router.get("/live")
+    async def liveness():
+        """The process is up and serving requests; never touches typst."""
+        return {"status": "alive"}
+
+    @router.get("/ready")
+    async def readiness_check():
+        """503 while typst is unavailable, warm-up runs or the instance is overloaded."""
+        ready, report = readiness.report()
+        return JSONResponse(report, status_code=200 if ready else 503)
+
+    return router
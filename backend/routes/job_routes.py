@@ -0,0 +1,62 @@
+# API routes for asynchronous compile jobs
+
+import json
+import time
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+
+from services.job_queue import TERMINAL_STATUSES, JobQueue
+from models import JobRequest
+
+# Longest a status request may be held open
+MAX_WAIT_SECONDS = 30
+
+def create_job_router(job_queue: JobQueue) -> APIRouter:
+    router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+    @router.post("", status_code=202)
+    async def submit_job(job_request: JobRequest):
+        """Queue a compile and return its job ID immediately."""
+        if (job_request.resume is None) == (job_request.content is None):
+            raise HTTPException(status_code=422, detail="Send exactly one of 'resume' or 'content'")
+        payload = job_request.model_dump(include={"resume", "content", "overrides"}, exclude_none=True)
+        job = await job_queue.submit(job_request.template, payload, job_request.priority)
+        return JSONResponse(job.to_dict(), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+    @router.get("/{job_id}")
+    async def get_job(job_id: str, wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS)):
+        """Job status; with `wait`, hold the request until the job finishes or the wait runs out."""
+        job = await job_queue.wait(job_id, wait) if wait else await job_queue.get(job_id)
+        return job.to_dict()
+
+    @router.get("/{job_id}/events")
+    async def job_events(job_id: str):
+        """Server-sent events with the job's status on every change, until it finishes."""
+        await job_queue.get(job_id)
+
+        async def events():
+            last_status = None
+            deadline = time.monotonic() + MAX_WAIT_SECONDS * 10
+            while time.monotonic() < deadline:
+                job = await job_queue.find(job_id)
+                if job is None:
+                    return
+                if job.status != last_status:
+                    last_status = job.status
+                    yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+                if job.status in TERMINAL_STATUSES:
+                    return
+                await job_queue.wait_for_update(job_queue.poll_interval)
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @router.get("/{job_id}/result")
+    async def get_job_result(job_id: str):
+        """The finished job's PDF."""
+        return FileResponse(
+            await job_queue.result_path(job_id),
+            media_type="application/pdf",
+            headers={"Content-Disposition": f"inline; filename={job_id}.pdf"}
+        )
+
+    return router
@@ -1,13 +1,18 @@
 # Legacy API routes for backward compatibility
 
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, Request
 from pathlib import Path
+from typing import Optional
 
 from services.template_service import TemplateService
+from services.health import TypstProbe
 from services.typst_compiler import TypstCompiler
+from services.warmup import StartupWarmup
 from utils.helpers import check_typst_availability
 
-def create_legacy_router(template_service: TemplateService, typst_compiler: TypstCompiler, templates_dir: Path) -> APIRouter:
+def create_legacy_router(template_service: TemplateService, typst_compiler: TypstCompiler, templates_dir: Path,
+                         warmup: Optional[StartupWarmup] = None,
+                         typst_probe: Optional[TypstProbe] = None) -> APIRouter:
     router = APIRouter(tags=["legacy"])
     
     @router.get("/")
@@ -15,10 +20,10 @@ def create_legacy_router(template_service: TemplateService, typst_compiler: Typs
         return {"message": "Flash Resume Typst Compiler API", "status": "running"}
     
     @router.post("/compile")
-    async def legacy_compile(content: str = Form(...)):
+    async def legacy_compile(request: Request, content: str = Form(...)):
         """Legacy compile endpoint - uses minimal-1 template by default."""
         config = template_service.get_template_config("minimal-1")
-        return typst_compiler.compile_template("minimal-1", content, config)
+        return await typst_compiler.compile_template("minimal-1", content, config, request)
     
     @router.get("/template-content")
     async def legacy_get_template_content():
@@ -102,24 +107,29 @@ hyphenation = {str(config.advanced.hyphenation).lower()}
         return {"message": "Config updates are read-only in the new template system"}
     
     @router.post("/compile-template-direct")
-    async def legacy_compile_direct():
+    async def legacy_compile_direct(request: Request):
         """Legacy direct compilation endpoint."""
         config = template_service.get_template_config("minimal-1")
         content = template_service.get_template_content("minimal-1")
-        return typst_compiler.compile_template("minimal-1", content, config)
+        return await typst_compiler.compile_template("minimal-1", content, config, request)
     
     @router.get("/health")
     async def health_check():
         """Health check endpoint."""
         try:
-            typst_available, typst_version = check_typst_availability()
+            # The background probe's last result, so polling this never spawns typst
+            if typst_probe is not None and typst_probe.checked_at is not None:
+                typst_available, typst_version = typst_probe.available, typst_probe.version or typst_probe.error
+            else:
+                typst_available, typst_version = await check_typst_availability()
             
             return {
                 "status": "healthy" if typst_available else "unhealthy",
                 "typst_available": typst_available,
                 "typst_version": typst_version,
                 "templates_dir": str(templates_dir),
-                "templates_exist": templates_dir.exists()
+                "templates_exist": templates_dir.exists(),
+                "warmup": warmup.report() if warmup is not None else None
             }
         except Exception as e:
             return {
@@ -0,0 +1,20 @@
+# API routes for style presets
+
+from fastapi import APIRouter
+
+from services.preset_service import PresetService
+
+def create_preset_router(preset_service: PresetService) -> APIRouter:
+    router = APIRouter(prefix="/presets", tags=["presets"])
+
+    @router.get("/")
+    async def get_all_presets():
+        """Get every style preset; pass its name as `preset` to compile, preview and render routes."""
+        return {"presets": preset_service.get_all_presets()}
+
+    @router.get("/{preset_name}")
+    async def get_preset(preset_name: str):
+        """Get one preset's suggested template and the overrides it applies."""
+        return {"preset": preset_service.get_preset(preset_name)}
+
+    return router
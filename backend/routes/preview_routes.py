@@ -0,0 +1,69 @@
+# WebSocket routes for live preview
+
+import json
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from models import PreviewUpdate
+from services.client_scheduler import ClientScheduler, client_context
+from services.preview_session import PreviewSession
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+
+logger = logging.getLogger(__name__)
+
+def create_preview_router(template_service: TemplateService, typst_compiler: TypstCompiler,
+                          debounce: float = 0.3, scheduler: Optional[ClientScheduler] = None,
+                          max_wait: Optional[float] = 2.0) -> APIRouter:
+    router = APIRouter(prefix="/templates", tags=["preview"])
+
+    @router.websocket("/{template_name}/live")
+    async def live_preview(websocket: WebSocket, template_name: str):
+        """Live preview: send document revisions as JSON, receive metadata followed by the compiled bytes."""
+        await websocket.accept()
+        if not template_service.template_exists(template_name):
+            await websocket.send_json({"type": "error", "status": 404, "detail": f"Template '{template_name}' not found"})
+            await websocket.close(code=1008)
+            return
+
+        client = scheduler.identify(websocket.scope) if scheduler is not None else None
+        if client is not None and not scheduler.open_session(client):
+            await websocket.send_json({"type": "error", "status": 429,
+                                       "detail": "Too many live preview sessions, close one and retry"})
+            await websocket.close(code=1008)
+            return
+
+        async def send(message: Dict[str, Any], document: Optional[bytes]):
+            await websocket.send_json(message)
+            if document is not None:
+                await websocket.send_bytes(document)
+
+        session = PreviewSession(template_service, typst_compiler, template_name, send, debounce, max_wait)
+        # Every revision that is compiled is charged to the client and queued in its lane;
+        # superseded and cached revisions cost nothing
+        with client_context(client):
+            runner = asyncio.create_task(session.run())
+        try:
+            while True:
+                raw = await websocket.receive_text()
+                try:
+                    session.submit(PreviewUpdate(**json.loads(raw)))
+                except (json.JSONDecodeError, TypeError, ValidationError) as e:
+                    await websocket.send_json({"type": "error", "status": 422, "detail": f"Invalid update: {e}"})
+                if runner.done():
+                    # Sending failed, so the client is gone
+                    break
+        except WebSocketDisconnect:
+            pass
+        finally:
+            runner.cancel()
+            # Before awaiting, as the handler itself may be cancelled when the connection drops
+            if client is not None:
+                scheduler.close_session(client)
+            await asyncio.gather(runner, return_exceptions=True)
+            logger.info(f"Live preview for template {template_name} closed: {session.stats()}")
+
+    return router
@@ -1,13 +1,15 @@
 # API routes for template management
 
-from fastapi import APIRouter, HTTPException, Form
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Form, Query, Request
+from typing import List, Dict, Any, Optional
 
-from services.template_service import TemplateService
-from services.typst_compiler import TypstCompiler
+from services.preset_service import PresetService
+from services.template_service import TemplateService, parse_overrides
+from services.typst_compiler import DEFAULT_PPI, TypstCompiler
 from models import ResumeData
 
-def create_template_router(template_service: TemplateService, typst_compiler: TypstCompiler) -> APIRouter:
+def create_template_router(template_service: TemplateService, typst_compiler: TypstCompiler,
+                           preset_service: PresetService) -> APIRouter:
     router = APIRouter(prefix="/templates", tags=["templates"])
     
     @router.get("/")
@@ -41,16 +43,18 @@ def create_template_router(template_service: TemplateService, typst_compiler: Ty
         }
     
     @router.post("/{template_name}/compile")
-    async def compile_template(template_name: str, content: str = Form(...)):
-        """Compile a specific template with custom content."""
-        config = template_service.get_template_config(template_name)
-        return typst_compiler.compile_template(template_name, content, config)
+    async def compile_template(template_name: str, request: Request, content: str = Form(...),
+                               overrides: Optional[str] = Form(None), preset: Optional[str] = Form(None)):
+        """Compile a specific template with custom content, an optional preset and JSON style overrides."""
+        config = preset_service.get_effective_config(template_name, preset, parse_overrides(overrides))
+        return await typst_compiler.compile_template(template_name, content, config, request)
     
     @router.post("/{template_name}/compile-json")
-    async def compile_json_resume(template_name: str, resume_data: ResumeData):
-        """Compile a resume from JSON data using the specified template."""
-        config = template_service.get_template_config(template_name)
-        return typst_compiler.compile_json_resume(template_name, resume_data, config)
+    async def compile_json_resume(template_name: str, resume_data: ResumeData, request: Request,
+                                  preset: Optional[str] = None):
+        """Compile a resume from JSON data using the specified template and optional preset."""
+        config = preset_service.get_effective_config(template_name, preset, resume_data.overrides)
+        return await typst_compiler.compile_json_resume(template_name, resume_data, config, request)
     
     @router.put("/{template_name}/config")
     async def update_template_config(template_name: str, updated_config: Dict[str, Any]):
@@ -58,10 +62,22 @@ def create_template_router(template_service: TemplateService, typst_compiler: Ty
         return template_service.update_template_config(template_name, updated_config)
     
     @router.get("/{template_name}/preview")
-    async def preview_template(template_name: str):
+    async def preview_template(template_name: str, request: Request, overrides: Optional[str] = None,
+                               preset: Optional[str] = None):
         """Generate a preview PDF using the template's default content and configuration."""
-        config = template_service.get_template_config(template_name)
+        config = preset_service.get_effective_config(template_name, preset, parse_overrides(overrides))
+        content = template_service.get_template_content(template_name)
+        return await typst_compiler.compile_template(template_name, content, config, request)
+    
+    @router.get("/{template_name}/render")
+    async def render_template_page(template_name: str, request: Request,
+                                   page: int = Query(1, ge=1),
+                                   format: str = Query("png", pattern="^(png|svg)$"),
+                                   ppi: int = Query(DEFAULT_PPI, ge=8, le=600),
+                                   overrides: Optional[str] = None, preset: Optional[str] = None):
+        """Render one page of the template's default content as a PNG or SVG image."""
+        config = preset_service.get_effective_config(template_name, preset, parse_overrides(overrides))
         content = template_service.get_template_content(template_name)
-        return typst_compiler.compile_template(template_name, content, config)
+        return await typst_compiler.render_page(template_name, content, config, page, format, ppi, request)
     
     return router
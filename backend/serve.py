@@ -0,0 +1,59 @@
+# Flash Resume - multi-worker entry point
+#
+# Runs the API in several uvicorn worker processes so compiles can use every core:
+#
+#   python serve.py --workers 4 --port 8000
+#
+# Workers share a content-addressed on-disk compile cache and treat templates/ as
+# read-only. Under gunicorn, export the variables printed at startup and run
+#
+#   gunicorn main:app -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:8000
+
+import os
+import logging
+import argparse
+
+import uvicorn
+
+from services.compile_workspace import default_cache_root, default_scratch_root
+from utils.helpers import env_int, setup_logging
+
+setup_logging()
+
+logger = logging.getLogger(__name__)
+
+def worker_environment(workers: int) -> dict:
+    """Settings that make workers safe to run side by side, unless already set."""
+    cpus = os.cpu_count() or 2
+    defaults = {
+        # Shared by every worker; entries are written atomically and never replaced. On disk
+        # rather than tmpfs, so the tier (bounded by FLASH_RESUME_CACHE_DISK_MB) never costs RAM
+        "FLASH_RESUME_CACHE_DIR": str(default_cache_root() / "cache"),
+        "FLASH_RESUME_TEMPLATES_READ_ONLY": "1",
+        # Jobs must be visible to whichever worker the status request lands on
+        "FLASH_RESUME_JOB_STORE": str(default_scratch_root() / "jobs.db"),
+        # Split the cores between workers instead of letting each one use them all
+        "FLASH_RESUME_COMPILE_CONCURRENCY": str(max(1, cpus // workers)),
+    }
+    return {name: value for name, value in defaults.items() if not os.environ.get(name)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Flash Resume API with several worker processes.")
+    parser.add_argument("--host", default=os.environ.get("FLASH_RESUME_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=env_int("FLASH_RESUME_PORT", 8000))
+    parser.add_argument("--workers", type=int, default=env_int("FLASH_RESUME_WORKERS", os.cpu_count() or 2))
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    settings = worker_environment(workers)
+    os.environ.update(settings)
+    for name, value in sorted(settings.items()):
+        logger.info(f"{name}={value}")
+
+    if workers > 1 and os.environ.get("FLASH_RESUME_COMPILER_BACKEND") == "watch":
+        logger.warning("Watch sessions are per worker; without sticky routing an editor may start one in each")
+
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Bulk compilation of many resumes streamed back as a ZIP archive
+
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Tuple
+from fastapi import HTTPException
+
+from models import BatchCompileItem
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+from services.zip_stream import ArchiveOutcome, archive_filename, stream_archive
+
+logger = logging.getLogger(__name__)
+
+class BatchCompiler:
+    """Spreads a batch over the compile pool and yields a ZIP as documents finish.
+
+    Items are generated like compile-json requests, so they share its cache entries, and
+    items with the same template and overrides are compiled in one shared workspace.
+    """
+
+    def __init__(self, template_service: TemplateService, typst_compiler: TypstCompiler, max_items: int = 1000):
+        self.template_service = template_service
+        self.typst_compiler = typst_compiler
+        self.max_items = max_items
+
+    def validate(self, items: List[BatchCompileItem]):
+        """Reject batches that are empty or over the size limit before streaming starts."""
+        if not items:
+            raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+        if len(items) > self.max_items:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds the limit of {self.max_items} items")
+
+    def stream_zip(self, items: List[BatchCompileItem]) -> AsyncIterator[bytes]:
+        """Compile every item and stream a ZIP with one PDF per success plus a manifest."""
+        return stream_archive(self._outcomes(items), "items")
+
+    async def _outcomes(self, items: List[BatchCompileItem]) -> AsyncIterator[ArchiveOutcome]:
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for index, item in enumerate(items):
+            overrides = item.resume.overrides.model_dump_json() if item.resume.overrides is not None else ""
+            groups.setdefault((item.template, overrides), []).append(index)
+
+        # (index, PDF bytes, error) per item, in the order they finish
+        finished: asyncio.Queue = asyncio.Queue()
+        # Stay within the pool's concurrency so a batch never trips its queue limit
+        slots = asyncio.Semaphore(self.typst_compiler.compile_pool.max_concurrency)
+        tasks = [asyncio.create_task(self._compile_group(template, indices, items, slots, finished))
+                 for (template, _), indices in groups.items()]
+
+        try:
+            for _ in range(len(items)):
+                index, pdf_content, error = await finished.get()
+                entry = {"index": index, "template": items[index].template}
+                yield entry, self._filename(index, items[index]), pdf_content, error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _compile_group(self, template: str, indices: List[int], items: List[BatchCompileItem],
+                             slots: asyncio.Semaphore, finished: asyncio.Queue):
+        """Compile the items of one template and overrides; every index is reported exactly once."""
+        pending = set(indices)
+        try:
+            config = self.template_service.get_effective_config(template, items[indices[0]].resume.overrides)
+            compiled, documents = [], []
+            for index in indices:
+                try:
+                    document = self.typst_compiler.generate_document(items[index].resume, config)
+                except Exception as e:
+                    pending.discard(index)
+                    finished.put_nowait((index, None, self._error(index, e)))
+                    continue
+                compiled.append(index)
+                documents.append((document.main, document.files))
+
+            async for position, result in self.typst_compiler.iter_compile_many(template, documents, config,
+                                                                                slots=slots):
+                index = compiled[position]
+                pending.discard(index)
+                if isinstance(result, HTTPException):
+                    finished.put_nowait((index, None, str(result.detail)))
+                else:
+                    finished.put_nowait((index, result, None))
+        except Exception as e:
+            for index in sorted(pending):
+                finished.put_nowait((index, None, self._error(index, e)))
+
+    @staticmethod
+    def _error(index: int, error: Exception) -> str:
+        if isinstance(error, HTTPException):
+            return str(error.detail)
+        logger.error(f"Batch item {index} failed: {error}")
+        return str(error)
+
+    @staticmethod
+    def _filename(index: int, item: BatchCompileItem) -> str:
+        info = item.resume.personalInfo
+        stem = item.filename or f"{item.template}-{info.firstname}-{info.lastname}"
+        return archive_filename(index, stem, fallback="resume")
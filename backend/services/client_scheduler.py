@@ -0,0 +1,294 @@
+# Per-client token buckets and weighted fair queueing for compiles
+
+import re
+import math
+import time
+import heapq
+import asyncio
+import hashlib
+import itertools
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Requests that may start a compile; everything else is never charged
+COMPILE_ENDPOINTS = re.compile(
+    r"^/templates/[^/]+/(compile|compile-json|preview|render)$|^/templates/(batch-compile|compile-variants)$|^/jobs$"
+)
+# Compiles queued for later, so they pay the full compile cost when submitted
+DEFERRED_ENDPOINTS = re.compile(r"^/jobs$")
+# Many compiles per request, paid for by item count once the body is parsed (see charge_bulk)
+BULK_ENDPOINTS = re.compile(r"^/templates/(batch-compile|compile-variants)$")
+
+# Queue lane of compiles that run for no client (warm-up, jobs submitted without one)
+BACKGROUND_CLIENT = "background"
+
+_current_client: ContextVar[Optional[str]] = ContextVar("compile_client", default=None)
+# Cleared where compiles are paid for some other way (bulk requests, jobs) or not at all
+_charge_compiles: ContextVar[bool] = ContextVar("charge_compiles", default=True)
+
+def current_client() -> Optional[str]:
+    """The client the current request is charged to, or None outside compile requests."""
+    return _current_client.get()
+
+@contextmanager
+def client_context(client: Optional[str], charge_compiles: bool = True):
+    """Queue the compiles started inside under ``client``, charging each one if ``charge_compiles``."""
+    client_token = _current_client.set(client)
+    charge_token = _charge_compiles.set(charge_compiles)
+    try:
+        yield
+    finally:
+        _charge_compiles.reset(charge_token)
+        _current_client.reset(client_token)
+
+def _key_id(api_key: str) -> str:
+    return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+def parse_weights(raw: Optional[str]) -> Dict[str, float]:
+    """Parse "key=4,ip=1,key:abc123=8" into client or client-kind -> fair-queueing weight."""
+    weights = {}
+    for part in (raw or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.strip().rpartition("=")
+        try:
+            if not name:
+                raise ValueError(part)
+            weights[name.strip()] = max(float(value), 0.01)
+        except ValueError:
+            logger.warning(f"Ignoring invalid client weight {part!r}")
+    return weights
+
+class TokenBucket:
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class ClientScheduler:
+    """Rate budgets per client and their relative share of the compile pool.
+
+    Clients are identified by API key when it is one of ``api_keys``, otherwise by address;
+    an unverified header must not buy a fresh budget. Each has a token bucket refilled at
+    ``rate`` tokens per second up to ``burst``; a request that can be answered from the cache
+    costs ``cached_cost`` tokens and a real compile ``compile_cost``. ``weights`` (by client
+    id or kind, e.g. "key") scale a client's share of compile slots. A client may hold at
+    most ``max_sessions`` live-preview sessions at once (0 for no limit).
+    """
+
+    def __init__(self, rate: float = 2.0, burst: float = 30, compile_cost: float = 1.0, cached_cost: float = 0.05,
+                 weights: Optional[Dict[str, float]] = None, trust_forwarded: bool = False,
+                 api_keys: Iterable[str] = (), max_sessions: int = 4, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.compile_cost = compile_cost
+        self.cached_cost = cached_cost
+        self.weights = weights or {}
+        self.trust_forwarded = trust_forwarded
+        self._api_keys = {_key_id(key) for key in api_keys}
+        self.max_sessions = max_sessions
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # Client -> open live-preview sessions
+        self._sessions: Dict[str, int] = {}
+        # Lifetime counters, exported on /metrics
+        self.admitted = {"cached": 0, "compile": 0}
+        self.limited = {"cached": 0, "compile": 0, "session": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def identify(self, scope) -> str:
+        """Client id for a request or WebSocket: hashed API key if it is a known one, else address."""
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        api_key = headers.get("x-api-key")
+        if api_key and _key_id(api_key) in self._api_keys:
+            return _key_id(api_key)
+        forwarded = headers.get("x-forwarded-for") if self.trust_forwarded else None
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    def weight(self, client: str) -> float:
+        """Fair-queueing weight of a client, by exact id and then by kind."""
+        return self.weights.get(client, self.weights.get(client.partition(":")[0], 1.0))
+
+    def try_charge(self, client: str, kind: str, count: int = 1) -> float:
+        """Take a request's cost from the client's bucket; return 0, or seconds until it can pay.
+
+        A charge for more than ``burst`` is admitted with a full bucket and leaves the client
+        in debt, so bulk requests are possible but pay for every item before the next one.
+        """
+        if not self.enabled:
+            return 0.0
+        cost = (self.compile_cost if kind == "compile" else self.cached_cost) * count
+        required = min(cost, self.burst)
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                # The least recently seen client; its bucket has likely refilled anyway
+                self._buckets.popitem(last=False)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(client)
+
+        if bucket.tokens >= required:
+            bucket.tokens -= cost
+            self.admitted[kind] += 1
+            return 0.0
+        self.limited[kind] += 1
+        return (required - bucket.tokens) / self.rate
+
+    def charge_compile(self):
+        """Charge the current request's client for a real compile, raising 429 over budget."""
+        client = current_client()
+        if client is None or not _charge_compiles.get():
+            return
+        self._charge(client, 1)
+
+    def charge_bulk(self, count: int):
+        """Charge a bulk request for all its compiles up front; those it then starts only queue."""
+        client = current_client()
+        if client is None or not _charge_compiles.get():
+            return
+        self._charge(client, count)
+        _charge_compiles.set(False)
+
+    def _charge(self, client: str, count: int):
+        wait = self.try_charge(client, "compile", count)
+        if wait:
+            logger.info(f"Rate limiting compiles of {client}, retry in {wait:.1f}s")
+            raise HTTPException(
+                status_code=429,
+                detail="Compile rate limit exceeded, please retry later",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+
+    def open_session(self, client: str) -> bool:
+        """Count a live-preview session for the client; False if it already holds its maximum."""
+        if self.max_sessions and self._sessions.get(client, 0) >= self.max_sessions:
+            self.limited["session"] += 1
+            return False
+        self._sessions[client] = self._sessions.get(client, 0) + 1
+        return True
+
+    def close_session(self, client: str):
+        remaining = self._sessions.get(client, 0) - 1
+        if remaining > 0:
+            self._sessions[client] = remaining
+        else:
+            self._sessions.pop(client, None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "compile_cost": self.compile_cost,
+            "cached_cost": self.cached_cost,
+            "weights": self.weights,
+            "clients": len(self._buckets),
+            "max_sessions": self.max_sessions,
+            "sessions": sum(self._sessions.values()),
+            "admitted": dict(self.admitted),
+            "limited": dict(self.limited),
+        }
+
+class FairSemaphore:
+    """A semaphore that hands free slots to waiting clients in weighted fair order.
+
+    Each waiter gets a virtual finish tag, ``max(virtual time, client's last tag) + cost / weight``,
+    and the smallest tag is served first, so a client with many queued compiles takes
+    turns with the others instead of holding the head of a FIFO queue.
+    """
+
+    def __init__(self, value: int, weight: Callable[[str], float] = lambda client: 1.0):
+        self.weight = weight
+        self._free = value
+        self._waiters: List[list] = []
+        self._finish: Dict[str, float] = {}
+        self._virtual = 0.0
+        self._sequence = itertools.count()
+
+    def locked(self) -> bool:
+        return self._free == 0
+
+    def backlogged_clients(self) -> int:
+        return len({client for _, _, future, _, client in self._waiters if not future.done()})
+
+    async def acquire(self, client: str, cost: float = 1.0):
+        start = max(self._virtual, self._finish.get(client, 0.0))
+        finish = start + cost / self.weight(client)
+        self._finish[client] = finish
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            self._virtual = start
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [finish, next(self._sequence), future, start, client])
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just as the waiter was cancelled: pass the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future, start, _ = heapq.heappop(self._waiters)
+            if not future.done():
+                self._virtual = start
+                future.set_result(None)
+                return
+        self._free += 1
+        # Nobody is backlogged, so past usage no longer matters
+        self._finish.clear()
+
+class ClientSchedulerMiddleware:
+    """ASGI middleware that charges compile endpoints to the calling client.
+
+    Every compile-capable request pays the cheap cached cost up front (queued jobs pay
+    the full compile cost) and is answered with 429 and Retry-After when its client is
+    over budget. The client id is kept in a context variable so the compile pool can
+    charge real compiles and queue them fairly. Bulk endpoints instead pay for all their
+    items at once with ``ClientScheduler.charge_bulk``.
+    """
+
+    def __init__(self, app, scheduler: ClientScheduler):
+        self.app = app
+        self.scheduler = scheduler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPILE_ENDPOINTS.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        client = self.scheduler.identify(scope)
+        kind = "compile" if DEFERRED_ENDPOINTS.match(scope["path"]) else "cached"
+        wait = 0.0 if BULK_ENDPOINTS.match(scope["path"]) else self.scheduler.try_charge(client, kind)
+        if wait:
+            response = JSONResponse(
+                {"detail": "Rate limit exceeded, please retry later"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        # Queued jobs have paid in full, their compiles are charged to nobody again
+        with client_context(client, charge_compiles=kind != "compile"):
+            await self.app(scope, receive, send)
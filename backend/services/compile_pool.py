@@ -0,0 +1,160 @@
+# Bounded asyncio pool for running Typst subprocesses off the event loop
+
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+from fastapi import HTTPException, Request
+
+from services.client_scheduler import BACKGROUND_CLIENT, ClientScheduler, FairSemaphore, current_client
+from services.metrics import record_stage, stage
+
+logger = logging.getLogger(__name__)
+
+class ProcessResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+
+class CompilePool:
+    """Runs compiler subprocesses with a concurrency limit and a bounded wait queue.
+
+    Requests beyond ``max_concurrency`` wait for a slot; once ``max_queue`` requests
+    are already waiting, new ones are rejected with 503 so load sheds instead of piling up.
+    Waiting compiles are served fairly between clients, and with a ``scheduler`` each
+    compile is charged to the requesting client's rate budget.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 32, timeout: float = 30,
+                 disconnect_poll_interval: float = 0.25, scheduler: Optional[ClientScheduler] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.disconnect_poll_interval = disconnect_poll_interval
+        self.active = 0
+        self.waiting = 0
+        # Lifetime outcome counters, exported on /metrics
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.scheduler = scheduler
+        weight = scheduler.weight if scheduler is not None else (lambda client: 1.0)
+        self._semaphore = FairSemaphore(max_concurrency, weight)
+
+    def stats(self) -> dict:
+        """Current pool occupancy."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "backlogged_clients": self._semaphore.backlogged_clients(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
+
+    async def run(self, cmd: List[str], cwd: Path, request: Optional[Request] = None) -> ProcessResult:
+        """Run a command once a slot is free; kill it if the client disconnects."""
+        async with self.slot():
+            with stage("typst"):
+                if request is None:
+                    result = await self._run_process(cmd, cwd)
+                else:
+                    result = await self._run_until_disconnect(cmd, cwd, request)
+            if result.returncode == 0:
+                self.completed += 1
+            else:
+                self.failed += 1
+            return result
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one compile slot, charged to and queued for the current client.
+
+        ``run`` uses it for one-shot processes; compiles done elsewhere (a warm watch
+        process) take it too, so they count against the same concurrency and budgets.
+        """
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            logger.warning(f"Compile queue full ({self.waiting} waiting), rejecting request")
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Compile queue is full, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+
+        if self.scheduler is not None:
+            self.scheduler.charge_compile()
+
+        self.waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire(current_client() or BACKGROUND_CLIENT)
+        finally:
+            self.waiting -= 1
+            record_stage("queue", time.perf_counter() - queued_at)
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    async def _run_until_disconnect(self, cmd: List[str], cwd: Path, request: Request) -> ProcessResult:
+        task = asyncio.ensure_future(self._run_process(cmd, cwd))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.disconnect_poll_interval)
+                if done:
+                    return task.result()
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, cancelling compile")
+                    self.cancelled += 1
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    raise HTTPException(status_code=499, detail="Client closed request")
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _run_process(self, cmd: List[str], cwd: Path) -> ProcessResult:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            self.timed_out += 1
+            logger.error(f"Compile timed out after {self.timeout}s: {' '.join(cmd)}")
+            raise HTTPException(status_code=504, detail=f"Compilation timed out after {self.timeout} seconds")
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+
+        return ProcessResult(
+            process.returncode,
+            stdout.decode(errors="replace"),
+            stderr.decode(errors="replace")
+        )
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
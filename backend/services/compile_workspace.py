@@ -0,0 +1,146 @@
+# Per-request scratch workspaces for Typst compilation
+
+import os
+import json
+import shutil
+import tempfile
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = "conf.json"
+
+# Files left behind by the old in-place compile flow; never link them into a workspace
+STALE_ARTIFACTS = {"output.pdf", "output.png", "output.svg"}
+STALE_SUFFIXES = (".backup",)
+STALE_PREFIXES = ("temp_",)
+
+def is_template_asset(name: str) -> bool:
+    """Whether a top-level entry of a template directory belongs in compiles."""
+    if name.startswith('.') or name in STALE_ARTIFACTS:
+        return False
+    return not (name.startswith(STALE_PREFIXES) or name.endswith(STALE_SUFFIXES))
+
+def default_scratch_root() -> Path:
+    """Prefer a memory-backed directory (tmpfs) for scratch files when available."""
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm / "flash-resume"
+    return Path(tempfile.gettempdir()) / "flash-resume"
+
+def default_cache_root() -> Path:
+    """A disk-backed directory for persistent caches, which must not grow in RAM like tmpfs."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "flash-resume"
+
+class CompileWorkspace:
+    """An isolated directory that mirrors a template and holds one compile's input and output.
+
+    Template assets (``src/``, ``conf.json``, images, ...) are symlinked rather than
+    copied, so the template tree (or the read-only bundle standing in for it) is never
+    written to and concurrent compiles of the same template cannot see each other's files.
+    When a config is given it is written as the workspace's own ``conf.json``, which the
+    templates read via ``../conf.json``.
+    """
+
+    def __init__(self, template_dir: Path, main_file: str, scratch_root: Optional[Path] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        self.template_dir = template_dir
+        self.main_file = main_file
+        self.scratch_root = scratch_root or default_scratch_root()
+        self.config = config
+        self.path: Optional[Path] = None
+
+    @property
+    def main_path(self) -> Path:
+        return self.path / self.main_file
+
+    @property
+    def output_path(self) -> Path:
+        return self.output_for("pdf")
+
+    def output_for(self, output_format: str) -> Path:
+        """Path of the compile output in the given format (pdf, png, svg)."""
+        return self.path / f"output.{output_format}"
+
+    def create(self) -> "CompileWorkspace":
+        """Create the scratch directory and link the template assets into it."""
+        self.scratch_root.mkdir(parents=True, exist_ok=True)
+        self.path = Path(tempfile.mkdtemp(prefix=f"{self.template_dir.name}-", dir=self.scratch_root))
+
+        for entry in self.template_dir.iterdir():
+            if not self._should_link(entry.name):
+                continue
+            self._link(entry, self.path / entry.name)
+
+        if self.config is not None:
+            self.write_config(self.config)
+
+        return self
+
+    def write_main(self, content: str) -> Path:
+        """Write the per-request main file into the workspace."""
+        self.main_path.write_text(content)
+        return self.main_path
+
+    def write_files(self, files: Dict[str, str]) -> int:
+        """Write generated include files; they are content-addressed, so existing ones are kept."""
+        written = 0
+        for relative, source in files.items():
+            target = self.path / relative
+            if target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(source)
+            written += 1
+        return written
+
+    def replace_asset(self, name: str, data: bytes):
+        """Swap a linked top-level template asset for this compile's own copy of it."""
+        target = self.path / name
+        target.unlink(missing_ok=True)
+        target.write_bytes(data)
+
+    def prune_files(self, directory: str, keep: Iterable[str]):
+        """Remove generated files under a workspace directory that are no longer referenced."""
+        keep = {self.path / relative for relative in keep}
+        for path in (self.path / directory).glob("*"):
+            if path not in keep:
+                path.unlink(missing_ok=True)
+
+    def write_config(self, config: Dict[str, Any]):
+        """Write the effective template config for this compile only."""
+        self.config = config
+        (self.path / CONFIG_FILE).write_text(json.dumps(config, indent=2))
+
+    def cleanup(self):
+        """Remove the workspace; template assets are only unlinked, never deleted."""
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+    def _should_link(self, name: str) -> bool:
+        if name == self.main_file or name.startswith('.'):
+            return False
+        if name == CONFIG_FILE and self.config is not None:
+            return False
+        return is_template_asset(name)
+
+    def _link(self, source: Path, target: Path):
+        try:
+            target.symlink_to(source.resolve(), target_is_directory=source.is_dir())
+        except OSError:
+            # Symlinks can be unavailable (e.g. unprivileged Windows); fall back to a copy
+            logger.debug(f"Symlink unavailable for {source}, copying instead")
+            if source.is_dir():
+                shutil.copytree(source, target)
+            else:
+                shutil.copy2(source, target)
+
+    def __enter__(self) -> "CompileWorkspace":
+        return self.create()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
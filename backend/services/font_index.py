@@ -0,0 +1,228 @@
+# Font index limited to the families the templates use
+
+import os
+import re
+import sys
+import shutil
+import hashlib
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models import TemplateConfig
+from services.compile_workspace import default_scratch_root
+
+logger = logging.getLogger(__name__)
+
+# Families compiled into the typst binary; they resolve even with system fonts ignored
+EMBEDDED_FAMILIES = {"Libertinus Serif", "New Computer Modern", "New Computer Modern Math", "DejaVu Sans Mono"}
+
+FONT_SUFFIXES = {".ttf", ".otf", ".ttc", ".otc"}
+# `font: "..."` and `header-font: ("...", "...")` arguments in template sources
+FONT_ARGUMENT = re.compile(r'(?<![\w-])(?:[\w-]+-)?font:\s*("[^"]*"|\([^()]*\))')
+STRING_LITERAL = re.compile(r'"([^"]+)"')
+# Config keys that name a font family (conf.json and presets)
+FONT_KEYS = ("primary_font", "header_font")
+# Families typst falls back to for glyphs the template fonts lack, e.g. the emoji icons
+# in template headers or CJK translations; matched against normalized family names
+FALLBACK_FAMILY = re.compile(r"emoji|cjk|noto|symbol|dejavu|unifont|sourcehan|wenquanyi|droidsansfallback")
+# fontconfig languages whose covering fonts are fallbacks as well: emoji and the CJK scripts
+FALLBACK_LANGS = ("und-zsye", "zh", "ja", "ko")
+
+def _normalize(family: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", family.lower())
+
+def source_font_families(text: str) -> Set[Tuple[str, ...]]:
+    """The font fallback lists given as literals in Typst source; a single family is a list of one."""
+    families = set()
+    for argument in FONT_ARGUMENT.findall(text):
+        names = tuple(STRING_LITERAL.findall(argument))
+        if names:
+            families.add(names)
+    return families
+
+def system_font_dirs() -> List[Path]:
+    """Directories typst scans for system fonts on this platform."""
+    home = Path.home()
+    if sys.platform == "darwin":
+        return [Path("/Library/Fonts"), Path("/System/Library/Fonts"), home / "Library/Fonts"]
+    if os.name == "nt":
+        return [Path(os.environ.get("WINDIR", "C:\\Windows")) / "Fonts",
+                Path(os.environ.get("LOCALAPPDATA", home)) / "Microsoft/Windows/Fonts"]
+    data_home = Path(os.environ.get("XDG_DATA_HOME", home / ".local/share"))
+    return [Path("/usr/share/fonts"), Path("/usr/local/share/fonts"), data_home / "fonts", home / ".fonts"]
+
+class FontIndex:
+    """A directory of links to only the font files the templates need.
+
+    Passing it with ``--font-path`` and ``--ignore-system-fonts`` spares every typst run
+    a scan of all system fonts. The system's fallback fonts (emoji, CJK, Noto, ...) are
+    linked too, so glyphs the template fonts lack render as they would with the scan.
+    Configs naming a family the index could not resolve (e.g. a per-request font
+    override) keep the default system font discovery.
+    """
+
+    def __init__(self, templates_dir: Path, scratch_root: Optional[Path] = None):
+        self.templates_dir = templates_dir
+        self.scratch_root = scratch_root or default_scratch_root()
+        self.path: Optional[Path] = None
+        # Family -> "embedded" or the font files it resolved to; unresolved families map to []
+        self.families: Dict[str, List[str]] = {}
+        # Fallback lists hard-coded in template sources, needed whatever the config says;
+        # typst uses the first family it finds, so each list needs one resolved member
+        self._source_families: Set[Tuple[str, ...]] = set()
+        # Families named by conf.json and presets, needed when a compile has no config
+        self._config_families: Set[str] = set()
+        self._resolved: Set[str] = {_normalize(family) for family in EMBEDDED_FAMILIES}
+        self.fallback_files = 0
+
+    def build(self) -> "FontIndex":
+        """Resolve the templates' font families and link their files into the index directory."""
+        required = self.required_families()
+        available = self._available_fonts()
+        files: Set[Path] = set(self._template_font_files())
+
+        for family in sorted(required):
+            key = _normalize(family)
+            # Whole names only, so "Arial" does not pull in Arial Narrow or Arial Black
+            matches = sorted(available.get(key, ()))
+            if matches:
+                self.families[family] = [str(path) for path in matches]
+                files.update(matches)
+                self._resolved.add(key)
+            elif family in EMBEDDED_FAMILIES:
+                self.families[family] = ["embedded"]
+            else:
+                self.families[family] = []
+
+        fallbacks = self._fallback_fonts(available) - files
+        self.fallback_files = len(fallbacks)
+        files.update(fallbacks)
+
+        self.path = self._materialize(files)
+        unresolved = self.unresolved()
+        logger.info(f"Font index at {self.path}: {len(files)} files for {len(required)} families"
+                    + f" and {len(fallbacks)} fallback files"
+                    + (f", unresolved: {', '.join(unresolved)}" if unresolved else ""))
+        return self
+
+    def required_families(self) -> Set[str]:
+        """Every family named in a template's conf.json, its sources or a preset."""
+        families: Set[str] = set()
+        for conf in self.templates_dir.glob("*/conf.json"):
+            families.update(self._font_values(conf.read_text(), json_file=True))
+        for preset in self.templates_dir.glob("presets/*.toml"):
+            families.update(self._font_values(preset.read_text(), json_file=False))
+        self._config_families = families
+        for source in self.templates_dir.rglob("*.typ"):
+            try:
+                self._source_families.update(source_font_families(source.read_text()))
+            except (OSError, UnicodeDecodeError):
+                continue
+        return families | {family for fallbacks in self._source_families for family in fallbacks}
+
+    def unresolved(self) -> List[str]:
+        return sorted(family for family, files in self.families.items() if not files)
+
+    def typst_args(self, config: Optional[TemplateConfig] = None) -> List[str]:
+        """Font arguments for a compile, or none when the config needs a font outside the index."""
+        if self.path is None:
+            return []
+        needed = set(self._source_families)
+        if config is not None:
+            needed.update((getattr(config.style, key),) for key in FONT_KEYS)
+        else:
+            needed.update((family,) for family in self._config_families)
+        if not all(any(_normalize(family) in self._resolved for family in fallbacks) for fallbacks in needed):
+            return []
+        return ["--font-path", str(self.path), "--ignore-system-fonts"]
+
+    def report(self) -> dict:
+        """What the index resolved, for /health."""
+        return {
+            "path": str(self.path) if self.path else None,
+            "families": self.families,
+            "unresolved": self.unresolved(),
+            "fallbackFiles": self.fallback_files,
+            # False when some template's fonts still need the system scan
+            "systemFontsIgnored": bool(self.typst_args()),
+        }
+
+    @staticmethod
+    def _font_values(text: str, json_file: bool) -> Iterable[str]:
+        pattern = r'"{key}"\s*:\s*"([^"]+)"' if json_file else r'^\s*{key}\s*=\s*"([^"]+)"'
+        for key in FONT_KEYS:
+            yield from re.findall(pattern.format(key=key), text, flags=re.MULTILINE)
+
+    def _template_font_files(self) -> Iterable[Path]:
+        # Fonts vendored next to the templates are always part of the index
+        for path in self.templates_dir.rglob("*"):
+            if path.suffix.lower() in FONT_SUFFIXES and path.is_file():
+                yield path.resolve()
+
+    def _fallback_fonts(self, available: Dict[str, Set[Path]]) -> Set[Path]:
+        """Font files typst may fall back to for glyphs missing from the template fonts."""
+        fonts = {path for name, paths in available.items() if FALLBACK_FAMILY.search(name) for path in paths}
+        if shutil.which("fc-list"):
+            for lang in FALLBACK_LANGS:
+                try:
+                    output = subprocess.run(
+                        ["fc-list", "--format", "%{file}\n", f":lang={lang}"],
+                        capture_output=True, text=True, timeout=30
+                    ).stdout
+                except (OSError, subprocess.SubprocessError) as e:
+                    logger.warning(f"fc-list failed listing {lang} fonts: {e}")
+                    continue
+                fonts.update(Path(line) for line in output.splitlines() if line)
+        return fonts
+
+    def _available_fonts(self) -> Dict[str, Set[Path]]:
+        """Normalized family (or file name, without fontconfig) -> font files."""
+        fonts: Dict[str, Set[Path]] = {}
+        if shutil.which("fc-list"):
+            try:
+                output = subprocess.run(
+                    ["fc-list", "--format", "%{family}\t%{file}\n"],
+                    capture_output=True, text=True, timeout=30
+                ).stdout
+                for line in output.splitlines():
+                    families, _, file = line.partition("\t")
+                    for family in families.split(","):
+                        fonts.setdefault(_normalize(family), set()).add(Path(file))
+                return fonts
+            except (OSError, subprocess.SubprocessError) as e:
+                logger.warning(f"fc-list failed, matching fonts by file name: {e}")
+
+        for directory in system_font_dirs() + [self.templates_dir]:
+            if not directory.is_dir():
+                continue
+            for path in directory.rglob("*"):
+                if path.suffix.lower() in FONT_SUFFIXES:
+                    # "Roboto-BoldItalic.ttf" and "SourceSans3-Regular.otf" name the family before the style
+                    family = re.split(r"[-_]", path.stem, maxsplit=1)[0]
+                    fonts.setdefault(_normalize(family), set()).add(path.resolve())
+        return fonts
+
+    def _materialize(self, files: Set[Path]) -> Path:
+        # Named after its contents and published with a rename, so workers can share it
+        digest = hashlib.sha256("\n".join(sorted(map(str, files))).encode()).hexdigest()[:16]
+        target = self.scratch_root / f"fonts-{digest}"
+        if target.is_dir():
+            return target
+
+        self.scratch_root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".fonts-", dir=self.scratch_root))
+        for index, source in enumerate(sorted(files)):
+            link = staging / f"{index:03d}-{source.name}"
+            try:
+                link.symlink_to(source)
+            except OSError:
+                shutil.copy2(source, link)
+        try:
+            staging.rename(target)
+        except OSError:
+            # Another worker published the same index first
+            shutil.rmtree(staging, ignore_errors=True)
+        return target
@@ -0,0 +1,149 @@
+# Cached typst capability probe and liveness/readiness reports
+
+import re
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.client_scheduler import ClientScheduler
+from services.compile_pool import CompilePool
+from services.job_queue import JobQueue
+from services.pdf_cache import PDFCache
+from services.warmup import StartupWarmup
+
+logger = logging.getLogger(__name__)
+
+# `[possible values: pdf, png, svg]` after --format in `typst compile --help`
+FORMAT_VALUES = re.compile(r"--format\b.*?\[possible values: ([^\]]+)\]", re.DOTALL)
+
+class TypstProbe:
+    """What the installed typst can do, refreshed in the background instead of per request.
+
+    Health endpoints read the last result, so probes never spawn a process or wait on one.
+    """
+
+    def __init__(self, refresh_interval: float = 60, timeout: float = 5):
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.available = False
+        self.version: Optional[str] = None
+        self.formats: List[str] = []
+        self.font_count: Optional[int] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        """Run the probe commands once and replace the cached result."""
+        version, help_text, fonts = await asyncio.gather(
+            self._run("typst", "--version"),
+            self._run("typst", "compile", "--help"),
+            self._run("typst", "fonts"),
+        )
+        ok, output = version
+        self.available = ok
+        self.version = output.strip() if ok else None
+        self.error = None if ok else output.strip()
+        match = FORMAT_VALUES.search(help_text[1]) if help_text[0] else None
+        self.formats = [value.strip() for value in match.group(1).split(",")] if match else []
+        self.font_count = len([line for line in fonts[1].splitlines() if line.strip()]) if fonts[0] else None
+        self.checked_at = time.time()
+        if not ok:
+            logger.warning(f"typst is not available: {self.error}")
+
+    def start(self):
+        """Probe now and then every ``refresh_interval`` seconds."""
+        self._task = asyncio.create_task(self._refresh_forever())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def report(self) -> dict:
+        return {
+            "available": self.available,
+            "version": self.version,
+            "formats": self.formats,
+            "fontCount": self.font_count,
+            "error": self.error,
+            "checkedAt": self.checked_at,
+        }
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"typst probe failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _run(self, *cmd: str) -> Tuple[bool, str]:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+            )
+        except OSError as e:
+            return False, str(e)
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return False, f"{' '.join(cmd)} timed out"
+        finally:
+            # Also reached when the probe is cancelled at shutdown
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        return process.returncode == 0, stdout.decode(errors="replace")
+
+class ReadinessCheck:
+    """Whether this instance should receive traffic, with the load figures behind the decision.
+
+    An instance is not ready while typst is unavailable or unprobed, until warm-up signals
+    that the compile path is warm, once its compile pool is filled past ``max_saturation``
+    or while its job queue is full.
+    """
+
+    def __init__(self, probe: TypstProbe, compile_pool: CompilePool, cache: PDFCache,
+                 job_queue: Optional[JobQueue] = None, warmup: Optional[StartupWarmup] = None,
+                 max_saturation: float = 0.9, scheduler: Optional[ClientScheduler] = None):
+        self.probe = probe
+        self.compile_pool = compile_pool
+        self.cache = cache
+        self.job_queue = job_queue
+        self.warmup = warmup
+        self.max_saturation = max_saturation
+        self.scheduler = scheduler
+
+    def report(self) -> Tuple[bool, Dict[str, Any]]:
+        """Return (ready, details)."""
+        reasons = []
+        if self.probe.checked_at is None:
+            reasons.append("typst has not been probed yet")
+        elif not self.probe.available:
+            reasons.append("typst is not available")
+        if self.warmup is not None and not self.warmup.ready.is_set():
+            reasons.append("compile path is not warm yet")
+
+        pool = self.compile_pool.stats()
+        capacity = pool["max_concurrency"] + pool["max_queue"]
+        saturation = (pool["active"] + pool["waiting"]) / capacity if capacity else 0.0
+        if saturation >= self.max_saturation:
+            reasons.append("compile pool is saturated")
+
+        jobs = None
+        if self.job_queue is not None:
+            jobs = self.job_queue.stats()
+            if jobs["queued"] >= self.job_queue.max_queued:
+                reasons.append("job queue is full")
+
+        return not reasons, {
+            "status": "ready" if not reasons else "not ready",
+            "reasons": reasons,
+            "typst": self.probe.report(),
+            "pool": {**pool, "saturation": round(saturation, 3)},
+            "jobs": jobs,
+            "cache": self.cache.stats(),
+            "clients": self.scheduler.stats() if self.scheduler is not None else None,
+        }
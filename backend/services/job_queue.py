@@ -0,0 +1,454 @@
+# Asynchronous compile jobs with priority lanes and expiring results
+
+import os
+import json
+import time
+import uuid
+import heapq
+import sqlite3
+import asyncio
+import logging
+import tempfile
+import threading
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+
+from models import ResumeData, TemplateOverrides
+from services.client_scheduler import BACKGROUND_CLIENT, client_context, current_client
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+
+logger = logging.getLogger(__name__)
+
+# Lanes are claimed in this order, so interactive previews never wait behind bulk exports
+PRIORITY_LANES = {"interactive": 0, "bulk": 1}
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+TERMINAL_STATUSES = {DONE, FAILED}
+
+class Job:
+    """One compile request and its progress; timestamps are wall-clock so processes agree."""
+
+    def __init__(self, id: str, template: str, payload: Dict[str, Any], priority: int,
+                 status: str = QUEUED, created_at: Optional[float] = None, started_at: Optional[float] = None,
+                 finished_at: Optional[float] = None, expires_at: Optional[float] = None,
+                 error: Optional[str] = None, result_size: Optional[int] = None):
+        self.id = id
+        self.template = template
+        self.payload = payload
+        self.priority = priority
+        self.status = status
+        self.created_at = created_at if created_at is not None else time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.expires_at = expires_at
+        self.error = error
+        self.result_size = result_size
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public view of the job, without its payload."""
+        lane = next((name for name, value in PRIORITY_LANES.items() if value == self.priority), str(self.priority))
+        return {
+            "id": self.id,
+            "template": self.template,
+            "priority": lane,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "expiresAt": self.expires_at,
+            "error": self.error,
+            "resultSize": self.result_size,
+        }
+
+class MemoryJobStore:
+    """Job store for a single process."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._queue: List[Tuple[int, int, str]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, job: Job):
+        with self._lock:
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (job.priority, next(self._sequence), job.id))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def claim(self) -> Optional[Job]:
+        with self._lock:
+            while self._queue:
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs.get(job_id)
+                if job is not None and job.status == QUEUED:
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    return job
+        return None
+
+    def finish(self, job_id: str, status: str, expires_at: float, error: Optional[str] = None,
+               result_size: Optional[int] = None):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.status = status
+            job.finished_at = time.time()
+            job.expires_at = expires_at
+            job.error = error
+            job.result_size = result_size
+
+    def queued(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == QUEUED)
+
+    def counts(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in list(self._jobs.values()):
+            counts[job.status] += 1
+        return counts
+
+    def expire(self, now: float, stale_before: float) -> List[str]:
+        """Drop expired jobs and fail running jobs whose worker went away; return dropped ids."""
+        with self._lock:
+            expired = [job.id for job in self._jobs.values() if job.expires_at is not None and job.expires_at <= now]
+            for job_id in expired:
+                del self._jobs[job_id]
+            stale = [job for job in self._jobs.values() if job.status == RUNNING and job.started_at < stale_before]
+        for job in stale:
+            self.finish(job.id, FAILED, now, error="Worker stopped before the job finished")
+        return expired
+
+class SQLiteJobStore:
+    """Job store in an SQLite file, shared by the API and separate worker processes.
+
+    Writes wait up to ``busy_timeout`` seconds for another process's lock, but a claim
+    only waits ``claim_timeout``: an idle worker finds nothing to do and polls again
+    rather than queueing behind a busy writer.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            template TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            expires_at REAL,
+            error TEXT,
+            result_size INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at);
+    """
+
+    def __init__(self, path: Path, busy_timeout: float = 30, claim_timeout: float = 0.1):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.claim_timeout = claim_timeout
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(self.SCHEMA)
+
+    def add(self, job: Job):
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO jobs (id, template, payload, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.template, json.dumps(job.payload), job.priority, job.status, job.created_at)
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def claim(self) -> Optional[Job]:
+        with self._lock:
+            # An immediate transaction takes the write lock, so two processes never claim the same job
+            self._set_busy_timeout(self.claim_timeout)
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                logger.debug(f"Job store is busy, not claiming this time: {e}")
+                return None
+            finally:
+                self._set_busy_timeout(self.busy_timeout)
+            try:
+                row = self._connection.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY priority, created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    self._connection.execute("COMMIT")
+                    return None
+                started_at = time.time()
+                self._connection.execute(
+                    "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, started_at, row[0])
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        job = self._job(row)
+        job.status, job.started_at = RUNNING, started_at
+        return job
+
+    def finish(self, job_id: str, status: str, expires_at: float, error: Optional[str] = None,
+               result_size: Optional[int] = None):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, expires_at = ?, error = ?, result_size = ? WHERE id = ?",
+                (status, time.time(), expires_at, error, result_size, job_id)
+            )
+
+    def queued(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for status, count in self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+        return counts
+
+    def expire(self, now: float, stale_before: float) -> List[str]:
+        """Drop expired jobs and fail running jobs whose worker went away; return dropped ids."""
+        with self._lock:
+            expired = [row[0] for row in self._connection.execute(
+                "SELECT id FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            )]
+            self._connection.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, expires_at = ?, error = ? "
+                "WHERE status = ? AND started_at < ?",
+                (FAILED, now, now, "Worker stopped before the job finished", RUNNING, stale_before)
+            )
+        return expired
+
+    def _set_busy_timeout(self, seconds: float):
+        self._connection.execute(f"PRAGMA busy_timeout = {int(seconds * 1000)}")
+
+    @staticmethod
+    def _job(row) -> Job:
+        (job_id, template, payload, priority, status, created_at, started_at,
+         finished_at, expires_at, error, result_size) = row
+        return Job(job_id, template, json.loads(payload), priority, status, created_at, started_at,
+                   finished_at, expires_at, error, result_size)
+
+def create_job_store(location: Optional[str]):
+    """An SQLite store at the given path, or an in-memory store when no path is set."""
+    if not location or location == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(Path(location))
+
+class JobQueue:
+    """Accepts compile jobs, runs them on in-process workers and keeps results until they expire.
+
+    Results are files in ``results_dir``, so a separate worker process sharing the SQLite
+    store and the directory can produce them (see worker.py). Store calls may wait on
+    another process's lock, so they run on a dedicated thread, never on the event loop;
+    job counts for health and metrics are a snapshot refreshed every ``poll_interval``.
+    """
+
+    def __init__(self, store, template_service: TemplateService, typst_compiler: TypstCompiler,
+                 results_dir: Path, result_ttl: float = 600, max_queued: int = 1000,
+                 poll_interval: float = 0.25, stale_after: float = 300):
+        self.store = store
+        self.template_service = template_service
+        self.typst_compiler = typst_compiler
+        self.results_dir = results_dir
+        self.result_ttl = result_ttl
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._wakeup = asyncio.Event()
+        self._updated = asyncio.Condition()
+        self._tasks: List[asyncio.Task] = []
+        # One thread, as the stores serialise their calls anyway
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        self._counts: Dict[str, int] = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        results_dir.mkdir(parents=True, exist_ok=True)
+
+    async def submit(self, template: str, payload: Dict[str, Any], priority: str = "bulk") -> Job:
+        """Queue a compile and return at once; the payload holds `content` or `resume` plus `overrides`."""
+        if priority not in PRIORITY_LANES:
+            raise HTTPException(status_code=422, detail=f"Unknown priority '{priority}'")
+        if not self.template_service.template_exists(template):
+            raise HTTPException(status_code=404, detail=f"Template '{template}' not found")
+        if await self._call(self.store.queued) >= self.max_queued:
+            raise HTTPException(
+                status_code=503,
+                detail="Job queue is full, please retry shortly",
+                headers={"Retry-After": "5"}
+            )
+
+        # The submitting client's fair-queueing lane, kept with the job for whichever worker runs it
+        job = Job(uuid.uuid4().hex, template, {**payload, "client": current_client()}, PRIORITY_LANES[priority])
+        await self._call(self.store.add, job)
+        self._wakeup.set()
+        return job
+
+    async def find(self, job_id: str) -> Optional[Job]:
+        """The job, or None if it does not exist or has expired."""
+        return await self._call(self.store.get, job_id)
+
+    async def get(self, job_id: str) -> Job:
+        job = await self.find(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired")
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Job:
+        """Long-poll: return once the job reaches a terminal status or the timeout passes."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job.status in TERMINAL_STATUSES or remaining <= 0:
+                return job
+            await self.wait_for_update(min(remaining, self.poll_interval))
+
+    async def wait_for_update(self, timeout: float):
+        """Sleep until an in-process worker changes a job, or the timeout passes.
+
+        Jobs run by another process are only seen when polled, hence the timeout.
+        """
+        try:
+            async with self._updated:
+                await asyncio.wait_for(self._updated.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def result_path(self, job_id: str) -> Path:
+        """Path of a finished job's PDF."""
+        job = await self.get(job_id)
+        if job.status == FAILED:
+            raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+        if job.status != DONE:
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}", headers={"Retry-After": "1"})
+        path = self._result_file(job_id)
+        if not path.exists():
+            raise HTTPException(status_code=410, detail="Job result has expired")
+        return path
+
+    def stats(self) -> dict:
+        """Jobs per status, as of the last refresh, and the number of in-process workers."""
+        workers = sum(1 for task in self._tasks if task.get_name().startswith("job-worker"))
+        return {**self._counts, "workers": workers}
+
+    def start(self, workers: int):
+        """Start in-process workers plus the expiry sweeper and the job count refresher."""
+        self._tasks = [asyncio.create_task(self._work(), name=f"job-worker-{index}") for index in range(workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+        self._tasks.append(asyncio.create_task(self._refresh_counts()))
+
+    async def run_forever(self, workers: int):
+        """Run workers until cancelled; used by the standalone worker process."""
+        self.start(workers)
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.close()
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _call(self, method: Callable, *args, **kwargs):
+        """Run a store method on the store thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(method, *args, **kwargs)
+        )
+
+    async def _work(self):
+        while True:
+            job = await self._call(self.store.claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._notify()
+            expires_at = time.time() + self.result_ttl
+            try:
+                pdf_content = await self._compile(job)
+                await asyncio.to_thread(self._write_result, job.id, pdf_content)
+                await self._call(self.store.finish, job.id, DONE, expires_at, result_size=len(pdf_content))
+            except asyncio.CancelledError:
+                # Recorded from the store thread, as this task may not get to await it
+                self._executor.submit(self.store.finish, job.id, FAILED, expires_at, error="Worker shut down")
+                raise
+            except HTTPException as e:
+                await self._call(self.store.finish, job.id, FAILED, expires_at, error=str(e.detail))
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                await self._call(self.store.finish, job.id, FAILED, expires_at, error=str(e))
+            await self._notify()
+
+    async def _notify(self):
+        async with self._updated:
+            self._updated.notify_all()
+
+    async def _compile(self, job: Job) -> bytes:
+        payload = job.payload
+        overrides = TemplateOverrides(**payload["overrides"]) if payload.get("overrides") else None
+        # Paid for in full when submitted, so the compile only queues in the client's lane
+        with client_context(payload.get("client") or BACKGROUND_CLIENT, charge_compiles=False):
+            if payload.get("resume") is not None:
+                resume_data = ResumeData(**payload["resume"])
+                config = self.template_service.get_effective_config(job.template, overrides or resume_data.overrides)
+                document = self.typst_compiler.generate_document(resume_data, config)
+                return await self.typst_compiler.compile_to_bytes(job.template, document.main, config,
+                                                                  files=document.files)
+            config = self.template_service.get_effective_config(job.template, overrides)
+            return await self.typst_compiler.compile_to_bytes(job.template, payload["content"], config)
+
+    async def _sweep(self):
+        interval = max(1.0, min(self.result_ttl / 4, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            expired = await self._call(self.store.expire, now, now - self.stale_after)
+            await asyncio.to_thread(self._remove_results, expired, now)
+
+    async def _refresh_counts(self):
+        while True:
+            try:
+                self._counts = await self._call(self.store.counts)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not count jobs: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def _remove_results(self, expired: List[str], now: float):
+        for job_id in expired:
+            self._result_file(job_id).unlink(missing_ok=True)
+        # Results left by a restarted in-memory store are unknown to it; age them out too
+        for path in self.results_dir.glob("*.pdf"):
+            try:
+                if path.stat().st_mtime < now - 2 * self.result_ttl:
+                    path.unlink()
+            except OSError:
+                continue
+
+    def _write_result(self, job_id: str, data: bytes):
+        fd, tmp_name = tempfile.mkstemp(dir=self.results_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_name, self._result_file(job_id))
+
+    def _result_file(self, job_id: str) -> Path:
+        return self.results_dir / f"{job_id}.pdf"
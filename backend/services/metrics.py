@@ -0,0 +1,287 @@
+# Compile-stage timings and Prometheus-style metrics
+
+import re
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached response up to a compile timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Response sizes in bytes, from a 304 up to a large PDF
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Characters allowed in a Server-Timing metric name (an HTTP token)
+NON_TOKEN_CHARS = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]+")
+
+LabelValues = Tuple[str, ...]
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: LabelValues) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum, count)
+        self._series: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._series[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(names, key + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a service when metrics are scraped."""
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], Union[float, Dict[str, float]]],
+                 metric_type: str = "gauge", label_name: Optional[str] = None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.metric_type = metric_type
+        self.label_name = label_name
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f"Could not collect metric {self.name}: {e}")
+            return lines
+        if isinstance(value, dict):
+            for label, item in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels((self.label_name,), (str(label),))} {_format_value(item)}")
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text exposition format."""
+
+    def __init__(self, namespace: str = "flash_resume"):
+        self.namespace = namespace
+        self._metrics: Dict[str, Union[Counter, Histogram, CallbackMetric]] = {}
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self._full_name(name), help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self._full_name(name), help_text, label_names, buckets))
+
+    def callback(self, name: str, help_text: str, callback: Callable[[], Union[float, Dict[str, float]]],
+                 metric_type: str = "gauge", label_name: Optional[str] = None) -> CallbackMetric:
+        return self._register(CallbackMetric(self._full_name(name), help_text, callback, metric_type, label_name))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+class StageTimings:
+    """Wall time per compile stage for one request, summed when a stage runs more than once."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Render as a Server-Timing header value (durations in milliseconds)."""
+        return ", ".join(
+            f"{NON_TOKEN_CHARS.sub('-', name)};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()
+        )
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a stage of the current request; a no-op outside of a request."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+def record_stage(name: str, seconds: float):
+    """Add an externally measured duration to the current request's stages."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+def read_typst_timings(path: Path, max_depth: int = 1) -> Dict[str, float]:
+    """Summarise a `typst compile --timings` trace into seconds per top-level phase.
+
+    The file is a Chrome trace: begin/end ("B"/"E") pairs or complete ("X") events with
+    microsecond timestamps. Only spans nested at most ``max_depth`` deep are kept, which
+    yields phases such as evaluation, layout and export rather than every element.
+    """
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError) as e:
+        logger.debug(f"No usable typst timings in {path}: {e}")
+        return {}
+
+    events = data.get("traceEvents", []) if isinstance(data, dict) else data
+    phases: Dict[str, float] = {}
+    open_spans: Dict[object, List[Tuple[str, float]]] = {}
+    complete: Dict[object, List[Tuple[float, float, str]]] = {}
+
+    for event in events:
+        if not isinstance(event, dict) or "ts" not in event:
+            continue
+        thread = event.get("tid")
+        kind = event.get("ph")
+        if kind == "B":
+            open_spans.setdefault(thread, []).append((event.get("name", "?"), event["ts"]))
+        elif kind == "E" and open_spans.get(thread):
+            name, started = open_spans[thread].pop()
+            if len(open_spans[thread]) <= max_depth:
+                phases[name] = phases.get(name, 0.0) + (event["ts"] - started) / 1e6
+        elif kind == "X":
+            complete.setdefault(thread, []).append((event["ts"], event["ts"] + event.get("dur", 0), event.get("name", "?")))
+
+    for spans in complete.values():
+        # Outer spans start first and end last, so a stack of end times gives the depth
+        ends: List[float] = []
+        for started, ended, name in sorted(spans, key=lambda span: (span[0], -span[1])):
+            while ends and ends[-1] <= started:
+                ends.pop()
+            if len(ends) <= max_depth:
+                phases[name] = phases.get(name, 0.0) + (ended - started) / 1e6
+            ends.append(ended)
+
+    return phases
+
+class MetricsMiddleware:
+    """ASGI middleware that collects stage timings per request and reports them.
+
+    Each HTTP request gets a fresh :class:`StageTimings` in a context variable, so services
+    can record spans without threading it through every call. The stages are sent back in a
+    ``Server-Timing`` header and folded into the registry's histograms.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.requests = registry.counter("http_requests_total", "HTTP requests by method and status.",
+                                         ("method", "status"))
+        self.duration = registry.histogram("http_request_duration_seconds",
+                                           "Time until the response headers were sent.", ("method",))
+        self.bytes_out = registry.counter("http_response_bytes_total", "Response body bytes sent.")
+        self.response_size = registry.histogram("http_response_size_bytes", "Response body size.",
+                                                buckets=SIZE_BUCKETS)
+        self.stages = registry.histogram("compile_stage_seconds",
+                                         "Time spent per compile stage within a request.", ("stage",))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = StageTimings()
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+        sent = 0
+
+        async def send_with_timings(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                self.duration.observe(time.perf_counter() - started, method=scope["method"])
+                if timings.stages:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _current_timings.reset(token)
+            self.requests.inc(method=scope["method"], status=str(status))
+            self.bytes_out.inc(sent)
+            self.response_size.observe(sent)
+            for name, seconds in timings.stages.items():
+                self.stages.observe(seconds, stage=name)
@@ -0,0 +1,121 @@
+# Output size optimisation: downscaled template images and compressed previews
+
+import io
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from models import TemplateOutput
+
+# Both are optional: without Pillow images are passed through, without brotli only gzip is offered
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+RASTER_SUFFIXES = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG"}
+
+def supported_encodings() -> Tuple[str, ...]:
+    """Content encodings this server can produce, most preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the preferred supported encoding the client accepts, if any."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+class OutputOptimizer:
+    """Shrinks compile inputs and outputs according to a config's ``output`` section.
+
+    Template images larger than ``max_image_px`` are downscaled and recompressed before
+    they are linked into a workspace; results are memoised per source file and settings,
+    so the work is done once per image rather than once per compile.
+    """
+
+    def __init__(self, max_images: int = 64):
+        self.max_images = max_images
+        # (path, mtime, size, max_px, quality) -> optimized bytes, or None when not worth it
+        self._images: "OrderedDict[tuple, Optional[bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def optimized_images(self, template_dir: Path, options: TemplateOutput) -> Dict[str, bytes]:
+        """Top-level template images that shrink under the options -> their optimized bytes."""
+        if not options.optimize_images:
+            return {}
+        if Image is None:
+            if not self._warned:
+                logger.warning("Image optimisation requested but Pillow is not installed; images are used as is")
+                self._warned = True
+            return {}
+
+        images = {}
+        for path in template_dir.iterdir():
+            image_format = RASTER_SUFFIXES.get(path.suffix.lower())
+            if image_format is None or not path.is_file():
+                continue
+            stat = path.stat()
+            key = (str(path), stat.st_mtime_ns, stat.st_size, options.max_image_px, options.image_quality)
+            with self._lock:
+                known = key in self._images
+                data = self._images.get(key)
+            if not known:
+                data = self._shrink(path, image_format, options)
+                with self._lock:
+                    self._images[key] = data
+                    while len(self._images) > self.max_images:
+                        self._images.popitem(last=False)
+            if data is not None:
+                images[path.name] = data
+        return images
+
+    @staticmethod
+    def compress(body: bytes, encoding: str) -> bytes:
+        """Encode a response body with gzip or brotli."""
+        if encoding == "br":
+            return brotli.compress(body)
+        return gzip.compress(body, compresslevel=6)
+
+    @staticmethod
+    def _shrink(path: Path, image_format: str, options: TemplateOutput) -> Optional[bytes]:
+        try:
+            with Image.open(path) as image:
+                if max(image.size) <= options.max_image_px:
+                    return None
+                image.thumbnail((options.max_image_px, options.max_image_px), Image.LANCZOS)
+                buffer = io.BytesIO()
+                if image_format == "JPEG":
+                    image.convert("RGB").save(buffer, "JPEG", quality=options.image_quality, optimize=True)
+                else:
+                    image.save(buffer, "PNG", optimize=True)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not optimise image {path}: {e}")
+            return None
+        data = buffer.getvalue()
+        if len(data) >= path.stat().st_size:
+            return None
+        logger.info(f"Optimised {path.name}: {path.stat().st_size} -> {len(data)} bytes")
+        return data
@@ -0,0 +1,271 @@
+# Content-addressed cache for compiled documents
+
+import os
+import json
+import asyncio
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator, Optional, Tuple, Union
+
+from models import TemplateConfig
+
+logger = logging.getLogger(__name__)
+
+class PDFCache:
+    """Two-tier cache of compiled output keyed by a hash of everything that affects it.
+
+    The memory tier is an LRU bounded by total bytes and only admits entries up to
+    ``max_item_bytes``. The optional disk tier stores one file per key and is written
+    atomically without ever replacing an existing entry, so several worker processes
+    may share a directory and a file being served is never swapped underneath a reader.
+    Hits refresh a file's mtime, and once the tier exceeds ``max_disk_bytes`` the least
+    recently used files are removed until it is back under ``DISK_PRUNE_TARGET`` of it.
+    Failing to write the disk tier is never an error; the entry is simply not cached.
+    Disk writes and the pruning they trigger run in worker threads, off the event loop.
+    """
+
+    # Fraction of the disk budget pruning shrinks the tier to, so it does not run on every write
+    DISK_PRUNE_TARGET = 0.8
+
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[Path] = None,
+                 max_item_bytes: int = 8 * 1024 * 1024, max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_item_bytes = min(max_item_bytes, max_memory_bytes)
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_bytes = 0
+        # This process's view of the disk tier; other workers' writes are counted when it prunes
+        self.disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self.disk_write_errors = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._prune_lock = threading.Lock()
+        self._disk_bytes_lock = threading.Lock()
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self.disk_bytes = sum(size for _, _, size in self._disk_files())
+
+    @staticmethod
+    def make_key(template_version: str, config: TemplateConfig, source: str, *extra: str) -> str:
+        """Build a cache key from the template tree version, effective config and Typst source."""
+        digest = hashlib.sha256()
+        digest.update(template_version.encode())
+        digest.update(b"\0")
+        digest.update(json.dumps(config.model_dump(), sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(source.encode())
+        for part in extra:
+            digest.update(b"\0")
+            digest.update(part.encode())
+        return digest.hexdigest()
+
+    def lookup(self, key: str) -> Union[bytes, Path, None]:
+        """Return in-memory bytes, or the disk-tier file path without reading it."""
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+        disk_path = self._disk_path(key)
+        if disk_path is not None:
+            try:
+                # The mtime records the last use, which is what pruning orders by
+                os.utime(disk_path)
+                self.hits += 1
+                return disk_path
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.debug(f"Could not refresh cached output {disk_path}: {e}")
+                if disk_path.exists():
+                    self.hits += 1
+                    return disk_path
+
+        self.misses += 1
+        return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached bytes for a key, promoting disk hits into memory."""
+        cached = self.lookup(key)
+        if not isinstance(cached, Path):
+            return cached
+
+        try:
+            data = cached.read_bytes()
+        except OSError as e:
+            logger.warning(f"Could not read cached output {cached}: {e}")
+            return None
+        self._remember(key, data)
+        return data
+
+    async def put(self, key: str, data: bytes):
+        """Store compiled bytes in memory and, if configured, on disk."""
+        self._remember(key, data)
+
+        disk_path = self._disk_path(key)
+        if disk_path is not None:
+            await asyncio.to_thread(self._put_disk, disk_path, data)
+
+    async def put_file(self, key: str, source: Path) -> Optional[Path]:
+        """Copy a compiled file into the disk tier without reading it into memory.
+
+        Returns the cached file, or None if it could not be written; the source is left
+        in place either way, so the caller can still serve it.
+        """
+        disk_path = self._disk_path(key)
+        if disk_path is None:
+            raise ValueError("put_file requires a disk tier")
+        return await asyncio.to_thread(self._put_disk_file, disk_path, source)
+
+    def _put_disk(self, disk_path: Path, data: bytes):
+        if not disk_path.exists():
+            self._write_disk(disk_path, len(data), lambda tmp_file: tmp_file.write(data))
+
+    def _put_disk_file(self, disk_path: Path, source: Path) -> Optional[Path]:
+        if disk_path.exists():
+            return disk_path
+        try:
+            size = source.stat().st_size
+        except OSError as e:
+            logger.warning(f"Could not read compiled output {source}: {e}")
+            return None
+
+        def copy(tmp_file: BinaryIO):
+            # The workspace is often on tmpfs, so this is usually a copy across filesystems anyway
+            with open(source, "rb") as source_file:
+                shutil.copyfileobj(source_file, tmp_file)
+
+        return disk_path if self._write_disk(disk_path, size, copy) else None
+
+    def stats(self) -> dict:
+        """Current cache occupancy and hit counters."""
+        return {
+            "entries": len(self._entries),
+            "memory_bytes": self.memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+            "disk_bytes": self.disk_bytes,
+            "max_disk_bytes": self.max_disk_bytes if self.disk_dir else None,
+            "disk_evictions": self.disk_evictions,
+            "disk_write_errors": self.disk_write_errors,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_item_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= len(previous)
+
+        self._entries[key] = data
+        self.memory_bytes += len(data)
+
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _write_disk(self, disk_path: Path, size: int, write: Callable[[BinaryIO], Any]) -> bool:
+        """Write an entry through a temporary file and publish it; False if that failed."""
+        tmp_name = None
+        try:
+            self._make_room(size)
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=disk_path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as tmp_file:
+                write(tmp_file)
+            published = self._publish(tmp_name, disk_path)
+        except OSError as e:
+            # e.g. ENOSPC: serve the result uncached rather than failing the request
+            self.disk_write_errors += 1
+            logger.warning(f"Could not write cached output {disk_path}: {e}")
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+            return False
+        # Another worker's copy is already counted when this one prunes
+        if published:
+            with self._disk_bytes_lock:
+                self.disk_bytes += size
+        return True
+
+    def _make_room(self, size: int):
+        if self.disk_bytes + size <= self.max_disk_bytes:
+            return
+        # Another thread is already pruning; this write may overshoot the budget slightly
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._prune_disk(int(self.max_disk_bytes * self.DISK_PRUNE_TARGET) - size)
+        finally:
+            self._prune_lock.release()
+
+    def _prune_disk(self, target_bytes: int):
+        """Remove the least recently used disk entries until the tier fits in ``target_bytes``."""
+        files = sorted(self._disk_files(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in files)
+        removed = 0
+        for path, _, size in files:
+            if total <= target_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                # Pruned by another worker
+                pass
+            except OSError as e:
+                logger.debug(f"Could not remove cached output {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+        with self._disk_bytes_lock:
+            self.disk_bytes = total
+        self.disk_evictions += removed
+        if removed:
+            logger.info(f"Pruned {removed} cached outputs, disk tier now {total} bytes")
+
+    def _disk_files(self) -> Iterator[Tuple[Path, float, int]]:
+        """(path, mtime, size) of every published disk entry."""
+        for shard in self.disk_dir.iterdir():
+            if not shard.is_dir():
+                continue
+            for path in shard.glob("*.bin"):
+                try:
+                    info = path.stat()
+                except OSError:
+                    continue
+                yield path, info.st_mtime, info.st_size
+
+    @staticmethod
+    def _publish(tmp_name: str, disk_path: Path) -> bool:
+        """Move a written entry into place; False if another writer published the key first."""
+        # A hard link fails if another worker published the key first; keep theirs
+        published = True
+        try:
+            os.link(tmp_name, disk_path)
+        except FileExistsError:
+            published = False
+        except OSError:
+            # Filesystems without hard links: an atomic rename is still safe for readers
+            os.replace(tmp_name, disk_path)
+            return True
+        os.unlink(tmp_name)
+        return published
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        return self.disk_dir / key[:2] / f"{key}.bin"
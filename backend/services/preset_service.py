@@ -0,0 +1,206 @@
+# Style presets from templates/presets/*.toml, merged into memoised effective configs
+
+import logging
+import threading
+import tomllib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from models import TemplateConfig, TemplateOverrides
+from services.template_service import OVERRIDABLE_SECTIONS, TemplateService, _mtime
+
+logger = logging.getLogger(__name__)
+
+# Tables a preset file may contain besides the overridable config sections
+PRESET_METADATA = {"theme"}
+
+class PresetEntry:
+    """One parsed and validated preset file, tagged with the mtime it was read at."""
+
+    def __init__(self, path: Path):
+        self.name = path.stem
+        self.path = path
+        self.mtime = _mtime(path)
+        self.description: Optional[str] = None
+        self.theme: Optional[str] = None
+        self.overrides: Optional[TemplateOverrides] = None
+        self.error: Optional[str] = None
+
+        try:
+            text = path.read_text()
+            data = tomllib.loads(text)
+        except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+            logger.warning(f"Invalid preset {path}: {e}")
+            self.error = f"Invalid TOML: {e}"
+            return
+
+        # The leading comment names the preset, e.g. "# Corporate/Conservative Resume Preset"
+        first_line = text.lstrip().splitlines()[0] if text.strip() else ""
+        if first_line.startswith("#"):
+            self.description = first_line.lstrip("#").strip()
+        self.theme = data.get("theme", {}).get("active")
+
+        try:
+            self.overrides = self._validate(data)
+        except ValueError as e:
+            logger.warning(f"Invalid preset {path}: {e}")
+            self.error = str(e)
+
+    @staticmethod
+    def _validate(data: Dict[str, Any]) -> TemplateOverrides:
+        unknown = set(data) - set(OVERRIDABLE_SECTIONS) - PRESET_METADATA
+        if unknown:
+            raise ValueError(f"Unknown section(s): {', '.join(sorted(unknown))}")
+        sections = {}
+        for section, model in OVERRIDABLE_SECTIONS.items():
+            values = data.get(section, {})
+            if not isinstance(values, dict):
+                raise ValueError(f"[{section}] must be a table")
+            unknown = set(values) - set(model.model_fields)
+            if unknown:
+                raise ValueError(f"Unknown {section} key(s): {', '.join(sorted(unknown))}")
+            try:
+                # Validated but kept as written, so only the keys the preset sets override conf.json
+                model(**values)
+            except ValidationError as e:
+                raise ValueError(f"Invalid [{section}]: {e}")
+            sections[section] = values
+        return TemplateOverrides(**sections)
+
+    def is_stale(self) -> bool:
+        return _mtime(self.path) != self.mtime
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {"name": self.name, "description": self.description, "theme": self.theme}
+        if self.error is not None:
+            summary["error"] = self.error
+        else:
+            summary["overrides"] = self.overrides.model_dump(exclude_defaults=True)
+        return summary
+
+class PresetService:
+    """Named style presets applied on top of any template's conf.json.
+
+    Presets are parsed and validated once per file change. The merge of a template with
+    a preset is memoised per template version, so selecting a preset costs a dictionary
+    lookup; per-request overrides are layered on top of the preset.
+    """
+
+    def __init__(self, presets_dir: Path, template_service: TemplateService, max_configs: int = 256):
+        self.presets_dir = presets_dir
+        self.template_service = template_service
+        self.max_configs = max_configs
+        self._lock = threading.Lock()
+        self._entries: Dict[str, PresetEntry] = {}
+        self._dir_mtime: Optional[int] = None
+        # (template, template version, preset, preset mtime) -> effective config
+        self._configs: "OrderedDict[tuple, TemplateConfig]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reload()
+
+    def reload(self):
+        """Load every preset from disk, replacing the registry."""
+        entries = {}
+        if self.presets_dir.is_dir():
+            for path in sorted(self.presets_dir.glob("*.toml")):
+                entries[path.stem] = PresetEntry(path)
+
+        with self._lock:
+            self._entries = entries
+            self._dir_mtime = _mtime(self.presets_dir)
+            self._configs.clear()
+        logger.info(f"Loaded {len(entries)} presets from {self.presets_dir}")
+
+    def get_all_presets(self) -> List[Dict[str, Any]]:
+        """Get every preset with its description, suggested template and overrides."""
+        self._refresh_directory()
+        return [entry.summary() for entry in (self._get_entry(name) for name in sorted(self._entries)) if entry]
+
+    def get_preset(self, preset_name: str) -> Dict[str, Any]:
+        """Get one preset's summary."""
+        return self._require_entry(preset_name).summary()
+
+    def preset_names(self) -> List[str]:
+        """Names of the presets that loaded without errors."""
+        self._refresh_directory()
+        return [name for name in sorted(self._entries) if self._entries[name].error is None]
+
+    def get_effective_config(self, template_name: str, preset_name: Optional[str] = None,
+                             overrides: Optional[TemplateOverrides] = None) -> TemplateConfig:
+        """A template's config with a preset and then per-request overrides applied in memory."""
+        if not preset_name:
+            return self.template_service.get_effective_config(template_name, overrides)
+
+        entry = self._require_entry(preset_name)
+        if entry.error is not None:
+            raise HTTPException(status_code=500, detail=f"Invalid preset '{preset_name}': {entry.error}")
+        if overrides is not None:
+            return self.template_service.get_effective_config(template_name, self._combine(entry.overrides, overrides))
+
+        key = (template_name, self.template_service.get_template_version(template_name), preset_name, entry.mtime)
+        with self._lock:
+            config = self._configs.get(key)
+            if config is not None:
+                self._configs.move_to_end(key)
+                self.hits += 1
+                return config
+        config = self.template_service.get_effective_config(template_name, entry.overrides)
+        with self._lock:
+            self.misses += 1
+            self._configs[key] = config
+            while len(self._configs) > self.max_configs:
+                self._configs.popitem(last=False)
+        return config
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "presets": len(self._entries),
+                "invalid": sorted(name for name, entry in self._entries.items() if entry.error is not None),
+                "configs": len(self._configs),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    @staticmethod
+    def _combine(preset: TemplateOverrides, overrides: TemplateOverrides) -> TemplateOverrides:
+        # Request values win over the preset, key by key within each section
+        return TemplateOverrides(**{
+            section: {**getattr(preset, section), **getattr(overrides, section)}
+            for section in OVERRIDABLE_SECTIONS
+        })
+
+    def _refresh_directory(self):
+        # Adding or removing a preset changes the directory mtime
+        if _mtime(self.presets_dir) != self._dir_mtime:
+            self.reload()
+
+    def _get_entry(self, preset_name: str) -> Optional[PresetEntry]:
+        entry = self._entries.get(preset_name)
+        if entry is None:
+            self._refresh_directory()
+            entry = self._entries.get(preset_name)
+            if entry is None:
+                return None
+
+        if entry.is_stale():
+            if not entry.path.is_file():
+                with self._lock:
+                    self._entries.pop(preset_name, None)
+                return None
+            logger.info(f"Preset '{preset_name}' changed on disk, reloading")
+            entry = PresetEntry(entry.path)
+            with self._lock:
+                self._entries[preset_name] = entry
+
+        return entry
+
+    def _require_entry(self, preset_name: str) -> PresetEntry:
+        entry = self._get_entry(preset_name)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Preset '{preset_name}' not found")
+        return entry
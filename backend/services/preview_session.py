@@ -0,0 +1,163 @@
+# Debounced, coalescing live-preview sessions
+
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+
+from models import PreviewUpdate
+from services.template_service import TemplateService
+from services.typst_compiler import IMAGE_MEDIA_TYPES, TypstCompiler
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_FORMATS = {"pdf": "application/pdf", **IMAGE_MEDIA_TYPES}
+MIN_PPI, MAX_PPI = 8, 600
+
+# Receives the metadata message and, on success, the compiled document
+PreviewSender = Callable[[Dict[str, Any], Optional[bytes]], Awaitable[None]]
+
+class PreviewSession:
+    """One editor's live preview, compiling at idle points instead of on every keystroke.
+
+    Only the newest pending revision is kept. A compile starts once no update has arrived
+    for ``debounce`` seconds, and an update that arrives while a compile is running
+    cancels it, since its result would be stale before it is shown. So that continuous
+    typing still refreshes the preview, once a revision has waited ``max_wait`` seconds
+    unshown the newest one is compiled without waiting for a pause, and is not cancelled.
+    """
+
+    def __init__(self, template_service: TemplateService, typst_compiler: TypstCompiler, template_name: str,
+                 send: PreviewSender, debounce: float = 0.3, max_wait: Optional[float] = 2.0):
+        self.template_service = template_service
+        self.typst_compiler = typst_compiler
+        self.template_name = template_name
+        self.send = send
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.received = 0
+        self.compiled = 0
+        self.superseded = 0
+        self._pending: Optional[PreviewUpdate] = None
+        self._last_revision = 0
+        self._changed = asyncio.Event()
+        self._compiling: Optional[asyncio.Task] = None
+        # When the oldest revision not yet shown arrived, which max_wait counts from
+        self._unshown_since: Optional[float] = None
+        # Key of this session's document model in the generator
+        self._model_key = f"{template_name}:live:{uuid.uuid4().hex}"
+
+    def submit(self, update: PreviewUpdate):
+        """Replace the pending revision; drop any compile that is now out of date."""
+        if update.revision is None:
+            update.revision = self._last_revision + 1
+        self._last_revision = max(self._last_revision, update.revision)
+        self.received += 1
+        if self._unshown_since is None:
+            self._unshown_since = time.monotonic()
+
+        # The previous revision is dropped whether it was still pending or being compiled,
+        # unless it is overdue, in which case it is shown before this one is compiled
+        cancel = self._compiling is not None and not self._compiling.done() and not self._overdue()
+        if self._pending is not None or cancel:
+            self.superseded += 1
+        self._pending = update
+        if cancel:
+            self._compiling.cancel()
+        self._changed.set()
+
+    async def run(self):
+        """Compile pending revisions until the session is closed."""
+        try:
+            while True:
+                await self._changed.wait()
+                await self._wait_until_idle()
+                update, self._pending = self._pending, None
+                if update is None:
+                    continue
+
+                self._compiling = asyncio.create_task(self._compile(update))
+                await asyncio.wait({self._compiling})
+                if self._compiling.cancelled():
+                    logger.debug(f"Preview revision {update.revision} superseded while compiling")
+                    continue
+                message, document = self._compiling.result()
+                # A revision that arrived during the compile starts its own wait now
+                self._unshown_since = time.monotonic() if self._pending is not None else None
+                await self.send(message, document)
+        finally:
+            if self._compiling is not None and not self._compiling.done():
+                self._compiling.cancel()
+                await asyncio.gather(self._compiling, return_exceptions=True)
+            self.typst_compiler.generator.forget(self._model_key)
+
+    def stats(self) -> dict:
+        """Update counters for this session."""
+        return {"received": self.received, "compiled": self.compiled, "superseded": self.superseded}
+
+    def _overdue(self) -> bool:
+        return self._time_left() <= 0
+
+    def _time_left(self) -> float:
+        """Seconds until the oldest unshown revision has waited ``max_wait``."""
+        if self.max_wait is None or self._unshown_since is None:
+            return float("inf")
+        return self._unshown_since + self.max_wait - time.monotonic()
+
+    async def _wait_until_idle(self):
+        # Every update restarts the quiet period, up to the max_wait deadline
+        while True:
+            self._changed.clear()
+            timeout = min(self.debounce, max(0.0, self._time_left()))
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def _compile(self, update: PreviewUpdate):
+        started = time.perf_counter()
+        message: Dict[str, Any] = {"revision": update.revision, "format": update.format}
+        try:
+            content, files, config = self._resolve(update)
+            if update.format == "pdf":
+                document = await self.typst_compiler.compile_to_bytes(self.template_name, content, config,
+                                                                      files=files)
+            else:
+                document = await self.typst_compiler.render_page_to_bytes(
+                    self.template_name, content, config, update.page, update.format, update.ppi, files=files
+                )
+        except HTTPException as e:
+            message.update({"type": "error", "status": e.status_code, "detail": e.detail})
+            return message, None
+        except Exception as e:
+            logger.error(f"Preview compile of revision {update.revision} failed: {e}")
+            message.update({"type": "error", "status": 500, "detail": str(e)})
+            return message, None
+
+        self.compiled += 1
+        message.update({
+            "type": "compiled",
+            "mediaType": PREVIEW_FORMATS[update.format],
+            "size": len(document),
+            "elapsedMs": round((time.perf_counter() - started) * 1000, 1),
+        })
+        return message, document
+
+    def _resolve(self, update: PreviewUpdate):
+        if update.format not in PREVIEW_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported preview format '{update.format}'")
+        if update.page < 1 or not MIN_PPI <= update.ppi <= MAX_PPI:
+            raise HTTPException(status_code=422, detail=f"page must be >= 1 and ppi between {MIN_PPI} and {MAX_PPI}")
+        if (update.resume is None) == (update.content is None):
+            raise HTTPException(status_code=422, detail="Send exactly one of 'resume' or 'content'")
+
+        # Overrides sent next to the document win over those embedded in the resume
+        overrides = update.overrides or (update.resume.overrides if update.resume is not None else None)
+        config = self.template_service.get_effective_config(self.template_name, overrides)
+        if update.resume is not None:
+            # Sections unchanged since the previous revision are reused, not regenerated
+            generated = self.typst_compiler.generate_document(update.resume, config, self._model_key)
+            return generated.main, generated.files, config
+        return update.content, None, config
@@ -0,0 +1,208 @@
+# Content-hashed, read-only template bundles shared by compile workspaces
+
+import os
+import re
+import stat
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from services.compile_workspace import default_scratch_root, is_template_asset
+
+logger = logging.getLogger(__name__)
+
+# Directory under the scratch root that holds the bundles
+BUNDLES_DIR = "bundles"
+# Characters of the content digest kept in a bundle's directory name
+DIGEST_LENGTH = 16
+# A bundle's mtime is refreshed this often while it is in use, so other workers do not prune it
+TOUCH_INTERVAL = 60
+
+class TemplateBundle(NamedTuple):
+    name: str
+    # sha256 of every bundled file's path and contents
+    digest: str
+    path: Path
+    files: int
+    size: int
+
+def _asset_files(template_dir: Path) -> List[Path]:
+    files = []
+    for entry in sorted(template_dir.iterdir()):
+        if not is_template_asset(entry.name):
+            continue
+        candidates = [entry] if entry.is_file() else sorted(entry.rglob("*"))
+        for path in candidates:
+            relative = path.relative_to(template_dir)
+            if path.is_file() and not any(part.startswith('.') for part in relative.parts):
+                files.append(path)
+    return files
+
+def _make_read_only(root: Path):
+    for directory, _, names in os.walk(root):
+        for name in names:
+            os.chmod(os.path.join(directory, name), 0o444)
+        os.chmod(directory, 0o555)
+
+def _remove_tree(root: Path):
+    def make_writable(function, path, _):
+        os.chmod(os.path.dirname(path), 0o755)
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD | stat.S_IEXEC)
+        function(path)
+    shutil.rmtree(root, onexc=make_writable)
+
+class TemplateBundler:
+    """Packs each template's assets into an immutable copy shared by every compile.
+
+    A bundle is the template tree without stale artefacts, named after a hash of its
+    contents and made read-only. It is materialised once in the scratch root (tmpfs when
+    available) and published with a rename, so worker processes share one copy; compile
+    workspaces only link to it and add their own main file and config. The content hash
+    also serves as the template's cache-key version, so identical templates share cache
+    entries across deploys and a touched but unchanged file does not invalidate them.
+
+    Bundles are looked up by the template's file fingerprint, so templates are only
+    re-read and re-hashed after they change on disk. Requests use ``get``, which never
+    waits for a build: a changed template compiles from its directory until its new
+    bundle is ready. Superseded bundles of a template are removed once unused for
+    ``grace`` seconds; bundles in use are touched regularly.
+    """
+
+    def __init__(self, scratch_root: Optional[Path] = None, grace: float = 600):
+        self.root = (scratch_root or default_scratch_root()) / BUNDLES_DIR
+        self.grace = grace
+        # (template dir, fingerprint) -> bundle
+        self._bundles: Dict[Tuple[str, str], TemplateBundle] = {}
+        self._touched: Dict[Path, float] = {}
+        self._lock = threading.Lock()
+        # Builds started by get(), run one at a time off the event loop
+        self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="template-bundle")
+        self._building: Set[Tuple[str, str]] = set()
+        # Separate from _lock, which is held for a whole build
+        self._building_lock = threading.Lock()
+        self.built = 0
+        self.reused = 0
+        self.failed = 0
+
+    def bundle(self, template_dir: Path, fingerprint: str) -> Optional[TemplateBundle]:
+        """The bundle for a template at the given fingerprint, or None if it cannot be built."""
+        key = (str(template_dir), fingerprint)
+        bundle = self._bundles.get(key)
+        # Rebuilt if something outside this process removed it
+        if bundle is not None and bundle.path.is_dir():
+            self._touch(bundle.path)
+            return bundle
+
+        with self._lock:
+            bundle = self._bundles.get(key)
+            if bundle is not None and bundle.path.is_dir():
+                return bundle
+            try:
+                bundle = self._materialize(template_dir)
+            except OSError as e:
+                self.failed += 1
+                logger.warning(f"Could not bundle template {template_dir.name}, compiling from its directory: {e}")
+                return None
+            # Only the current fingerprint of each template is worth remembering
+            self._bundles = {cached: value for cached, value in self._bundles.items() if cached[0] != key[0]}
+            self._bundles[key] = bundle
+        self._touch(bundle.path)
+        return bundle
+
+    def get(self, template_dir: Path, fingerprint: str) -> Optional[TemplateBundle]:
+        """The bundle if it is ready, else None while it is built in the background."""
+        key = (str(template_dir), fingerprint)
+        bundle = self._bundles.get(key)
+        if bundle is not None and bundle.path.is_dir():
+            self._touch(bundle.path)
+            return bundle
+        with self._building_lock:
+            if key in self._building:
+                return None
+            self._building.add(key)
+        self._builder.submit(self._build, template_dir, fingerprint)
+        return None
+
+    def _build(self, template_dir: Path, fingerprint: str):
+        try:
+            self.bundle(template_dir, fingerprint)
+        finally:
+            with self._building_lock:
+                self._building.discard((str(template_dir), fingerprint))
+
+    def stats(self) -> dict:
+        return {
+            "root": str(self.root),
+            "built": self.built,
+            "reused": self.reused,
+            "failed": self.failed,
+            "bundles": {bundle.name: {"digest": bundle.digest[:DIGEST_LENGTH], "files": bundle.files, "bytes": bundle.size}
+                        for bundle in self._bundles.values()},
+        }
+
+    def _materialize(self, template_dir: Path) -> TemplateBundle:
+        files = _asset_files(template_dir)
+        digest = hashlib.sha256()
+        contents = []
+        for path in files:
+            data = path.read_bytes()
+            contents.append(data)
+            digest.update(path.relative_to(template_dir).as_posix().encode())
+            digest.update(b"\0")
+            digest.update(hashlib.sha256(data).digest())
+        digest = digest.hexdigest()
+        size = sum(len(data) for data in contents)
+
+        target = self.root / f"{template_dir.name}-{digest[:DIGEST_LENGTH]}"
+        if target.is_dir():
+            self.reused += 1
+        else:
+            self.root.mkdir(parents=True, exist_ok=True)
+            staging = Path(tempfile.mkdtemp(prefix=f".{template_dir.name}-", dir=self.root))
+            try:
+                # Written from the bytes that were hashed, so the bundle matches its name
+                for path, data in zip(files, contents):
+                    copy = staging / path.relative_to(template_dir)
+                    copy.parent.mkdir(parents=True, exist_ok=True)
+                    copy.write_bytes(data)
+                _make_read_only(staging)
+                staging.rename(target)
+                self.built += 1
+                logger.info(f"Bundled template {template_dir.name}: {len(files)} files, {size} bytes at {target}")
+            except OSError:
+                _remove_tree(staging)
+                if not target.is_dir():
+                    raise
+                # Another worker published the same bundle first
+                self.reused += 1
+        self._prune(template_dir.name, target)
+        return TemplateBundle(template_dir.name, digest, target, len(files), size)
+
+    def _touch(self, path: Path):
+        now = time.monotonic()
+        if now - self._touched.get(path, float("-inf")) < TOUCH_INTERVAL:
+            return
+        self._touched[path] = now
+        try:
+            os.utime(path)
+        except OSError as e:
+            logger.debug(f"Could not touch bundle {path}: {e}")
+
+    def _prune(self, name: str, current: Path):
+        pattern = re.compile(rf"{re.escape(name)}-[0-9a-f]{{{DIGEST_LENGTH}}}")
+        cutoff = time.time() - self.grace
+        for path in self.root.iterdir():
+            if path == current or not pattern.fullmatch(path.name):
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    _remove_tree(path)
+                    logger.info(f"Removed superseded template bundle {path.name}")
+            except OSError as e:
+                logger.debug(f"Could not remove bundle {path}: {e}")
@@ -1,134 +1,358 @@
 # Template management service
 
+import os
 import json
+import asyncio
 import logging
+import tempfile
+import threading
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from fastapi import HTTPException
+from pydantic import ValidationError
 
-from models import TemplateConfig
+from models import (
+    TemplateAdvanced,
+    TemplateConfig,
+    TemplateFeatures,
+    TemplateFormatting,
+    TemplateOutput,
+    TemplateOverrides,
+    TemplateStyle,
+)
+from services.metrics import stage
+from services.typst_signatures import DOCUMENT_KINDS, LANGUAGE_FILE, FunctionSchema, parse_function_schemas
+from utils.helpers import template_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Config sections that may be overridden per request
+OVERRIDABLE_SECTIONS = {
+    "style": TemplateStyle,
+    "formatting": TemplateFormatting,
+    "features": TemplateFeatures,
+    "advanced": TemplateAdvanced,
+    "output": TemplateOutput,
+}
+
+def deep_update(base_dict: Dict[str, Any], update_dict: Dict[str, Any]):
+    """Recursively merge update_dict into base_dict in place."""
+    for key, value in update_dict.items():
+        if key in base_dict and isinstance(base_dict[key], dict) and isinstance(value, dict):
+            deep_update(base_dict[key], value)
+        else:
+            base_dict[key] = value
+
+def parse_overrides(raw: Optional[str]) -> Optional[TemplateOverrides]:
+    """Parse an overrides object sent as a JSON string (form fields and query parameters)."""
+    if not raw:
+        return None
+    try:
+        return TemplateOverrides(**json.loads(raw))
+    except (json.JSONDecodeError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid overrides: {e}")
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+class TemplateEntry:
+    """Parsed state of one template directory, tagged with the mtimes it was read at."""
+
+    def __init__(self, template_dir: Path):
+        self.name = template_dir.name
+        self.directory = template_dir
+        self.conf_file = template_dir / "conf.json"
+        self.conf_mtime = _mtime(self.conf_file)
+        self.raw_config: Optional[Dict[str, Any]] = None
+        self.config: Optional[TemplateConfig] = None
+        self.error: Optional[str] = None
+        self.schemas: Dict[str, FunctionSchema] = {}
+        self.languages: List[str] = []
+        self.main_mtime: Optional[int] = None
+        self.main_content: Optional[str] = None
+        self.version = template_fingerprint(template_dir)
+
+        if self.conf_mtime is None:
+            return
+
+        try:
+            self.raw_config = json.loads(self.conf_file.read_text())
+        except json.JSONDecodeError as e:
+            logger.warning(f"Invalid JSON in {self.conf_file}: {e}")
+            self.error = "Invalid configuration"
+            return
+
+        try:
+            self.config = TemplateConfig(**self.raw_config)
+        except Exception as e:
+            logger.warning(f"Invalid configuration in {self.conf_file}: {e}")
+            self.error = str(e)
+            return
+
+        # Parsed once per load, so resume items are checked without running typst
+        self.schemas = parse_function_schemas(
+            template_dir, [*self.config.functions, *(self.config.coreFunctions or []), *DOCUMENT_KINDS]
+        )
+        self.languages = self._read_languages(template_dir / LANGUAGE_FILE)
+
+        main_path = template_dir / self.config.mainFile
+        self.main_mtime = _mtime(main_path)
+        if self.main_mtime is not None:
+            self.main_content = main_path.read_text()
+
+    @staticmethod
+    def _read_languages(path: Path) -> List[str]:
+        try:
+            return sorted(tomllib.loads(path.read_text()).get("lang", {}))
+        except FileNotFoundError:
+            return []
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            logger.warning(f"Could not read languages from {path}: {e}")
+            return []
+
+    def is_stale(self) -> bool:
+        """Check whether conf.json or the main file changed since this entry was loaded."""
+        if _mtime(self.conf_file) != self.conf_mtime:
+            return True
+        if self.config is not None and _mtime(self.directory / self.config.mainFile) != self.main_mtime:
+            return True
+        return False
+
 class TemplateService:
-    def __init__(self, templates_dir: Path):
+    """In-memory registry of templates that re-reads a template only when its files change.
+
+    With ``read_only`` the template tree is never written to, so several worker processes
+    can serve the same ``templates/`` directory; per-request overrides still apply.
+    Edits to conf.json and the main file are noticed on the next request; other assets
+    are fingerprinted by a background task started with ``start``, every
+    ``version_check_interval`` seconds, so requests only read the last fingerprint.
+    """
+
+    def __init__(self, templates_dir: Path, version_check_interval: float = 2.0, read_only: bool = False):
         self.templates_dir = templates_dir
-    
+        self.version_check_interval = version_check_interval
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._entries: Dict[str, TemplateEntry] = {}
+        self._dir_mtime: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reload()
+
+    def reload(self):
+        """Load every template from disk, replacing the registry."""
+        template_dirs = []
+        if self.templates_dir.exists():
+            template_dirs = [template_dir for template_dir in self.templates_dir.iterdir()
+                             if template_dir.is_dir() and not template_dir.name.startswith('.')]
+        # Templates are independent and loading one is mostly file reads, so they load side by side
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(template_dirs)))) as pool:
+            entries = {entry.name: entry for entry in pool.map(TemplateEntry, template_dirs)}
+
+        with self._lock:
+            self._entries = entries
+            self._dir_mtime = _mtime(self.templates_dir)
+        logger.info(f"Loaded {len(entries)} templates from {self.templates_dir}")
+
+    def start(self):
+        """Re-fingerprint the templates in the background every ``version_check_interval`` seconds."""
+        self._task = asyncio.create_task(self._refresh_versions_forever())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def refresh_versions(self):
+        """Walk every template tree once and reload the templates whose files changed."""
+        for name, entry in list(self._entries.items()):
+            if not entry.directory.is_dir():
+                continue
+            if template_fingerprint(entry.directory) == entry.version:
+                continue
+            logger.info(f"Template '{name}' assets changed on disk, reloading")
+            reloaded = TemplateEntry(entry.directory)
+            with self._lock:
+                # Unless a request already reloaded it in the meantime
+                if self._entries.get(name) is entry:
+                    self._entries[name] = reloaded
+
     def get_all_templates(self) -> List[Dict[str, Any]]:
         """Get list of all available templates with their configurations."""
+        self._refresh_directory()
         templates = []
-        
-        for template_dir in self.templates_dir.iterdir():
-            if template_dir.is_dir() and not template_dir.name.startswith('.'):
-                conf_file = template_dir / "conf.json"
-                
-                if conf_file.exists():
-                    try:
-                        conf_data = json.loads(conf_file.read_text())
-                        templates.append({
-                            "name": template_dir.name,
-                            "config": conf_data
-                        })
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"Invalid JSON in {conf_file}: {e}")
-                        templates.append({
-                            "name": template_dir.name,
-                            "config": {"functions": [], "error": "Invalid configuration"}
-                        })
-                else:
-                    templates.append({
-                        "name": template_dir.name,
-                        "config": {"functions": []}
-                    })
-        
+
+        for name in sorted(self._entries):
+            entry = self._get_entry(name)
+            if entry is None:
+                continue
+            if entry.raw_config is None and entry.conf_mtime is None:
+                config = {"functions": []}
+            elif entry.raw_config is None:
+                config = {"functions": [], "error": entry.error}
+            else:
+                config = entry.raw_config
+            templates.append({"name": name, "config": config})
+
         return templates
-    
+
     def get_template_config(self, template_name: str) -> TemplateConfig:
         """Get configuration for a specific template."""
-        template_dir = self.templates_dir / template_name
-        
-        if not template_dir.exists() or not template_dir.is_dir():
-            raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found")
-        
-        conf_file = template_dir / "conf.json"
-        
-        if not conf_file.exists():
+        entry = self._require_entry(template_name)
+
+        if entry.conf_mtime is None:
             raise HTTPException(status_code=404, detail=f"Configuration file not found for template '{template_name}'")
-        
-        try:
-            conf_data = json.loads(conf_file.read_text())
-            return TemplateConfig(**conf_data)
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON in {conf_file}: {e}")
+
+        if entry.raw_config is None:
             raise HTTPException(status_code=500, detail=f"Invalid configuration file for template '{template_name}'")
-        except Exception as e:
-            logger.error(f"Error loading template config: {e}")
-            raise HTTPException(status_code=500, detail=f"Error loading template configuration: {str(e)}")
-    
+
+        if entry.config is None:
+            raise HTTPException(status_code=500, detail=f"Error loading template configuration: {entry.error}")
+
+        return entry.config
+
+    def get_effective_config(self, template_name: str, overrides: Optional[TemplateOverrides] = None) -> TemplateConfig:
+        """Get a template's configuration with per-request overrides applied in memory."""
+        with stage("config"):
+            return self._merge_overrides(template_name, overrides)
+
     def get_template_functions(self, template_name: str) -> List[str]:
         """Get available functions for a specific template."""
         config = self.get_template_config(template_name)
         return config.functions
-    
+
+    def get_function_schemas(self, template_name: str) -> Dict[str, FunctionSchema]:
+        """Get the parameter schemas of a template's functions, parsed from its sources."""
+        return self._require_entry(template_name).schemas
+
+    def get_template_languages(self, template_name: str) -> List[str]:
+        """Get the language codes a template has translations for."""
+        return self._require_entry(template_name).languages
+
     def get_template_content(self, template_name: str) -> str:
         """Get the default content for a specific template."""
         config = self.get_template_config(template_name)
-        template_dir = self.templates_dir / template_name
-        main_path = template_dir / config.mainFile
-        
-        if not main_path.exists():
+        entry = self._require_entry(template_name)
+
+        if entry.main_content is None:
             raise HTTPException(
-                status_code=404, 
+                status_code=404,
                 detail=f"Main file '{config.mainFile}' not found in template '{template_name}'"
             )
-        
-        return main_path.read_text()
-    
+
+        return entry.main_content
+
+    def get_template_version(self, template_name: str) -> str:
+        """Get a fingerprint of the template's files, as of the last background check."""
+        return self._require_entry(template_name).version
+
     def template_exists(self, template_name: str) -> bool:
         """Check if a template exists."""
-        template_dir = self.templates_dir / template_name
-        return template_dir.exists() and template_dir.is_dir()
-    
+        return self._get_entry(template_name) is not None
+
     def get_template_directory(self, template_name: str) -> Path:
         """Get the directory path for a template."""
-        if not self.template_exists(template_name):
-            raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found")
-        return self.templates_dir / template_name
-    
+        return self._require_entry(template_name).directory
+
     def update_template_config(self, template_name: str, updated_config: Dict[str, Any]) -> Dict[str, Any]:
         """Update template configuration (for dynamic styling)."""
-        template_dir = self.templates_dir / template_name
-        
-        if not template_dir.exists() or not template_dir.is_dir():
-            raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found")
-        
-        conf_file = template_dir / "conf.json"
-        
-        if not conf_file.exists():
+        if self.read_only:
+            raise HTTPException(
+                status_code=403,
+                detail="The template store is read-only; send per-request overrides instead"
+            )
+        entry = self._require_entry(template_name)
+        conf_file = entry.conf_file
+
+        if entry.conf_mtime is None:
             raise HTTPException(status_code=404, detail=f"Configuration file not found for template '{template_name}'")
-        
+
         try:
-            # Read current config
-            current_config = json.loads(conf_file.read_text())
-            
-            # Update with new values (deep merge)
-            def deep_update(base_dict, update_dict):
-                for key, value in update_dict.items():
-                    if key in base_dict and isinstance(base_dict[key], dict) and isinstance(value, dict):
-                        deep_update(base_dict[key], value)
-                    else:
-                        base_dict[key] = value
-            
-            deep_update(current_config, updated_config)
-            
-            # Write back to file
-            conf_file.write_text(json.dumps(current_config, indent=2))
-            
+            with self._lock:
+                # Read current config
+                current_config = json.loads(conf_file.read_text())
+
+                # Update with new values (deep merge)
+                deep_update(current_config, updated_config)
+
+                # Write to a sibling file and swap it in so readers never see a partial file
+                fd, tmp_name = tempfile.mkstemp(dir=conf_file.parent, prefix=".conf-", suffix=".json")
+                with os.fdopen(fd, "w") as tmp_file:
+                    tmp_file.write(json.dumps(current_config, indent=2))
+                os.replace(tmp_name, conf_file)
+
+                self._entries[template_name] = TemplateEntry(entry.directory)
+
             return {"message": f"Template '{template_name}' configuration updated successfully", "config": current_config}
-            
+
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in {conf_file}: {e}")
             raise HTTPException(status_code=500, detail=f"Invalid configuration file for template '{template_name}'")
         except Exception as e:
             logger.error(f"Error updating template config: {e}")
             raise HTTPException(status_code=500, detail=f"Error updating template configuration: {str(e)}")
+
+    async def _refresh_versions_forever(self):
+        while True:
+            await asyncio.sleep(self.version_check_interval)
+            try:
+                await asyncio.to_thread(self.refresh_versions)
+            except Exception as e:
+                logger.error(f"Template version check failed: {e}")
+
+    def _refresh_directory(self):
+        # Adding or removing a template changes the directory mtime
+        if _mtime(self.templates_dir) != self._dir_mtime:
+            self.reload()
+
+    def _get_entry(self, template_name: str) -> Optional[TemplateEntry]:
+        entry = self._entries.get(template_name)
+        if entry is None:
+            self._refresh_directory()
+            entry = self._entries.get(template_name)
+            if entry is None:
+                return None
+
+        if not entry.directory.is_dir():
+            with self._lock:
+                self._entries.pop(template_name, None)
+            return None
+
+        if entry.is_stale():
+            logger.info(f"Template '{template_name}' changed on disk, reloading")
+            entry = TemplateEntry(entry.directory)
+            with self._lock:
+                self._entries[template_name] = entry
+
+        return entry
+
+    def _require_entry(self, template_name: str) -> TemplateEntry:
+        entry = self._get_entry(template_name)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found")
+        return entry
+
+    def _merge_overrides(self, template_name: str, overrides: Optional[TemplateOverrides]) -> TemplateConfig:
+        config = self.get_template_config(template_name)
+        if overrides is None:
+            return config
+
+        merged = config.model_dump()
+        for section, model in OVERRIDABLE_SECTIONS.items():
+            changes = getattr(overrides, section)
+            unknown = set(changes) - set(model.model_fields)
+            if unknown:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Unknown {section} override(s): {', '.join(sorted(unknown))}"
+                )
+            deep_update(merged[section], changes)
+
+        try:
+            return TemplateConfig(**merged)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid overrides: {e}")
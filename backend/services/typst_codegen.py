@@ -0,0 +1,313 @@
+# Typst source generation for JSON resumes
+
+import re
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+from fastapi import HTTPException
+
+from models import CoverLetter, ResumeData, ResumeSection, TemplateConfig
+from services.typst_signatures import FunctionSchema
+
+logger = logging.getLogger(__name__)
+
+# Typst identifiers: letters, digits, '_' and '-', not starting with a digit or '-'
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_-]*$")
+
+# Characters with meaning in Typst markup; a backslash makes any of them literal
+MARKUP_SPECIAL = re.compile(r"([\\#*_`$<>@\[\]~/])")
+# Markup that only matters at the start of a line (headings, lists, enums)
+MARKUP_LINE_START = re.compile(r"^(\s*)([=+-]|\d+\.)")
+
+STRING_ESCAPES = {"\\": "\\\\", "\"": "\\\"", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+RULE = "// " + "=" * 78
+
+PERSONAL_INFO_REQUIRED = ("firstname", "lastname", "email")
+
+# Generated sections are written as separate files in the workspace and included from main
+SECTIONS_DIR = "sections"
+# Included files are evaluated in their own scope, so each one imports the template functions
+SECTION_PREAMBLE = '#import "/src/resume.typ": *\n\n'
+
+def escape_string(value: str) -> str:
+    """Quote a value as a Typst string literal."""
+    return '"' + "".join(STRING_ESCAPES.get(char, char) for char in value) + '"'
+
+def escape_markup(value: str) -> str:
+    """Escape text so it renders literally inside a Typst content block."""
+    value = " ".join(value.split())
+    value = MARKUP_SPECIAL.sub(r"\\\1", value)
+    return MARKUP_LINE_START.sub(r"\1\\\2", value)
+
+def typst_value(value: Any) -> str:
+    """Render a JSON value as a Typst expression."""
+    if value is None:
+        return "none"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)):
+        return "(" + "".join(f"{typst_value(item)}, " for item in value) + ")"
+    if isinstance(value, dict):
+        if not value:
+            return "(:)"
+        return "(" + ", ".join(f"{typst_key(key)}: {typst_value(item)}" for key, item in value.items()) + ")"
+    # Numbers are passed as strings, which is what the templates expect for dates, GPAs, ...
+    return escape_string(str(value))
+
+def typst_key(key: str) -> str:
+    """Emit a dictionary/argument key, quoting it when it is not a plain identifier."""
+    return key if IDENTIFIER.match(key) else escape_string(key)
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+class SectionFragment(NamedTuple):
+    digest: str
+    path: str
+    source: str
+    # Generated function call per item digest, reused when a later revision edits the section
+    items: Dict[str, str]
+
+class GeneratedDocument:
+    """Typst source split into a main file and one content-addressed include file per section.
+
+    Section files are named after a hash of their source, so an unchanged section keeps
+    the same file across revisions and the main file alone identifies the whole document.
+    """
+
+    def __init__(self, head: str, sections: List[SectionFragment], reused: int = 0):
+        self.head = head
+        self.sections = sections
+        self.reused = reused
+        self.main = head + "".join(f'#include "{section.path}"\n' for section in sections)
+
+    @property
+    def files(self) -> Dict[str, str]:
+        """Workspace-relative path to source for every section file."""
+        return {section.path: section.source for section in self.sections}
+
+    def flatten(self) -> str:
+        """The equivalent single-file source, with every section inlined."""
+        return self.head + "".join(section.source[len(SECTION_PREAMBLE):] for section in self.sections)
+
+class TemplateSignature:
+    """Per-template data that only depends on the config: allowed calls and the fixed preamble."""
+
+    def __init__(self, config: TemplateConfig):
+        self.name = config.name
+        self.functions: FrozenSet[str] = frozenset(config.functions)
+        self.header = "\n".join([
+            RULE,
+            "// RESUME GENERATOR - AUTO-GENERATED FROM JSON",
+            f"// Template: {config.displayName}",
+            "// Configuration loaded from: conf.json",
+            RULE,
+            "",
+            '#import "src/resume.typ": *',
+            "",
+            RULE,
+            "// PERSONAL INFORMATION",
+            RULE,
+            "#let author-info = (",
+            "",
+        ])
+        self.show_rule = self.show_rule_for("resume")
+
+    @staticmethod
+    def show_rule_for(kind: str, language: Optional[str] = None) -> str:
+        """Close the author info and apply the template's resume or cover letter function."""
+        arguments = f", language: {escape_string(language)}" if language else ""
+        return "\n".join([
+            ")",
+            "",
+            RULE,
+            "// APPLY THEME WITH DATA",
+            "// Configuration is automatically loaded from conf.json by the template",
+            RULE,
+            f"#show: {kind}.with(author-info{arguments})",
+            "",
+            RULE,
+            "// COVER LETTER CONTENT" if kind == "coverletter" else "// RESUME CONTENT",
+            RULE,
+            "",
+            "",
+        ])
+
+class TypstGenerator:
+    """Validates ResumeData against a template and emits its Typst source in one pass."""
+
+    def __init__(self, max_sessions: int = 256,
+                 schemas: Optional[Callable[[str], Dict[str, FunctionSchema]]] = None):
+        self.max_sessions = max_sessions
+        # Template name -> parameter schemas of its functions, when sources are available
+        self.schemas = schemas
+        self._signatures: Dict[Tuple[str, str, Tuple[str, ...]], TemplateSignature] = {}
+        # Last generated document per editing session, used to skip unchanged sections
+        self._documents: "OrderedDict[str, GeneratedDocument]" = OrderedDict()
+
+    def signature(self, config: TemplateConfig) -> TemplateSignature:
+        """Return the memoised signature for a template config."""
+        key = (config.name, config.displayName, tuple(config.functions))
+        signature = self._signatures.get(key)
+        if signature is None:
+            signature = TemplateSignature(config)
+            self._signatures[key] = signature
+        return signature
+
+    def validate(self, resume_data: ResumeData, config: TemplateConfig):
+        """Check item types and argument names before any process is spawned."""
+        signature = self.signature(config)
+        errors = self.collect_errors(resume_data, signature, self._schemas(config))
+        if errors:
+            raise HTTPException(status_code=422, detail={"message": "Invalid resume data", "errors": errors})
+
+    def collect_errors(self, resume_data: ResumeData, signature: TemplateSignature,
+                       schemas: Optional[Dict[str, FunctionSchema]] = None) -> List[Dict[str, Any]]:
+        """List every problem found in the document instead of stopping at the first."""
+        errors = []
+        for section_index, section in enumerate(resume_data.sections):
+            for item_index, item in enumerate(section.items):
+                location = {"section": section_index, "item": item_index, "type": item.type}
+                if item.type not in signature.functions:
+                    errors.append({
+                        **location,
+                        "error": f"Unknown function '{item.type}' for template '{signature.name}'",
+                        "allowed": sorted(signature.functions),
+                    })
+                    continue
+                invalid = [key for key in item.data if not IDENTIFIER.match(key)]
+                for key in invalid:
+                    errors.append({**location, "field": key, "error": "Argument names must be Typst identifiers"})
+                schema = schemas.get(item.type) if schemas else None
+                if schema is not None and not invalid:
+                    errors.extend({**location, **error} for error in schema.check(item.data))
+        return errors
+
+    def generate(self, resume_data: ResumeData, config: TemplateConfig) -> str:
+        """Validate and convert JSON resume data to Typst source."""
+        self.validate(resume_data, config)
+        signature = self.signature(config)
+        schemas = self._schemas(config)
+        parts = [signature.header]
+        self._write_author_info(parts, resume_data)
+        parts.append(signature.show_rule)
+        for section in resume_data.sections:
+            parts.append(self.generate_section(section.title, [(item.type, item.data) for item in section.items],
+                                               schemas))
+        return "".join(parts)
+
+    def generate_document(self, resume_data: ResumeData, config: TemplateConfig,
+                          session: Optional[str] = None, language: Optional[str] = None) -> GeneratedDocument:
+        """Validate and convert JSON resume data, regenerating only sections that changed.
+
+        With a session key the previous revision's model is diffed at section and item
+        level, and unchanged fragments are reused verbatim. Section files do not depend on
+        the language, so variants of one resume in several languages share them.
+        """
+        self.validate(resume_data, config)
+        signature = self.signature(config)
+        schemas = self._schemas(config)
+        previous = self._documents.get(session) if session is not None else None
+        known_sections: Dict[str, SectionFragment] = {}
+        known_items: Dict[str, str] = {}
+        if previous is not None:
+            for fragment in previous.sections:
+                known_sections[fragment.digest] = fragment
+                known_items.update(fragment.items)
+
+        parts = [signature.header]
+        self._write_author_info(parts, resume_data)
+        parts.append(signature.show_rule_for("resume", language) if language else signature.show_rule)
+
+        sections: List[SectionFragment] = []
+        reused = 0
+        for section in resume_data.sections:
+            digest = _digest(section.model_dump())
+            fragment = known_sections.get(digest)
+            if fragment is None:
+                fragment = self._generate_section_file(digest, section, known_items, schemas)
+            else:
+                reused += 1
+            sections.append(fragment)
+
+        document = GeneratedDocument("".join(parts), sections, reused)
+        if session is not None:
+            self._documents[session] = document
+            self._documents.move_to_end(session)
+            while len(self._documents) > self.max_sessions:
+                self._documents.popitem(last=False)
+        return document
+
+    def generate_cover_letter(self, resume_data: ResumeData, letter: CoverLetter, config: TemplateConfig,
+                              language: Optional[str] = None) -> str:
+        """Convert the candidate's details and a cover letter to Typst source for the same template."""
+        signature = self.signature(config)
+        parts = [signature.header]
+        self._write_author_info(parts, resume_data)
+        parts.append(signature.show_rule_for("coverletter", language))
+        parts.append(self.generate_function("letter-heading", {
+            "job-position": letter.job_position,
+            "addressee": letter.addressee,
+            "dear": letter.dear,
+        }))
+        parts.extend(f"#coverletter-content[{escape_markup(paragraph)}]\n\n" for paragraph in letter.paragraphs)
+        return "".join(parts)
+
+    def forget(self, session: str):
+        """Drop the model kept for an editing session."""
+        self._documents.pop(session, None)
+
+    def generate_section(self, title: str, items: List[Tuple[str, Dict[str, Any]]],
+                         schemas: Optional[Dict[str, FunctionSchema]] = None) -> str:
+        """Emit one section heading and its function calls."""
+        parts = [f"= {escape_markup(title)}\n\n"]
+        for func_type, data in items:
+            parts.append(self.generate_function(func_type, data, (schemas or {}).get(func_type)))
+        parts.append("\n")
+        return "".join(parts)
+
+    def generate_function(self, func_type: str, data: Dict[str, Any], schema: Optional[FunctionSchema] = None) -> str:
+        """Emit a Typst function call from type and data."""
+        parts = [f"#{func_type}(\n"]
+        for key, value in data.items():
+            if value is None:
+                continue
+            if (isinstance(value, list) and value and all(isinstance(item, str) for item in value)
+                    and not (schema is not None and schema.takes_array(key))):
+                # String array - format as Typst list for descriptions
+                parts.append(f"  {typst_key(key)}: [\n")
+                parts.extend(f"    - {escape_markup(item)}\n" for item in value)
+                parts.append("  ],\n")
+            else:
+                parts.append(f"  {typst_key(key)}: {typst_value(value)},\n")
+        parts.append(")\n\n")
+        return "".join(parts)
+
+    def _generate_section_file(self, digest: str, section: ResumeSection, known_items: Dict[str, str],
+                               schemas: Optional[Dict[str, FunctionSchema]] = None) -> SectionFragment:
+        parts = [SECTION_PREAMBLE, f"= {escape_markup(section.title)}\n\n"]
+        items = {}
+        for item in section.items:
+            item_digest = _digest([item.type, item.data])
+            call = known_items.get(item_digest) or self.generate_function(item.type, item.data,
+                                                                          (schemas or {}).get(item.type))
+            items[item_digest] = call
+            parts.append(call)
+        parts.append("\n")
+        source = "".join(parts)
+        path = f"{SECTIONS_DIR}/{hashlib.sha256(source.encode()).hexdigest()[:20]}.typ"
+        return SectionFragment(digest, path, source, items)
+
+    def _schemas(self, config: TemplateConfig) -> Dict[str, FunctionSchema]:
+        return self.schemas(config.name) if self.schemas is not None else {}
+
+    @staticmethod
+    def _write_author_info(parts: List[str], resume_data: ResumeData):
+        info = resume_data.personalInfo.model_dump(exclude_none=True)
+        for field in PERSONAL_INFO_REQUIRED:
+            parts.append(f"  {field}: {typst_value(info.pop(field))},\n")
+        for field, value in info.items():
+            parts.append(f"  {field}: {typst_value(value)},\n")
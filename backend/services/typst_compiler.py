@@ -1,166 +1,465 @@
 # Typst compilation service
 
-import subprocess
-import shutil
+import time
+import asyncio
 import logging
 from pathlib import Path
-from typing import Dict, Any
-from fastapi import HTTPException
-from fastapi.responses import Response
+from typing import Dict, Any, AsyncIterator, List, Optional, Sequence, Tuple, Union
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from starlette.background import BackgroundTask
 
 from models import ResumeData, TemplateConfig
+from services.compile_pool import CompilePool
+from services.compile_workspace import CompileWorkspace
+from services.font_index import FontIndex
+from services.output_optimizer import OutputOptimizer, choose_encoding
+from services.metrics import read_typst_timings, record_stage, stage
+from services.pdf_cache import PDFCache
+from services.template_bundle import TemplateBundler
+from services.template_service import TemplateService
+from services.typst_codegen import GeneratedDocument, TypstGenerator
+from services.watch_pool import TypstWatchPool
+from utils.helpers import etag_matches, parse_byte_range, template_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Header identifying a live-preview editing session
+PREVIEW_SESSION_HEADER = "x-preview-session"
+
+# Raster/vector page renders supported by `typst compile --format`
+IMAGE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+DEFAULT_PPI = 72
+
+# Trace written by `typst compile --timings` inside the workspace
+TIMINGS_FILE = "timings.json"
+
 class TypstCompiler:
-    def __init__(self, templates_dir: Path):
+    def __init__(self, templates_dir: Path, compile_pool: Optional[CompilePool] = None,
+                 scratch_root: Optional[Path] = None, cache: Optional[PDFCache] = None,
+                 watch_pool: Optional[TypstWatchPool] = None,
+                 template_service: Optional[TemplateService] = None, typst_timings: bool = False,
+                 font_index: Optional[FontIndex] = None, bundler: Optional[TemplateBundler] = None):
         self.templates_dir = templates_dir
+        self.template_service = template_service
+        self.compile_pool = compile_pool or CompilePool()
+        self.scratch_root = scratch_root
+        self.cache = cache or PDFCache()
+        self.watch_pool = watch_pool
+        # Ask typst for its own phase timings (eval, layout, export) on every compile
+        self.typst_timings = typst_timings
+        # Restricts typst to the fonts the templates use once the index is built
+        self.font_index = font_index
+        # Compiles link to read-only content-hashed copies of the templates when given
+        self.bundler = bundler
+        self.optimizer = OutputOptimizer()
+        self.generator = TypstGenerator(
+            schemas=template_service.get_function_schemas if template_service is not None else None
+        )
     
-    def compile_template(self, template_name: str, content: str, config: TemplateConfig) -> Response:
-        """Compile a template with custom content."""
-        template_dir = self.templates_dir / template_name
+    async def compile_template(self, template_name: str, content: str, config: TemplateConfig,
+                               request: Optional[Request] = None, files: Optional[Dict[str, str]] = None) -> Response:
+        """Compile a template with custom content and optional generated include files."""
+        cache_key = self.cache_key(template_name, content, config)
+        encoding = self._response_encoding(config, request)
+        etag = f'"{cache_key}-{encoding}"' if encoding else f'"{cache_key}"'
+        headers = {
+            "Content-Disposition": f"inline; filename={template_name}-resume.pdf",
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+        }
+        
+        # Output is fully determined by the key, so a matching validator needs no body
+        if request is not None and etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": headers["Cache-Control"]})
         
-        # File paths
-        temp_main = template_dir / f"temp_{config.mainFile}"
-        original_main = template_dir / config.mainFile
-        backup_main = template_dir / f"{config.mainFile}.backup"
-        output_file = template_dir / "output.pdf"
+        if encoding is not None:
+            return await self._compressed_pdf_response(template_name, content, config, encoding, headers,
+                                                       request, files)
         
+        with stage("cache"):
+            cached = self.cache.lookup(cache_key)
+        if cached is not None:
+            logger.info(f"Serving cached compile for template {template_name}")
+            headers["X-Cache"] = "HIT"
+            with stage("response"):
+                return self._pdf_response(cached, headers, request)
+        
+        headers["X-Cache"] = "MISS"
+        if self._watch_session(request) is not None:
+            pdf_content = await self._compile_pdf(template_name, content, config, request, files)
+            with stage("response"):
+                await self.cache.put(cache_key, pdf_content)
+                return self._pdf_response(pdf_content, headers, request)
+        
+        workspace = await self._compile_to_workspace(template_name, content, config, request, files=files)
+        output_file = workspace.output_path
+        streaming = False
+        response_started = time.perf_counter()
         try:
-            # Backup original if it exists
-            if original_main.exists():
-                shutil.copy2(original_main, backup_main)
-            
-            # Write user content
-            temp_main.write_text(content)
+            if self.cache.disk_dir is not None:
+                # Served from the disk tier; if it could not be written, from the workspace below
+                cached_file = await self.cache.put_file(cache_key, output_file)
+                if cached_file is not None:
+                    return self._pdf_response(cached_file, headers, request)
             
-            # Compile
-            cmd = ["typst", "compile", f"temp_{config.mainFile}", "output.pdf"]
-            logger.info(f"Compiling template {template_name}: {' '.join(cmd)}")
-            
-            result = subprocess.run(
-                cmd,
-                cwd=template_dir,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            if output_file.stat().st_size <= self.cache.max_item_bytes:
+                pdf_content = output_file.read_bytes()
+                await self.cache.put(cache_key, pdf_content)
+                return self._pdf_response(pdf_content, headers, request)
             
-            if result.returncode != 0:
-                logger.error(f"Template compilation failed: {result.stderr}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Template compilation failed: {result.stderr}"
-                )
-            
-            if not output_file.exists():
-                raise HTTPException(
-                    status_code=500,
-                    detail="PDF output file was not created"
-                )
-            
-            # Read PDF content
-            pdf_content = output_file.read_bytes()
-            logger.info(f"Successfully compiled template {template_name}, size: {len(pdf_content)} bytes")
-            
-            return Response(
-                content=pdf_content,
+            # Too large to keep in memory: stream it and drop the workspace once the body is sent
+            streaming = True
+            return FileResponse(
+                output_file,
                 media_type="application/pdf",
-                headers={"Content-Disposition": f"inline; filename={template_name}-resume.pdf"}
+                headers=headers,
+                background=BackgroundTask(workspace.cleanup)
             )
-            
         finally:
-            # Cleanup
-            for cleanup_file in [temp_main, output_file]:
-                try:
-                    if cleanup_file.exists():
-                        cleanup_file.unlink()
-                except Exception:
-                    pass
-            
-            # Restore backup if it exists
-            if backup_main.exists():
-                if original_main.exists():
-                    original_main.unlink()
-                shutil.move(backup_main, original_main)
+            if not streaming:
+                workspace.cleanup()
+            record_stage("response", time.perf_counter() - response_started)
     
-    def compile_json_resume(self, template_name: str, resume_data: ResumeData, config: TemplateConfig) -> Response:
-        """Compile a resume from JSON data."""
-        # Convert JSON to Typst content with template styling
-        typst_content = self.convert_to_typst(resume_data, config)
-        return self.compile_template(template_name, typst_content, config)
+    async def compile_to_bytes(self, template_name: str, content: str, config: TemplateConfig,
+                               request: Optional[Request] = None, files: Optional[Dict[str, str]] = None) -> bytes:
+        """Compile content to PDF bytes, serving identical documents from the cache."""
+        cache_key = self.cache_key(template_name, content, config)
+        with stage("cache"):
+            pdf_content = self.cache.get(cache_key)
+        if pdf_content is None:
+            pdf_content = await self._compile_pdf(template_name, content, config, request, files)
+            await self.cache.put(cache_key, pdf_content)
+        return pdf_content
     
-    def convert_to_typst(self, resume_data: ResumeData, config: TemplateConfig) -> str:
-        """Convert JSON resume data to Typst template format with styling."""
-        typst_content = f"""// ==============================================================================
-// RESUME GENERATOR - AUTO-GENERATED FROM JSON
-// Template: {config.displayName}
-// Configuration loaded from: conf.json
-// ==============================================================================
-
-#import "src/resume.typ": *
-
-// ==============================================================================
-// PERSONAL INFORMATION
-// ==============================================================================
-#let author-info = (
-  firstname: "{resume_data.personalInfo.firstname}",
-  lastname: "{resume_data.personalInfo.lastname}",
-  email: "{resume_data.personalInfo.email}","""
-
-        # Add optional personal info fields
-        for field, value in resume_data.personalInfo.dict().items():
-            if field not in ['firstname', 'lastname', 'email'] and value is not None:
-                if isinstance(value, list):
-                    value_str = ", ".join(f'"{v}"' for v in value)
-                    typst_content += f'\n  {field}: ({value_str}),'
-                else:
-                    typst_content += f'\n  {field}: "{value}",'
-
-        typst_content += """
-)
-
-// ==============================================================================
-// APPLY THEME WITH DATA
-// Configuration is automatically loaded from conf.json by the template
-// ==============================================================================
-#show: resume.with(author-info)
-
-// ==============================================================================
-// RESUME CONTENT
-// ==============================================================================
+    async def render_page(self, template_name: str, content: str, config: TemplateConfig, page: int = 1,
+                          output_format: str = "png", ppi: int = DEFAULT_PPI,
+                          request: Optional[Request] = None) -> Response:
+        """Render a single page to PNG or SVG using typst's native image export."""
+        cache_key = self._image_cache_key(template_name, content, config, page, output_format, ppi)
+        etag = f'"{cache_key}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        
+        if request is not None and etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        with stage("cache"):
+            image = self.cache.get(cache_key)
+        if image is not None:
+            headers["X-Cache"] = "HIT"
+        else:
+            image = await self._render_image(template_name, content, config, page, output_format, ppi, request)
+            await self.cache.put(cache_key, image)
+            headers["X-Cache"] = "MISS"
+        
+        return Response(content=image, media_type=IMAGE_MEDIA_TYPES[output_format], headers=headers)
+    
+    async def render_page_to_bytes(self, template_name: str, content: str, config: TemplateConfig, page: int = 1,
+                                   output_format: str = "png", ppi: int = DEFAULT_PPI,
+                                   request: Optional[Request] = None,
+                                   files: Optional[Dict[str, str]] = None) -> bytes:
+        """Render a single page to image bytes, serving identical renders from the cache."""
+        cache_key = self._image_cache_key(template_name, content, config, page, output_format, ppi)
+        with stage("cache"):
+            image = self.cache.get(cache_key)
+        if image is None:
+            image = await self._render_image(template_name, content, config, page, output_format, ppi,
+                                             request, files)
+            await self.cache.put(cache_key, image)
+        return image
+    
+    def cache_key(self, template_name: str, content: str, config: TemplateConfig, *extra: str) -> str:
+        """Content-addressed key for a compile of this template, config and source."""
+        return PDFCache.make_key(self._template_version(template_name), config, content, *extra)
+    
+    def _image_cache_key(self, template_name: str, content: str, config: TemplateConfig, page: int,
+                         output_format: str, ppi: int) -> str:
+        if output_format not in IMAGE_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported image format '{output_format}'")
+        # SVG output does not depend on the resolution
+        ppi_key = str(ppi) if output_format == "png" else ""
+        return self.cache_key(template_name, content, config, output_format, str(page), ppi_key)
+    
+    async def _render_image(self, template_name: str, content: str, config: TemplateConfig, page: int,
+                            output_format: str, ppi: int, request: Optional[Request] = None,
+                            files: Optional[Dict[str, str]] = None) -> bytes:
+        extra_args = ["--format", output_format, "--pages", str(page)]
+        if output_format == "png":
+            extra_args += ["--ppi", str(ppi)]
+        workspace = await self._compile_to_workspace(template_name, content, config, request,
+                                                     output_format, extra_args, files)
+        try:
+            with stage("readback"):
+                return workspace.output_for(output_format).read_bytes()
+        finally:
+            workspace.cleanup()
+    
+    def _response_encoding(self, config: TemplateConfig, request: Optional[Request]) -> Optional[str]:
+        # Range requests address bytes of the PDF itself, so they are always served unencoded
+        if not config.output.compress_previews or request is None or request.headers.get("range"):
+            return None
+        return choose_encoding(request.headers.get("accept-encoding"))
+    
+    async def _compressed_pdf_response(self, template_name: str, content: str, config: TemplateConfig,
+                                       encoding: str, headers: Dict[str, str], request: Optional[Request],
+                                       files: Optional[Dict[str, str]]) -> Response:
+        """Serve the PDF with a content encoding; the encoded body is cached next to the PDF."""
+        encoded_key = self.cache_key(template_name, content, config, "encoding", encoding)
+        with stage("cache"):
+            body = self.cache.get(encoded_key)
+        headers = {**headers, "Content-Encoding": encoding, "Vary": "Accept-Encoding",
+                   "X-Cache": "HIT" if body is not None else "MISS"}
+        if body is None:
+            pdf_content = await self.compile_to_bytes(template_name, content, config, request, files)
+            with stage("compress"):
+                body = self.optimizer.compress(pdf_content, encoding)
+            await self.cache.put(encoded_key, body)
+        return Response(content=body, media_type="application/pdf", headers=headers)
+    
+    def bundle_templates(self) -> List[str]:
+        """Build the bundle of every template up front; returns the names bundled."""
+        if self.bundler is None or not self.templates_dir.is_dir():
+            return []
+        bundled = []
+        for template_dir in sorted(self.templates_dir.iterdir()):
+            if not template_dir.is_dir() or not (template_dir / "conf.json").is_file():
+                continue
+            if self.bundler.bundle(template_dir, self._template_fingerprint(template_dir.name)) is not None:
+                bundled.append(template_dir.name)
+        return bundled
 
-"""
+    def _template_version(self, template_name: str) -> str:
+        return self._template_source(template_name)[1]
 
-        # Generate sections
-        for section in resume_data.sections:
-            typst_content += f"= {section.title}\\n\\n"
-            
-            for item in section.items:
-                typst_content += self.generate_typst_function(item.type, item.data)
-            
-            typst_content += '\\n'
+    def _template_fingerprint(self, template_name: str) -> str:
+        # The registry memoises fingerprints; without one, walk the template tree
+        if self.template_service is not None:
+            return self.template_service.get_template_version(template_name)
+        return template_fingerprint(self.templates_dir / template_name)
 
-        return typst_content
+    def _template_source(self, template_name: str) -> Tuple[Path, str]:
+        """The directory compiles link to and the version that keys their cache entries."""
+        template_dir = self.templates_dir / template_name
+        fingerprint = self._template_fingerprint(template_name)
+        if self.bundler is not None:
+            # Never builds on the event loop; until the bundle is ready, compile from the directory
+            bundle = self.bundler.get(template_dir, fingerprint)
+            if bundle is not None:
+                # The content hash is the stronger version: equal contents, equal cache keys
+                return bundle.path, bundle.digest
+        return template_dir, fingerprint
+    
+    def _watch_session(self, request: Optional[Request]) -> Optional[str]:
+        # Live-preview sessions reuse a warm `typst watch` process when that backend is enabled
+        if self.watch_pool is None or request is None:
+            return None
+        return request.headers.get(PREVIEW_SESSION_HEADER) or None
+    
+    def _pdf_response(self, body: Union[bytes, Path], headers: Dict[str, str],
+                      request: Optional[Request] = None) -> Response:
+        """Serve a file (with Range support from FileResponse) or in-memory bytes."""
+        if isinstance(body, Path):
+            return FileResponse(body, media_type="application/pdf", headers=headers)
+        
+        headers = {**headers, "Accept-Ranges": "bytes"}
+        byte_range = parse_byte_range(request.headers.get("range"), len(body)) if request is not None else None
+        if byte_range is None:
+            return Response(content=body, media_type="application/pdf", headers=headers)
+        
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+        return Response(
+            content=memoryview(body)[start:end + 1].tobytes(),
+            status_code=206,
+            media_type="application/pdf",
+            headers=headers
+        )
+    
+    async def _compile_pdf(self, template_name: str, content: str, config: TemplateConfig,
+                           request: Optional[Request] = None, files: Optional[Dict[str, str]] = None) -> bytes:
+        """Compile and return the PDF bytes, discarding the workspace."""
+        session_id = self._watch_session(request)
+        if session_id is not None:
+            logger.info(f"Compiling template {template_name} in watch session {session_id}")
+            template_dir = self._template_source(template_name)[0]
+            # The same fonts and optimized images as a one-shot compile, which shares its cache key
+            with stage("optimize"):
+                assets = self.optimizer.optimized_images(template_dir, config.output)
+            async with self.compile_pool.slot():
+                with stage("typst"):
+                    return await self.watch_pool.compile(
+                        f"{template_name}:{session_id}", template_dir, config.mainFile, content,
+                        config.model_dump(), files, self._font_args(config), assets
+                    )
+        
+        workspace = await self._compile_to_workspace(template_name, content, config, request, files=files)
+        try:
+            with stage("readback"):
+                return workspace.output_path.read_bytes()
+        finally:
+            workspace.cleanup()
+    
+    async def _compile_to_workspace(self, template_name: str, content: str, config: TemplateConfig,
+                                    request: Optional[Request] = None, output_format: str = "pdf",
+                                    extra_args: Sequence[str] = (),
+                                    files: Optional[Dict[str, str]] = None) -> CompileWorkspace:
+        """Run typst in a fresh workspace; the caller owns the returned workspace and must clean it up."""
+        workspace = self._prepare_workspace(template_name, config, files)
+        try:
+            with stage("workspace"):
+                workspace.write_main(content)
+            await self._run_typst(template_name, workspace, workspace.main_path, workspace.output_for(output_format),
+                                  config, request, extra_args)
+            return workspace
+        except BaseException:
+            workspace.cleanup()
+            raise
+    
+    async def compile_many(self, template_name: str, documents: Sequence[Tuple[str, Optional[Dict[str, str]]]],
+                           config: TemplateConfig, request: Optional[Request] = None,
+                           concurrency: Optional[int] = None,
+                           slots: Optional[asyncio.Semaphore] = None) -> List[Union[bytes, HTTPException]]:
+        """Compile several documents of one template to PDF in a single shared workspace.
+        
+        Template assets are linked and include files written once for the whole set, then
+        typst runs for every document not already cached, ``concurrency`` at a time. Each
+        result is either the PDF or the error that document failed with.
+        """
+        results: List[Union[bytes, HTTPException, None]] = [None] * len(documents)
+        async for index, result in self.iter_compile_many(template_name, documents, config, request,
+                                                          concurrency, slots):
+            results[index] = result
+        return results
+    
+    async def iter_compile_many(self, template_name: str, documents: Sequence[Tuple[str, Optional[Dict[str, str]]]],
+                                config: TemplateConfig, request: Optional[Request] = None,
+                                concurrency: Optional[int] = None, slots: Optional[asyncio.Semaphore] = None
+                                ) -> AsyncIterator[Tuple[int, Union[bytes, HTTPException]]]:
+        """Like ``compile_many``, but yields ``(index, result)`` as each document finishes.
+        
+        Cached documents come first. ``slots`` may be shared by several calls to bound the
+        compiles of a whole request across templates instead of per workspace.
+        """
+        keys = [self.cache_key(template_name, main, config) for main, _ in documents]
+        with stage("cache"):
+            cached = [self.cache.get(key) for key in keys]
+        missing = [index for index, result in enumerate(cached) if result is None]
+        for index, result in enumerate(cached):
+            if result is not None:
+                yield index, result
+        if not missing:
+            return
+        
+        shared_files: Dict[str, str] = {}
+        for index in missing:
+            shared_files.update(documents[index][1] or {})
+        workspace = self._prepare_workspace(template_name, config, shared_files)
+        slots = slots or asyncio.Semaphore(concurrency or self.compile_pool.max_concurrency)
+        
+        async def compile_one(index: int) -> Tuple[int, Union[bytes, HTTPException]]:
+            main_path = workspace.path / f"document-{index}.typ"
+            output_file = workspace.path / f"document-{index}.pdf"
+            try:
+                async with slots:
+                    main_path.write_text(documents[index][0])
+                    await self._run_typst(template_name, workspace, main_path, output_file, config, request)
+                pdf_content = output_file.read_bytes()
+            except HTTPException as e:
+                return index, e
+            await self.cache.put(keys[index], pdf_content)
+            return index, pdf_content
+        
+        tasks = [asyncio.create_task(compile_one(index)) for index in missing]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            workspace.cleanup()
+    
+    def _prepare_workspace(self, template_name: str, config: TemplateConfig,
+                           files: Optional[Dict[str, str]] = None) -> CompileWorkspace:
+        template_dir = self._template_source(template_name)[0]
+        
+        # Each compile gets its own workspace so concurrent requests never share files
+        # The effective config is written into the workspace, so per-request overrides never touch disk
+        with stage("workspace"):
+            workspace = CompileWorkspace(template_dir, config.mainFile, self.scratch_root, config.model_dump()).create()
+        try:
+            with stage("workspace"):
+                if files:
+                    workspace.write_files(files)
+            with stage("optimize"):
+                for name, data in self.optimizer.optimized_images(template_dir, config.output).items():
+                    workspace.replace_asset(name, data)
+            return workspace
+        except BaseException:
+            workspace.cleanup()
+            raise
+    
+    async def _run_typst(self, template_name: str, workspace: CompileWorkspace, main_path: Path, output_file: Path,
+                         config: TemplateConfig, request: Optional[Request] = None, extra_args: Sequence[str] = ()):
+        """Compile one main file of a prepared workspace, raising on failure."""
+        timings_file = output_file.with_name(f"{output_file.stem}-{TIMINGS_FILE}")
+        cmd = [
+            "typst", "compile",
+            "--root", str(workspace.path),
+            # The value is optional, so it must be attached with '=' to not swallow the input path
+            *([f"--timings={timings_file}"] if self.typst_timings else []),
+            *self._font_args(config),
+            *extra_args,
+            str(main_path),
+            str(output_file),
+        ]
+        logger.info(f"Compiling template {template_name}: {' '.join(cmd)}")
+        
+        result = await self.compile_pool.run(cmd, workspace.path, request)
+        if self.typst_timings:
+            for phase, seconds in read_typst_timings(timings_file).items():
+                record_stage(f"typst.{phase}", seconds)
+        
+        if result.returncode != 0:
+            logger.error(f"Template compilation failed: {result.stderr}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Template compilation failed: {result.stderr}"
+            )
+        
+        output_format = output_file.suffix.lstrip(".")
+        if not output_file.exists():
+            raise HTTPException(
+                status_code=500,
+                detail=f"{output_format.upper()} output file was not created"
+            )
+        
+        logger.info(f"Successfully compiled template {template_name}, size: {output_file.stat().st_size} bytes")
+    
+    def _font_args(self, config: TemplateConfig) -> List[str]:
+        return self.font_index.typst_args(config) if self.font_index is not None else []
+    
+    async def compile_json_resume(self, template_name: str, resume_data: ResumeData, config: TemplateConfig,
+                                  request: Optional[Request] = None) -> Response:
+        """Compile a resume from JSON data."""
+        # Editors identify themselves, so their previous revision's sections can be reused
+        session_id = request.headers.get(PREVIEW_SESSION_HEADER) if request is not None else None
+        session = f"{template_name}:{session_id}" if session_id else None
+        document = self.generate_document(resume_data, config, session)
+        return await self.compile_template(template_name, document.main, config, request, document.files)
+    
+    def generate_document(self, resume_data: ResumeData, config: TemplateConfig,
+                          session: Optional[str] = None, language: Optional[str] = None) -> GeneratedDocument:
+        """Convert JSON resume data to a main file plus one include file per section."""
+        with stage("codegen"):
+            return self.generator.generate_document(resume_data, config, session, language)
+    
+    def convert_to_typst(self, resume_data: ResumeData, config: TemplateConfig) -> str:
+        """Convert JSON resume data to Typst template format with styling."""
+        with stage("codegen"):
+            return self.generator.generate(resume_data, config)
     
     def generate_typst_function(self, func_type: str, data: Dict[str, Any]) -> str:
         """Generate a Typst function call from type and data."""
-        function_call = f"#{func_type}(\\n"
-        
-        for key, value in data.items():
-            if isinstance(value, list):
-                if value and isinstance(value[0], str):
-                    # String array - format as Typst list for descriptions
-                    function_call += f"  {key}: [\\n"
-                    for item in value:
-                        function_call += f"    - {item}\\n"
-                    function_call += "  ],\\n"
-                else:
-                    # Other arrays
-                    value_str = ", ".join(f'"{v}"' for v in value)
-                    function_call += f'  {key}: ({value_str}),\\n'
-            else:
-                function_call += f'  {key}: "{value}",\\n'
-        
-        function_call += ')\\n\\n'
-        return function_call
+        return self.generator.generate_function(func_type, data)
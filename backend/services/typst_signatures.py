@@ -0,0 +1,186 @@
+# Function signatures parsed from template sources, for validating resume items before compiling
+
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Files searched for definitions, in import order: the wrapper first, then the library it re-exports
+SIGNATURE_SOURCES = ("src/resume.typ", "src/lib.typ")
+
+# Functions that wrap a whole document, applied with `#show: kind.with(author-info)`
+DOCUMENT_KINDS = ("resume", "coverletter")
+# linguify translations, one `[lang.<code>]` table per supported language
+LANGUAGE_FILE = "src/lang.toml"
+
+# `#let name(` opens a function definition; `#let name = module.other` re-exports one
+FUNCTION_START = re.compile(r"^#let\s+([A-Za-z_][A-Za-z0-9_-]*)\(", re.MULTILINE)
+ALIAS = re.compile(r"^#let\s+([A-Za-z_][A-Za-z0-9_-]*)\s*=\s*(?:([A-Za-z_][A-Za-z0-9_-]*)\.)?([A-Za-z_][A-Za-z0-9_-]*)\s*$",
+                   re.MULTILINE)
+
+OPENERS = {"(": ")", "[": "]", "{": "}"}
+
+def parameter_kind(default: Optional[str]) -> Optional[str]:
+    """What a parameter takes, judging by its default: "array", "dict", "content" or None if unknown."""
+    if not default:
+        return None
+    if default.startswith("(:") or re.match(r"^\(\s*[A-Za-z_][A-Za-z0-9_-]*\s*:", default):
+        return "dict"
+    # A parenthesised single value without a trailing comma is not an array
+    if default == "()" or (default.startswith("(") and "," in default):
+        return "array"
+    if default.startswith("["):
+        return "content"
+    return None
+
+def _is_scalar(value: Any) -> bool:
+    # Rendered as Typst strings by the generator, so `items.join(", ")` and the like work
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+# Parsed parameters of one definition: named defaults, positional names, accepts `..rest`
+Parameters = Tuple[Dict[str, str], Tuple[str, ...], bool]
+
+class FunctionSchema(NamedTuple):
+    name: str
+    # Named parameter -> its default value as written in the source
+    named: Dict[str, str]
+    # Positional parameters; they are required, and generated calls only pass named arguments
+    positional: Tuple[str, ...]
+    # Accepts `..rest`, so any argument goes
+    variadic: bool
+    source: str
+
+    def check(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Problems typst would report for a call with these arguments, as structured errors."""
+        errors = []
+        if self.positional:
+            errors.append({
+                "error": f"'{self.name}' requires positional argument(s) {', '.join(self.positional)}, "
+                         f"which resume items cannot provide",
+            })
+        for key, value in data.items():
+            if value is None or key in self.positional:
+                continue
+            default = self.named.get(key)
+            if default is None:
+                if not self.variadic:
+                    errors.append({"field": key, "error": f"Unknown argument '{key}' for '{self.name}'",
+                                   "allowed": sorted(self.named)})
+                continue
+            # Only shapes the generator turns into what the template expects are accepted:
+            # arrays are emitted as arrays of strings, string lists for content as bullet lists
+            kind = parameter_kind(default)
+            if kind == "array" and not (isinstance(value, list) and all(_is_scalar(item) for item in value)):
+                errors.append({"field": key, "error": f"'{key}' must be a list of strings"})
+            elif kind == "dict" and not isinstance(value, dict):
+                errors.append({"field": key, "error": f"'{key}' must be an object"})
+            elif kind == "content" and not (_is_scalar(value) or
+                                            (isinstance(value, list) and all(isinstance(item, str) for item in value))):
+                errors.append({"field": key, "error": f"'{key}' must be text or a list of strings"})
+        return errors
+
+    def takes_array(self, key: str) -> bool:
+        """Whether a named parameter expects an array rather than content."""
+        return parameter_kind(self.named.get(key)) == "array"
+
+def _skip_string(text: str, index: int) -> int:
+    # index is at the opening quote; return the index after the closing one
+    index += 1
+    while index < len(text) and text[index] != '"':
+        index += 2 if text[index] == "\\" else 1
+    return index + 1
+
+def _skip_comment(text: str, index: int) -> Optional[int]:
+    if text.startswith("//", index):
+        end = text.find("\n", index)
+        return len(text) if end == -1 else end
+    if text.startswith("/*", index):
+        end = text.find("*/", index + 2)
+        return len(text) if end == -1 else end + 2
+    return None
+
+def _split_parameters(text: str, start: int) -> Optional[List[str]]:
+    """Split the parameter list opening at text[start] into top-level, comment-free parts."""
+    parts, current, stack = [], [], []
+    index = start + 1
+    while index < len(text):
+        char = text[index]
+        skipped = _skip_comment(text, index)
+        if skipped is not None:
+            index = skipped
+            continue
+        if char == '"':
+            end = _skip_string(text, index)
+            current.append(text[index:end])
+            index = end
+            continue
+        if char in OPENERS:
+            stack.append(OPENERS[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+        elif not stack and char == ")":
+            parts.append("".join(current))
+            return [part.strip() for part in parts if part.strip()]
+        elif not stack and char == ",":
+            parts.append("".join(current))
+            current = []
+            index += 1
+            continue
+        current.append(char)
+        index += 1
+    return None
+
+def _parse_definitions(text: str) -> Tuple[Dict[str, Parameters], Dict[str, Tuple[Optional[str], str]]]:
+    functions = {}
+    for match in FUNCTION_START.finditer(text):
+        parameters = _split_parameters(text, match.end() - 1)
+        if parameters is None:
+            continue
+        named, positional, variadic = {}, [], False
+        for parameter in parameters:
+            if parameter.startswith(".."):
+                variadic = True
+            elif ":" in parameter:
+                name, _, default = parameter.partition(":")
+                named[name.strip()] = " ".join(default.split())
+            else:
+                positional.append(parameter)
+        # The first definition wins, as later ones would only shadow it in the module scope
+        functions.setdefault(match.group(1), (named, tuple(positional), variadic))
+    aliases = {match.group(1): (match.group(2), match.group(3)) for match in ALIAS.finditer(text)}
+    return functions, aliases
+
+def parse_function_schemas(template_dir: Path, names: Iterable[str]) -> Dict[str, FunctionSchema]:
+    """Schemas for the named functions, following `#let a = lib.b` re-exports across sources.
+
+    Names without a parseable definition (e.g. data-only core functions) get no schema
+    and are left for typst to check.
+    """
+    sources = []
+    for relative in SIGNATURE_SOURCES:
+        path = template_dir / relative
+        try:
+            sources.append((relative, *_parse_definitions(path.read_text())))
+        except (OSError, UnicodeDecodeError):
+            continue
+
+    def resolve(name: str, start: int, depth: int = 0) -> Optional[FunctionSchema]:
+        if depth > 8:
+            return None
+        for position in range(start, len(sources)):
+            relative, functions, aliases = sources[position]
+            if name in functions:
+                named, positional, variadic = functions[name]
+                return FunctionSchema(name, named, positional, variadic, relative)
+            if name in aliases:
+                module, target = aliases[name]
+                # A module-qualified target lives in a file imported by this one
+                schema = resolve(target, position + 1 if module else position, depth + 1)
+                return schema._replace(name=name) if schema is not None else None
+        return None
+
+    schemas = {}
+    for name in names:
+        schema = resolve(name, 0)
+        if schema is not None:
+            schemas[name] = schema
+    return schemas
@@ -0,0 +1,128 @@
+# Fan-out compile of one resume into several languages, document kinds and templates
+
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+from fastapi import HTTPException
+
+from models import CompileVariant, VariantsRequest
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+from services.typst_signatures import DOCUMENT_KINDS
+from services.zip_stream import ArchiveOutcome, archive_filename, stream_archive
+
+logger = logging.getLogger(__name__)
+
+class VariantCompiler:
+    """Compiles every variant of one candidate's documents and streams them back together.
+
+    Variants are grouped by template; each group shares one workspace, its generated
+    section files (which do not depend on the language) and the compile cache, and its
+    documents are compiled concurrently and written to the ZIP as they finish.
+    """
+
+    def __init__(self, template_service: TemplateService, typst_compiler: TypstCompiler, max_variants: int = 32):
+        self.template_service = template_service
+        self.typst_compiler = typst_compiler
+        self.max_variants = max_variants
+
+    def validate(self, request: VariantsRequest):
+        """Reject unsupported variants before anything is generated or compiled."""
+        if not request.variants:
+            raise HTTPException(status_code=400, detail="Request must contain at least one variant")
+        if len(request.variants) > self.max_variants:
+            raise HTTPException(status_code=413, detail=f"Request exceeds the limit of {self.max_variants} variants")
+
+        errors = []
+        for index, variant in enumerate(request.variants):
+            template = variant.template or request.resume.theme
+            error = self._variant_error(template, variant, request)
+            if error is not None:
+                errors.append({"variant": index, "template": template, "error": error})
+        if errors:
+            raise HTTPException(status_code=422, detail={"message": "Unsupported variants", "errors": errors})
+
+    def stream_zip(self, request: VariantsRequest) -> AsyncIterator[bytes]:
+        """Compile all variants and stream a ZIP with one PDF per success plus a manifest."""
+        return stream_archive(self._outcomes(request), "variants")
+
+    async def _outcomes(self, request: VariantsRequest) -> AsyncIterator[ArchiveOutcome]:
+        groups: Dict[str, List[int]] = {}
+        for index, variant in enumerate(request.variants):
+            groups.setdefault(variant.template or request.resume.theme, []).append(index)
+
+        # (index, PDF bytes, error) per variant, in the order they finish
+        finished: asyncio.Queue = asyncio.Queue()
+        # Templates compile side by side, together within the pool's concurrency
+        slots = asyncio.Semaphore(self.typst_compiler.compile_pool.max_concurrency)
+        tasks = [asyncio.create_task(self._compile_group(template, indices, request, slots, finished))
+                 for template, indices in groups.items()]
+
+        try:
+            for _ in range(len(request.variants)):
+                index, pdf_content, error = await finished.get()
+                variant = request.variants[index]
+                template = variant.template or request.resume.theme
+                entry = {"index": index, "template": template, "kind": variant.kind, "language": variant.language}
+                yield entry, self._filename(index, template, variant), pdf_content, error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _compile_group(self, template: str, indices: List[int], request: VariantsRequest,
+                             slots: asyncio.Semaphore, finished: asyncio.Queue):
+        """Compile the variants of one template; every index is reported exactly once."""
+        pending = set(indices)
+        try:
+            config = self.template_service.get_effective_config(template, request.resume.overrides)
+            documents = []
+            for index in indices:
+                variant = request.variants[index]
+                if variant.kind == "coverletter":
+                    source = self.typst_compiler.generator.generate_cover_letter(
+                        request.resume, request.coverLetter, config, variant.language
+                    )
+                    documents.append((source, None))
+                else:
+                    document = self.typst_compiler.generate_document(request.resume, config, language=variant.language)
+                    documents.append((document.main, document.files))
+
+            async for position, result in self.typst_compiler.iter_compile_many(template, documents, config,
+                                                                                slots=slots):
+                index = indices[position]
+                pending.discard(index)
+                if isinstance(result, HTTPException):
+                    finished.put_nowait((index, None, str(result.detail)))
+                else:
+                    finished.put_nowait((index, result, None))
+        except Exception as e:
+            if not isinstance(e, HTTPException):
+                logger.error(f"Variants of template {template} failed: {e}")
+            error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+            for index in sorted(pending):
+                finished.put_nowait((index, None, error))
+
+    def _variant_error(self, template: str, variant: CompileVariant, request: VariantsRequest) -> Optional[str]:
+        if variant.kind not in DOCUMENT_KINDS:
+            return f"Unknown document kind '{variant.kind}', expected one of {', '.join(DOCUMENT_KINDS)}"
+        if not self.template_service.template_exists(template):
+            return f"Template '{template}' not found"
+        schema = self.template_service.get_function_schemas(template).get(variant.kind)
+        if schema is None:
+            return f"Template '{template}' has no {variant.kind} function"
+        if variant.kind == "coverletter" and request.coverLetter is None:
+            return "Cover letter variants need a 'coverLetter' in the request"
+        if variant.language is not None:
+            if "language" not in schema.named:
+                return f"Template '{template}' does not support choosing a language"
+            languages = self.template_service.get_template_languages(template)
+            if languages and variant.language not in languages:
+                return f"Template '{template}' has no '{variant.language}' translation (available: {', '.join(languages)})"
+        return None
+
+    @staticmethod
+    def _filename(index: int, template: str, variant: CompileVariant) -> str:
+        stem = variant.filename or "-".join(part for part in (template, variant.kind, variant.language) if part)
+        return archive_filename(index, stem, width=2)
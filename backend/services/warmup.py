@@ -0,0 +1,176 @@
+# Startup warm-up: font index, package check and precompiled previews
+
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from services.font_index import FontIndex
+from services.preset_service import PresetService
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+from utils.helpers import claim_startup_task
+
+logger = logging.getLogger(__name__)
+
+# `#import "@preview/name:version"` in template sources
+PACKAGE_IMPORT = re.compile(r'#import\s+"@(\w+)/([\w-]+):([\d.]+)"')
+# Relative imports, which resolve to files vendored inside the template
+LOCAL_IMPORT = re.compile(r'#(?:import|include)\s+"([^"@][^"]*)"')
+
+def typst_package_dirs() -> List[Path]:
+    """Where typst looks for downloaded (cache) and local (data) packages."""
+    home = Path.home()
+    if sys.platform == "darwin":
+        cache_home, data_home = home / "Library/Caches", home / "Library/Application Support"
+    elif os.name == "nt":
+        cache_home = data_home = Path(os.environ.get("LOCALAPPDATA", home))
+    else:
+        cache_home = Path(os.environ.get("XDG_CACHE_HOME", home / ".cache"))
+        data_home = Path(os.environ.get("XDG_DATA_HOME", home / ".local/share"))
+    return [
+        Path(os.environ.get("TYPST_PACKAGE_PATH", data_home / "typst/packages")),
+        Path(os.environ.get("TYPST_PACKAGE_CACHE_PATH", cache_home / "typst/packages")),
+    ]
+
+class StartupWarmup:
+    """Prepares everything the first compiles after a deploy would otherwise pay for.
+
+    Builds the font index and template bundles, checks that every package the templates
+    import is available without a download, and compiles each template's default preview
+    and thumbnail, plain and with every preset, so they are served from the cache and the
+    OS has the template files and fonts paged in.
+    """
+
+    def __init__(self, template_service: TemplateService, typst_compiler: TypstCompiler,
+                 font_index: Optional[FontIndex] = None, lock_dir: Optional[Path] = None,
+                 preset_service: Optional[PresetService] = None):
+        self.template_service = template_service
+        self.typst_compiler = typst_compiler
+        self.font_index = font_index
+        self.preset_service = preset_service
+        # Workers sharing a disk cache only need one of them to precompile
+        self.lock_dir = lock_dir
+        self.status = "pending"
+        # Set once compiles no longer pay first-run costs; readiness waits for this alone
+        self.ready = asyncio.Event()
+        self.ready_after: Optional[float] = None
+        self.packages: Dict[str, str] = {}
+        self.templates: Dict[str, Dict[str, Any]] = {}
+        self.presets: Dict[str, Dict[str, Any]] = {}
+        self.elapsed: Optional[float] = None
+
+    async def run(self, precompile: bool = True):
+        """Run every warm-up step; failures are reported, never raised."""
+        self.status = "running"
+        started = time.perf_counter()
+        if self.font_index is not None:
+            try:
+                await asyncio.to_thread(self.font_index.build)
+            except Exception as e:
+                logger.warning(f"Could not build the font index, typst will scan system fonts: {e}")
+        try:
+            await asyncio.to_thread(self.typst_compiler.bundle_templates)
+        except Exception as e:
+            logger.warning(f"Could not bundle templates, compiles read them from disk: {e}")
+        self.packages = await asyncio.to_thread(self.check_packages)
+        missing = [spec for spec, state in self.packages.items() if state == "missing"]
+        if missing:
+            logger.warning(f"Packages not available offline, the first compile will download them: {', '.join(missing)}")
+
+        if precompile:
+            if self.lock_dir is not None and not claim_startup_task(self.lock_dir / ".warmup.lock"):
+                logger.info("Another worker is precompiling template previews")
+            else:
+                await self.precompile(on_templates_done=lambda: self._mark_ready(started))
+        self._mark_ready(started)
+        self.elapsed = time.perf_counter() - started
+        self.status = "done"
+
+    async def precompile(self, on_templates_done: Optional[Callable[[], None]] = None):
+        """Compile every template's default preview PDF and first-page thumbnail into the cache."""
+        names = [template["name"] for template in self.template_service.get_all_templates()]
+        # Side by side, bounded by the compile pool, as readiness waits for all of them
+        results = await asyncio.gather(*(self._precompile(name, None, self.templates) for name in names))
+        warm = [name for name, ok in zip(names, results) if ok]
+        if on_templates_done is not None:
+            on_templates_done()
+
+        # Switching presets in the UI is then a cache hit as well
+        presets = self.preset_service.preset_names() if self.preset_service is not None else []
+        for name in warm:
+            for preset in presets:
+                await self._precompile(name, preset, self.presets)
+
+    async def _precompile(self, name: str, preset: Optional[str], results: Dict[str, Dict[str, Any]]) -> bool:
+        label = f"{name}/{preset}" if preset else name
+        started = time.perf_counter()
+        try:
+            if preset:
+                config = self.preset_service.get_effective_config(name, preset)
+            else:
+                config = self.template_service.get_effective_config(name)
+            content = self.template_service.get_template_content(name)
+            await self.typst_compiler.compile_to_bytes(name, content, config)
+            await self.typst_compiler.render_page(name, content, config)
+            results[label] = {"status": "ok", "elapsedMs": round((time.perf_counter() - started) * 1000, 1)}
+            logger.info(f"Precompiled preview and thumbnail for {label}")
+            return True
+        except HTTPException as e:
+            if e.status_code != 404:
+                results[label] = {"status": "failed", "detail": e.detail}
+            logger.info(f"Skipping warm-up of {label}: {e.detail}")
+        except Exception as e:
+            results[label] = {"status": "failed", "detail": str(e)}
+            logger.warning(f"Warm-up of {label} failed: {e}")
+        return False
+
+    def _mark_ready(self, started: float):
+        if self.ready.is_set():
+            return
+        self.ready_after = time.perf_counter() - started
+        self.ready.set()
+        logger.info(f"Compile path warm after {self.ready_after * 1000:.0f}ms of warm-up, ready for traffic")
+
+    def check_packages(self) -> Dict[str, str]:
+        """Each imported package or vendored file -> "cached", "vendored" or "missing"."""
+        packages: Dict[str, str] = {}
+        package_dirs = typst_package_dirs()
+        templates_dir = self.template_service.templates_dir.resolve()
+        for source in templates_dir.rglob("*.typ"):
+            # Paths starting with "/" are relative to the template, which is the compile root
+            root = templates_dir / source.relative_to(templates_dir).parts[0]
+            try:
+                text = source.read_text()
+            except (OSError, UnicodeDecodeError):
+                continue
+            for namespace, name, version in PACKAGE_IMPORT.findall(text):
+                spec = f"@{namespace}/{name}:{version}"
+                found = any((directory / namespace / name / version).is_dir() for directory in package_dirs)
+                packages[spec] = "cached" if found else "missing"
+            for relative in LOCAL_IMPORT.findall(text):
+                target = (root / relative.lstrip("/") if relative.startswith("/") else source.parent / relative).resolve()
+                if target.is_relative_to(templates_dir):
+                    spec = str(target.relative_to(templates_dir))
+                    packages[spec] = "vendored" if target.is_file() else "missing"
+        return dict(sorted(packages.items()))
+
+    def report(self) -> dict:
+        """Warm-up state for /health."""
+        return {
+            "status": self.status,
+            "ready": self.ready.is_set(),
+            "readyAfterMs": round(self.ready_after * 1000, 1) if self.ready_after is not None else None,
+            "elapsedMs": round(self.elapsed * 1000, 1) if self.elapsed is not None else None,
+            "fonts": self.font_index.report() if self.font_index is not None else None,
+            "bundles": self.typst_compiler.bundler.stats() if self.typst_compiler.bundler is not None else None,
+            "packages": self.packages,
+            "templates": self.templates,
+            "presets": self.presets,
+        }
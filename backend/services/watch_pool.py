@@ -0,0 +1,272 @@
+# Persistent `typst watch` processes for incremental live-preview compiles
+
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set
+from fastapi import HTTPException
+
+from services.compile_workspace import CompileWorkspace
+from services.typst_codegen import SECTIONS_DIR
+
+logger = logging.getLogger(__name__)
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+# Status lines printed by `typst watch` after every compile attempt
+STATUS_SUCCESS = ("compiled successfully", "compiled with warnings")
+STATUS_FAILURE = ("compiled with errors",)
+
+# How long to keep collecting diagnostics after a failure status line
+ERROR_GRACE_PERIOD = 0.05
+
+class WatchSession:
+    """A long-lived `typst watch` process bound to one persistent workspace.
+
+    ``args`` (e.g. font options) are passed to typst and ``assets`` replace linked template
+    files, as for one-shot compiles, so both backends produce the same output.
+    """
+
+    def __init__(self, key: str, template_dir: Path, main_file: str, scratch_root: Optional[Path] = None,
+                 args: Sequence[str] = (), assets: Optional[Dict[str, bytes]] = None):
+        self.key = key
+        self.workspace = CompileWorkspace(template_dir, main_file, scratch_root, config={})
+        self.args = list(args)
+        self.assets = dict(assets or {})
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._status = asyncio.Condition()
+        self._compiles = 0
+        self._succeeded = False
+        self._diagnostics: List[str] = []
+        self._content: Optional[str] = None
+        # Generated include files referenced by the previous revision
+        self._previous_files: Set[str] = set()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def compile(self, content: str, config: Dict[str, Any], timeout: float,
+                      files: Optional[Dict[str, str]] = None) -> bytes:
+        """Write new content (and config, if it changed) into the watched files and wait for the output.
+
+        Generated include files are written before the main file, and only when new, so
+        typst sees unchanged sections as untouched dependencies.
+        """
+        self.last_used = time.monotonic()
+        config_changed = config != self.workspace.config
+
+        if self.alive and content == self._content and not config_changed:
+            # typst only recompiles on change; the last output is still current
+            return self._read_output()
+
+        seen = self._compiles
+        if self.alive:
+            if config_changed:
+                self.workspace.write_config(config)
+            if content != self._content:
+                self._write_files(files)
+                self.workspace.write_main(content)
+        else:
+            self.workspace.config = config
+            await self._start(content, files)
+            seen = 0
+        self._content = content
+
+        try:
+            async with self._status:
+                await asyncio.wait_for(
+                    self._status.wait_for(lambda: self._compiles > seen or not self.alive),
+                    timeout=timeout
+                )
+        except asyncio.TimeoutError:
+            await self.close()
+            raise HTTPException(status_code=504, detail=f"Compilation timed out after {timeout} seconds")
+
+        if not self.alive and self._compiles <= seen:
+            await self.close()
+            raise HTTPException(status_code=500, detail="typst watch exited unexpectedly")
+
+        if not self._succeeded:
+            await asyncio.sleep(ERROR_GRACE_PERIOD)
+            # A failed compile leaves typst waiting for the next edit, so force a rewrite next time
+            self._content = None
+            raise HTTPException(
+                status_code=400,
+                detail=f"Template compilation failed: {''.join(self._diagnostics)}"
+            )
+
+        return self._read_output()
+
+    async def close(self):
+        """Stop the watch process and remove its workspace."""
+        if self.alive:
+            self._process.kill()
+            await self._process.wait()
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        self._process = None
+        self.workspace.cleanup()
+
+    async def _start(self, content: str, files: Optional[Dict[str, str]] = None):
+        if self.workspace.path is None:
+            self.workspace.create()
+            for name, data in self.assets.items():
+                self.workspace.replace_asset(name, data)
+        else:
+            self.workspace.write_config(self.workspace.config)
+        self._write_files(files)
+        self.workspace.write_main(content)
+
+        cmd = [
+            "typst", "watch",
+            "--root", str(self.workspace.path),
+            *self.args,
+            str(self.workspace.main_path),
+            str(self.workspace.output_path),
+        ]
+        logger.info(f"Starting watch session {self.key}: {' '.join(cmd)}")
+        self._compiles = 0
+        self._process = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=self.workspace.path,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._reader = asyncio.create_task(self._read_status())
+
+    async def _read_status(self):
+        stream = self._process.stderr
+        while True:
+            raw = await stream.readline()
+            if not raw:
+                break
+            line = ANSI_ESCAPE.sub("", raw.decode(errors="replace"))
+            lowered = line.lower()
+
+            if any(marker in lowered for marker in STATUS_SUCCESS + STATUS_FAILURE):
+                async with self._status:
+                    self._succeeded = any(marker in lowered for marker in STATUS_SUCCESS)
+                    self._diagnostics = []
+                    self._compiles += 1
+                    self._status.notify_all()
+            elif line.strip() and not lowered.lstrip().startswith(("watching", "writing to")):
+                self._diagnostics.append(line)
+
+        async with self._status:
+            self._status.notify_all()
+
+    def _write_files(self, files: Optional[Dict[str, str]]):
+        current = set(files or ())
+        if files:
+            self.workspace.write_files(files)
+        # Files from two revisions ago are no longer dependencies of the running compile
+        self.workspace.prune_files(SECTIONS_DIR, current | self._previous_files)
+        self._previous_files = current
+
+    def _read_output(self) -> bytes:
+        output_file = self.workspace.output_path
+        if not output_file.exists():
+            raise HTTPException(status_code=500, detail="PDF output file was not created")
+        return output_file.read_bytes()
+
+class TypstWatchPool:
+    """Supervises watch sessions with an idle timeout and a cap on live processes."""
+
+    def __init__(self, max_processes: int = 4, idle_timeout: float = 300, timeout: float = 30,
+                 scratch_root: Optional[Path] = None):
+        self.max_processes = max_processes
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.scratch_root = scratch_root
+        self._sessions: "OrderedDict[str, WatchSession]" = OrderedDict()
+        self._reaper: Optional[asyncio.Task] = None
+
+    def stats(self) -> dict:
+        """Current session usage."""
+        return {
+            "sessions": len(self._sessions),
+            "max_processes": self.max_processes,
+            "idle_timeout": self.idle_timeout,
+        }
+
+    async def compile(self, session_key: str, template_dir: Path, main_file: str, content: str,
+                      config: Dict[str, Any], files: Optional[Dict[str, str]] = None,
+                      args: Sequence[str] = (), assets: Optional[Dict[str, bytes]] = None) -> bytes:
+        """Compile content in the session's warm process, starting one if needed."""
+        self._ensure_reaper()
+        session = self._sessions.get(session_key)
+        assets = assets or {}
+
+        if session is not None and (session.workspace.template_dir != template_dir
+                                    or session.args != list(args) or session.assets != assets):
+            # The template changed (a new bundle) or the config changed its fonts or images; the
+            # process must not keep using the old files, which are pruned once superseded
+            logger.info(f"Restarting watch session {session_key} for the updated template or options")
+            self._sessions.pop(session_key, None)
+            async with session.lock:
+                await session.close()
+            session = None
+
+        if session is None:
+            while len(self._sessions) >= self.max_processes:
+                await self._evict_one()
+            session = WatchSession(session_key, template_dir, main_file, self.scratch_root, args, assets)
+            self._sessions[session_key] = session
+        else:
+            self._sessions.move_to_end(session_key)
+
+        async with session.lock:
+            return await session.compile(content, config, self.timeout, files)
+
+    async def close(self):
+        """Stop every session and the idle reaper."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+        while self._sessions:
+            _, session = self._sessions.popitem()
+            await session.close()
+
+    async def reap_idle(self):
+        """Close sessions that have not compiled anything within the idle timeout."""
+        now = time.monotonic()
+        for key, session in list(self._sessions.items()):
+            if now - session.last_used > self.idle_timeout and not session.lock.locked():
+                logger.info(f"Closing idle watch session {key}")
+                self._sessions.pop(key, None)
+                await session.close()
+
+    async def _evict_one(self):
+        # Sessions are ordered by last use; never kill one that is mid-compile
+        for key, session in self._sessions.items():
+            if not session.lock.locked():
+                logger.info(f"Evicting watch session {key} to stay under {self.max_processes} processes")
+                self._sessions.pop(key)
+                await session.close()
+                return
+        raise HTTPException(
+            status_code=503,
+            detail="All live preview processes are busy, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def _reap_forever(self):
+        interval = max(1.0, min(self.idle_timeout / 4, 30.0))
+        while True:
+            await asyncio.sleep(interval)
+            await self.reap_idle()
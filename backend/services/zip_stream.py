@@ -0,0 +1,59 @@
+# Streaming ZIP archives of compiled documents with a manifest
+
+import re
+import json
+import zipfile
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+# One finished document: its manifest entry, archive filename, PDF bytes or the error it failed with
+ArchiveOutcome = Tuple[Dict[str, Any], str, Optional[bytes], Optional[str]]
+
+class _ChunkBuffer:
+    """Write-only sink for ZipFile that hands back whatever has been written so far.
+
+    It deliberately has no ``tell``/``seek`` so ZipFile streams entries with data
+    descriptors instead of seeking back to patch local headers.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def archive_filename(index: int, stem: str, width: int = 4, fallback: str = "document") -> str:
+    """A numbered, filesystem-safe PDF name for an archive entry, e.g. "0003-minimal-1-Jane-Doe.pdf"."""
+    stem = UNSAFE_FILENAME_CHARS.sub("_", stem.removesuffix(".pdf")).strip("._") or fallback
+    return f"{index:0{width}d}-{stem}.pdf"
+
+async def stream_archive(outcomes: AsyncIterator[ArchiveOutcome], manifest_key: str) -> AsyncIterator[bytes]:
+    """Write documents into a ZIP as they finish, yielding its bytes, then a manifest in index order."""
+    buffer = _ChunkBuffer()
+    manifest = []
+    # Closing the outcomes when the client goes away cancels the compiles still running
+    async with aclosing(outcomes):
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+            async for entry, filename, pdf_content, error in outcomes:
+                if error is None:
+                    archive.writestr(filename, pdf_content)
+                    entry.update({"file": filename, "status": "ok", "size": len(pdf_content)})
+                else:
+                    entry.update({"status": "error", "error": error})
+                manifest.append(entry)
+                yield buffer.drain()
+
+            manifest.sort(key=lambda entry: entry["index"])
+            archive.writestr("manifest.json", json.dumps({manifest_key: manifest}, indent=2))
+        yield buffer.drain()
@@ -0,0 +1,25 @@
+# Shared fixtures: the bundled templates and a fake typst on PATH
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+TEMPLATES_DIR = BACKEND_DIR.parent / "templates"
+FAKE_TYPST = BACKEND_DIR / "benchmarks" / "fake_typst.py"
+
+@pytest.fixture
+def fake_typst(tmp_path, monkeypatch) -> Path:
+    """Put a `typst` shim running benchmarks/fake_typst.py first on PATH; returns its invocation log."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    shim = bin_dir / "typst"
+    shim.write_text(f"#!/bin/sh\nexec {sys.executable} {FAKE_TYPST} \"$@\"\n")
+    shim.chmod(0o755)
+    counter = tmp_path / "typst-invocations.log"
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("FAKE_TYPST_DELAY", "0")
+    monkeypatch.setenv("FAKE_TYPST_COUNTER", str(counter))
+    return counter
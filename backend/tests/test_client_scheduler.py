@@ -0,0 +1,120 @@
+# Rate budgets for bulk requests, client identity and compile lanes
+
+import sys
+import time
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes.batch_routes import create_batch_router
+from routes.preview_routes import create_preview_router
+from services.client_scheduler import ClientScheduler, ClientSchedulerMiddleware, client_context, current_client
+from services.compile_pool import CompilePool
+from services.pdf_cache import PDFCache
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+from tests.conftest import TEMPLATES_DIR
+
+BURST = 5
+
+class PoolBatchCompiler:
+    """Stands in for BatchCompiler: one real (trivial) subprocess per item through the compile pool."""
+
+    def __init__(self, compile_pool: CompilePool, tmp_path):
+        self.compile_pool = compile_pool
+        self.tmp_path = tmp_path
+
+    def validate(self, items):
+        pass
+
+    async def stream_zip(self, items):
+        results = await asyncio.gather(
+            *(self.compile_pool.run([sys.executable, "-c", ""], self.tmp_path) for _ in items),
+            return_exceptions=True
+        )
+        failed = [result for result in results if isinstance(result, Exception)]
+        yield f"{len(results) - len(failed)} ok, {len(failed)} failed".encode()
+
+def create_app(tmp_path):
+    scheduler = ClientScheduler(rate=0.01, burst=BURST)
+    compile_pool = CompilePool(max_concurrency=2, max_queue=100, scheduler=scheduler)
+    app = FastAPI()
+    app.add_middleware(ClientSchedulerMiddleware, scheduler=scheduler)
+    app.include_router(create_batch_router(PoolBatchCompiler(compile_pool, tmp_path), None, scheduler))
+    return app
+
+def batch(size: int) -> dict:
+    resume = {"personalInfo": {"firstname": "A", "lastname": "B", "email": "a@b.c"}, "sections": [], "theme": "minimal-1"}
+    return {"items": [{"template": "minimal-1", "resume": resume}] * size}
+
+def test_batch_larger_than_burst_compiles_every_item(tmp_path):
+    with TestClient(create_app(tmp_path)) as client:
+        response = client.post("/templates/batch-compile", json=batch(4 * BURST))
+        assert response.status_code == 200
+        assert response.text == f"{4 * BURST} ok, 0 failed"
+
+def test_batch_leaves_client_in_debt(tmp_path):
+    with TestClient(create_app(tmp_path)) as client:
+        assert client.post("/templates/batch-compile", json=batch(2 * BURST)).status_code == 200
+        response = client.post("/templates/batch-compile", json=batch(1))
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+def test_unverified_api_key_is_keyed_by_address():
+    scheduler = ClientScheduler(api_keys=["secret"])
+    scope = {"client": ("10.0.0.1", 1234)}
+    assert scheduler.identify({**scope, "headers": [(b"x-api-key", b"made-up")]}) == "ip:10.0.0.1"
+    assert scheduler.identify({**scope, "headers": [(b"x-api-key", b"secret")]}).startswith("key:")
+
+def test_uncharged_context_keeps_its_lane():
+    scheduler = ClientScheduler(rate=0.01, burst=1)
+    with client_context("ip:10.0.0.1", charge_compiles=False):
+        for _ in range(3):
+            scheduler.charge_compile()
+        assert current_client() == "ip:10.0.0.1"
+    assert current_client() is None
+
+def create_preview_app(tmp_path, scheduler: ClientScheduler):
+    template_service = TemplateService(TEMPLATES_DIR)
+    compile_pool = CompilePool(max_concurrency=2, scheduler=scheduler)
+    typst_compiler = TypstCompiler(TEMPLATES_DIR, compile_pool, scratch_root=tmp_path / "scratch",
+                                   cache=PDFCache(), template_service=template_service)
+    app = FastAPI()
+    app.include_router(create_preview_router(template_service, typst_compiler, debounce=0, scheduler=scheduler))
+    return app
+
+def test_preview_sessions_are_capped_per_client(tmp_path, fake_typst):
+    scheduler = ClientScheduler(max_sessions=1)
+    with TestClient(create_preview_app(tmp_path, scheduler)) as client:
+        with client.websocket_connect("/templates/minimal-1/live"):
+            with client.websocket_connect("/templates/minimal-1/live") as second:
+                assert second.receive_json()["status"] == 429
+        # Closing the first session frees its place, once the server has seen it go
+        for _ in range(100):
+            if scheduler.stats()["sessions"] == 0:
+                break
+            time.sleep(0.01)
+        with client.websocket_connect("/templates/minimal-1/live") as third:
+            third.send_json({"content": "= Hello"})
+            reply = third.receive_json()
+            assert reply["type"] == "compiled", reply
+    assert scheduler.stats()["sessions"] == 0
+
+def test_preview_compiles_are_charged(tmp_path, fake_typst):
+    scheduler = ClientScheduler(rate=0.01, burst=2)
+    with TestClient(create_preview_app(tmp_path, scheduler)) as client:
+        with client.websocket_connect("/templates/minimal-1/live") as session:
+            replies = []
+            for revision in range(3):
+                session.send_json({"revision": revision, "content": f"= Revision {revision}"})
+                reply = session.receive_json()
+                if reply["type"] == "compiled":
+                    session.receive_bytes()
+                replies.append(reply)
+            # The same document again is a cache hit and costs nothing
+            session.send_json({"revision": 3, "content": "= Revision 0"})
+            cached = session.receive_json()
+    assert [reply["type"] for reply in replies] == ["compiled", "compiled", "error"]
+    assert replies[2]["status"] == 429
+    assert cached["type"] == "compiled"
@@ -0,0 +1,85 @@
+# Per-request compile workspaces: linked template assets, generated files and cleanup
+
+import json
+
+import pytest
+
+from services.compile_workspace import CompileWorkspace, is_template_asset
+
+@pytest.fixture
+def template_dir(tmp_path):
+    template = tmp_path / "templates" / "demo"
+    (template / "src").mkdir(parents=True)
+    (template / "src" / "lib.typ").write_text("#let hello() = [Hello]")
+    (template / "main.typ").write_text("= Default")
+    (template / "conf.json").write_text('{"name": "demo"}')
+    (template / "logo.png").write_bytes(b"png")
+    # Left behind by the old in-place compile flow
+    for stale in ("output.pdf", "main.typ.backup", "temp_main.typ", ".git"):
+        (template / stale).write_text("stale")
+    return template
+
+def test_assets_are_linked_not_copied(tmp_path, template_dir):
+    with CompileWorkspace(template_dir, "main.typ", scratch_root=tmp_path / "scratch") as workspace:
+        assert sorted(entry.name for entry in workspace.path.iterdir()) == ["conf.json", "logo.png", "src"]
+        for name in ("src", "logo.png", "conf.json"):
+            linked = workspace.path / name
+            assert linked.is_symlink() and linked.resolve() == (template_dir / name).resolve()
+        assert workspace.path.parent == tmp_path / "scratch"
+        assert workspace.path.name.startswith("demo-")
+
+@pytest.mark.parametrize("name, asset", [
+    ("src", True), ("logo.png", True), ("output.pdf", False), ("output.svg", False),
+    ("main.typ.backup", False), ("temp_main.typ", False), (".git", False),
+])
+def test_stale_artefacts_are_not_assets(name, asset):
+    assert is_template_asset(name) is asset
+
+def test_inputs_and_config_are_private_to_the_workspace(tmp_path, template_dir):
+    config = {"name": "demo", "style": {"accent_color": "#ff0000"}}
+    with CompileWorkspace(template_dir, "main.typ", tmp_path, config) as workspace:
+        workspace.write_main("= Request")
+        assert not (workspace.path / "conf.json").is_symlink()
+        assert json.loads((workspace.path / "conf.json").read_text()) == config
+        assert workspace.main_path.read_text() == "= Request"
+    assert (template_dir / "main.typ").read_text() == "= Default"
+    assert (template_dir / "conf.json").read_text() == '{"name": "demo"}'
+
+def test_concurrent_workspaces_do_not_share_files(tmp_path, template_dir):
+    first = CompileWorkspace(template_dir, "main.typ", tmp_path).create()
+    second = CompileWorkspace(template_dir, "main.typ", tmp_path).create()
+    try:
+        first.write_main("= First")
+        second.write_main("= Second")
+        first.output_path.write_bytes(b"first")
+        assert first.path != second.path
+        assert second.main_path.read_text() == "= Second"
+        assert not second.output_path.exists()
+    finally:
+        first.cleanup()
+        second.cleanup()
+
+def test_replaced_asset_does_not_write_through_the_link(tmp_path, template_dir):
+    with CompileWorkspace(template_dir, "main.typ", tmp_path) as workspace:
+        workspace.replace_asset("logo.png", b"smaller")
+        assert (workspace.path / "logo.png").read_bytes() == b"smaller"
+    assert (template_dir / "logo.png").read_bytes() == b"png"
+
+def test_generated_files_are_kept_and_pruned(tmp_path, template_dir):
+    with CompileWorkspace(template_dir, "main.typ", tmp_path) as workspace:
+        assert workspace.write_files({"sections/a.typ": "a", "sections/b.typ": "b"}) == 2
+        # Content-addressed: an existing file is never rewritten
+        assert workspace.write_files({"sections/a.typ": "changed", "sections/c.typ": "c"}) == 1
+        assert (workspace.path / "sections/a.typ").read_text() == "a"
+
+        workspace.prune_files("sections", ["sections/a.typ", "sections/c.typ"])
+        assert sorted(path.name for path in (workspace.path / "sections").iterdir()) == ["a.typ", "c.typ"]
+
+def test_cleanup_removes_only_the_workspace(tmp_path, template_dir):
+    workspace = CompileWorkspace(template_dir, "main.typ", tmp_path).create()
+    path = workspace.path
+    workspace.cleanup()
+    workspace.cleanup()
+    assert not path.exists()
+    assert (template_dir / "src" / "lib.typ").read_text() == "#let hello() = [Hello]"
+    assert (template_dir / "logo.png").exists()
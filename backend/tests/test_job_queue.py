@@ -0,0 +1,92 @@
+# Job stores: claiming by priority lane, and failing and expiring jobs whose worker went away
+
+import time
+import threading
+
+import pytest
+
+from services.job_queue import (
+    DONE, FAILED, PRIORITY_LANES, QUEUED, RUNNING, Job, MemoryJobStore, SQLiteJobStore, create_job_store,
+)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return MemoryJobStore() if request.param == "memory" else SQLiteJobStore(tmp_path / "jobs.db")
+
+def job(job_id: str, lane: str = "bulk", created_at: float = None) -> Job:
+    return Job(job_id, "minimal-1", {"resume": {}}, PRIORITY_LANES[lane], created_at=created_at)
+
+def test_claims_interactive_before_bulk_then_oldest_first(store):
+    now = time.time()
+    store.add(job("bulk-old", "bulk", now - 2))
+    store.add(job("bulk-new", "bulk", now - 1))
+    store.add(job("interactive", "interactive", now))
+    claimed = [store.claim().id for _ in range(3)]
+    assert claimed == ["interactive", "bulk-old", "bulk-new"]
+    assert store.claim() is None
+
+def test_claimed_job_is_running(store):
+    store.add(job("a"))
+    claimed = store.claim()
+    assert claimed.status == RUNNING and claimed.started_at is not None
+    assert store.get("a").status == RUNNING
+    assert store.counts() == {QUEUED: 0, RUNNING: 1, DONE: 0, FAILED: 0}
+    assert store.get("a").payload == {"resume": {}}
+
+def test_finish_records_the_outcome(store):
+    store.add(job("a"))
+    store.claim()
+    store.finish("a", DONE, expires_at=time.time() + 60, result_size=123)
+    finished = store.get("a")
+    assert (finished.status, finished.result_size, finished.error) == (DONE, 123, None)
+    assert finished.to_dict()["priority"] == "bulk"
+
+def test_stale_running_job_fails_and_then_expires(store):
+    now = time.time()
+    store.add(job("stale"))
+    store.add(job("fresh"))
+    store.claim()
+    store.claim()
+    # Only "stale" started before the cutoff
+    cutoff = store.get("fresh").started_at
+    if isinstance(store, MemoryJobStore):
+        store.get("stale").started_at = cutoff - 10
+    else:
+        store._connection.execute("UPDATE jobs SET started_at = ? WHERE id = ?", (cutoff - 10, "stale"))
+
+    assert store.expire(now, stale_before=cutoff - 1) == []
+    stale = store.get("stale")
+    assert stale.status == FAILED and stale.error == "Worker stopped before the job finished"
+    assert store.get("fresh").status == RUNNING
+    # Failed jobs expire with the next sweep
+    assert store.expire(now + 1, stale_before=cutoff - 1) == ["stale"]
+    assert store.get("stale") is None
+
+def test_sqlite_workers_never_claim_the_same_job(tmp_path):
+    path = tmp_path / "jobs.db"
+    SQLiteJobStore(path)
+    stores = [SQLiteJobStore(path, claim_timeout=5) for _ in range(4)]
+    for index in range(40):
+        stores[0].add(job(f"job-{index}"))
+
+    claimed, lock = [], threading.Lock()
+
+    def work(store):
+        while True:
+            claimed_job = store.claim()
+            if claimed_job is None:
+                return
+            with lock:
+                claimed.append(claimed_job.id)
+
+    threads = [threading.Thread(target=work, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(f"job-{index}" for index in range(40))
+
+def test_create_job_store(tmp_path):
+    assert isinstance(create_job_store(None), MemoryJobStore)
+    assert isinstance(create_job_store("memory"), MemoryJobStore)
+    assert isinstance(create_job_store(str(tmp_path / "jobs.db")), SQLiteJobStore)
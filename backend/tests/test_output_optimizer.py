@@ -0,0 +1,40 @@
+# Template image downscaling and response compression
+
+import io
+import gzip
+
+import pytest
+
+from models import TemplateOutput
+from services.output_optimizer import OutputOptimizer, choose_encoding
+
+def test_oversized_image_is_downscaled(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    # Noise does not compress, so the smaller image is also the smaller file
+    Image.frombytes("RGB", (400, 300), bytes(range(256)) * 1407).save(tmp_path / "photo.png")
+    (tmp_path / "main.typ").write_text("#image(\"photo.png\")")
+
+    options = TemplateOutput(optimize_images=True, max_image_px=100)
+    images = OutputOptimizer().optimized_images(tmp_path, options)
+
+    assert set(images) == {"photo.png"}
+    with Image.open(io.BytesIO(images["photo.png"])) as image:
+        assert max(image.size) == 100
+        assert image.size == (100, 75)
+
+def test_small_image_is_left_alone(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (50, 50), "white").save(tmp_path / "logo.png")
+
+    options = TemplateOutput(optimize_images=True, max_image_px=100)
+    assert OutputOptimizer().optimized_images(tmp_path, options) == {}
+
+def test_images_untouched_unless_enabled(tmp_path):
+    (tmp_path / "photo.png").write_bytes(b"not read")
+    assert OutputOptimizer().optimized_images(tmp_path, TemplateOutput()) == {}
+
+def test_gzip_round_trip_and_negotiation():
+    body = b"%PDF-1.7 " * 100
+    assert gzip.decompress(OutputOptimizer.compress(body, "gzip")) == body
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("gzip, deflate") == "gzip"
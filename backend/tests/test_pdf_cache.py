@@ -0,0 +1,119 @@
+# Content-addressed compile cache: keys, conditional requests and the shared disk tier
+
+import os
+import json
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models import TemplateConfig
+from routes.template_routes import create_template_router
+from services.compile_pool import CompilePool
+from services.pdf_cache import PDFCache
+from services.preset_service import PresetService
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+from tests.conftest import TEMPLATES_DIR
+
+KEY = "ab" + "0" * 62
+
+def config(**style) -> TemplateConfig:
+    conf = json.loads((TEMPLATES_DIR / "minimal-1" / "conf.json").read_text())
+    conf["style"].update(style)
+    return TemplateConfig(**conf)
+
+def test_key_covers_version_config_source_and_extras():
+    key = PDFCache.make_key("v1", config(), "= Hello")
+    assert key == PDFCache.make_key("v1", config(), "= Hello")
+    assert len({
+        key,
+        PDFCache.make_key("v2", config(), "= Hello"),
+        PDFCache.make_key("v1", config(accent_color="#ff0000"), "= Hello"),
+        PDFCache.make_key("v1", config(), "= Hello!"),
+        PDFCache.make_key("v1", config(), "= Hello", "png"),
+        # Parts are separated, so they cannot run into each other
+        PDFCache.make_key("v1", config(), "= Hell", "o"),
+    }) == 6
+
+def test_memory_tier_is_bounded_by_bytes():
+    cache = PDFCache(max_memory_bytes=10, max_item_bytes=10)
+    asyncio.run(cache.put("a", b"x" * 6))
+    asyncio.run(cache.put("b", b"y" * 6))
+    asyncio.run(cache.put("huge", b"z" * 11))
+    assert cache.get("a") is None
+    assert cache.get("b") == b"y" * 6
+    assert cache.get("huge") is None
+    assert cache.stats()["memory_bytes"] == 6
+
+def test_disk_tier_is_shared_between_workers(tmp_path):
+    first, second = PDFCache(disk_dir=tmp_path), PDFCache(disk_dir=tmp_path)
+    asyncio.run(first.put(KEY, b"%PDF-1"))
+    cached = second.lookup(KEY)
+    assert cached == tmp_path / KEY[:2] / f"{KEY}.bin"
+    assert second.get(KEY) == b"%PDF-1"
+    assert not list(tmp_path.glob("*/*.tmp"))
+
+def test_losing_publish_keeps_the_first_entry_and_its_count(tmp_path):
+    first, second = PDFCache(disk_dir=tmp_path), PDFCache(disk_dir=tmp_path)
+    asyncio.run(first.put(KEY, b"first"))
+    # As if `second` had checked for the entry just before `first` published it
+    path = second._disk_path(KEY)
+    assert second._write_disk(path, 6, lambda tmp_file: tmp_file.write(b"second"))
+    assert path.read_bytes() == b"first"
+    assert (first.disk_bytes, second.disk_bytes) == (5, 0)
+    assert not list(tmp_path.glob("*/*.tmp"))
+
+def test_put_file_copies_without_touching_the_source(tmp_path):
+    cache = PDFCache(disk_dir=tmp_path / "cache")
+    source = tmp_path / "output.pdf"
+    source.write_bytes(b"%PDF-file")
+    cached = asyncio.run(cache.put_file(KEY, source))
+    assert cached.read_bytes() == b"%PDF-file" and source.exists()
+    assert asyncio.run(cache.put_file(KEY, source)) == cached
+    assert cache.disk_bytes == len(b"%PDF-file")
+
+def test_disk_tier_prunes_least_recently_used(tmp_path):
+    cache = PDFCache(disk_dir=tmp_path, max_disk_bytes=30)
+    keys = [f"{index:02d}" + "0" * 62 for index in range(3)]
+    for age, key in enumerate(keys):
+        asyncio.run(cache.put(key, b"x" * 10))
+        path = cache._disk_path(key)
+        os.utime(path, (1000 + age, 1000 + age))
+    # A hit refreshes the oldest entry, so the second one is pruned instead
+    cache._entries.clear()
+    assert cache.lookup(keys[0]) is not None
+    asyncio.run(cache.put("03" + "0" * 62, b"x" * 10))
+    assert cache._disk_path(keys[1]).exists() is False
+    assert cache._disk_path(keys[0]).exists()
+    assert cache.disk_evictions >= 1
+    assert cache.disk_bytes <= 30
+
+def create_app(tmp_path, cache: PDFCache) -> FastAPI:
+    template_service = TemplateService(TEMPLATES_DIR)
+    typst_compiler = TypstCompiler(TEMPLATES_DIR, CompilePool(max_concurrency=2), scratch_root=tmp_path / "scratch",
+                                   cache=cache, template_service=template_service)
+    app = FastAPI()
+    app.include_router(create_template_router(template_service, typst_compiler,
+                                              PresetService(TEMPLATES_DIR / "presets", template_service)))
+    return app
+
+def test_etag_revalidation_skips_the_compile(tmp_path, fake_typst):
+    with TestClient(create_app(tmp_path, PDFCache(disk_dir=tmp_path / "cache"))) as client:
+        first = client.post("/templates/minimal-1/compile", data={"content": "= Hello"})
+        assert first.status_code == 200 and first.headers["X-Cache"] == "MISS"
+        etag = first.headers["ETag"]
+
+        again = client.post("/templates/minimal-1/compile", data={"content": "= Hello"})
+        assert again.headers["X-Cache"] == "HIT" and again.content == first.content
+
+        unchanged = client.post("/templates/minimal-1/compile", data={"content": "= Hello"},
+                                headers={"If-None-Match": f"W/{etag}, \"other\""})
+        assert unchanged.status_code == 304 and unchanged.content == b""
+        assert unchanged.headers["ETag"] == etag
+
+        changed = client.post("/templates/minimal-1/compile", data={"content": "= Changed"},
+                              headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    # Two documents, each compiled once
+    assert len(fake_typst.read_text().splitlines()) == 2
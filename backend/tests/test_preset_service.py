@@ -0,0 +1,86 @@
+# Style presets: loading, validation and merging over a template's conf.json
+
+import os
+import shutil
+
+import pytest
+from fastapi import HTTPException
+
+from models import TemplateOverrides
+from services.preset_service import PresetService
+from services.template_service import TemplateService
+from tests.conftest import TEMPLATES_DIR
+
+@pytest.fixture(scope="module")
+def template_service():
+    return TemplateService(TEMPLATES_DIR)
+
+@pytest.fixture
+def presets_dir(tmp_path):
+    presets = tmp_path / "presets"
+    shutil.copytree(TEMPLATES_DIR / "presets", presets)
+    return presets
+
+def test_shipped_presets_load(template_service):
+    service = PresetService(TEMPLATES_DIR / "presets", template_service)
+    assert service.preset_names() == ["corporate", "creative", "tech"]
+    tech = service.get_preset("tech")
+    assert tech["description"] == "Tech/Startup Resume Preset"
+    assert tech["theme"] == "minimal-2"
+    assert tech["overrides"]["style"]["accent_color"] == "#2563eb"
+
+def test_preset_overrides_only_the_keys_it_sets(template_service, presets_dir):
+    (presets_dir / "accent.toml").write_text('[style]\naccent_color = "#ff0000"\n')
+    service = PresetService(presets_dir, template_service)
+    base = template_service.get_template_config("minimal-1")
+    merged = service.get_effective_config("minimal-1", "accent")
+    assert merged.style.accent_color == "#ff0000"
+    assert merged.style.primary_font == base.style.primary_font
+    assert merged.formatting == base.formatting
+    # conf.json itself is untouched
+    assert template_service.get_template_config("minimal-1").style.accent_color == base.style.accent_color
+
+def test_request_overrides_win_over_the_preset(template_service, presets_dir):
+    service = PresetService(presets_dir, template_service)
+    overrides = TemplateOverrides(style={"accent_color": "#00ff00"})
+    merged = service.get_effective_config("minimal-1", "tech", overrides)
+    assert merged.style.accent_color == "#00ff00"
+    assert merged.style.paper_size == "us-letter"
+
+def test_effective_configs_are_memoised_until_the_preset_changes(template_service, presets_dir):
+    service = PresetService(presets_dir, template_service)
+    first = service.get_effective_config("minimal-1", "tech")
+    assert service.get_effective_config("minimal-1", "tech") is first
+    assert (service.stats()["hits"], service.stats()["misses"]) == (1, 1)
+
+    path = presets_dir / "tech.toml"
+    path.write_text(path.read_text().replace('accent_color = "#2563eb"', 'accent_color = "#123456"'))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert service.get_effective_config("minimal-1", "tech").style.accent_color == "#123456"
+
+@pytest.mark.parametrize("text, error", [
+    ("[style\n", "Invalid TOML"),
+    ("[colours]\nx = 1\n", "Unknown section(s): colours"),
+    ('[style]\nshade = "dark"\n', "Unknown style key(s): shade"),
+    ("[features]\nshow_icons = \"sometimes\"\n", "Invalid [features]"),
+])
+def test_invalid_presets_are_reported_not_applied(template_service, presets_dir, text, error):
+    (presets_dir / "broken.toml").write_text(text)
+    service = PresetService(presets_dir, template_service)
+    assert "broken" not in service.preset_names()
+    assert service.stats()["invalid"] == ["broken"]
+    assert service.get_preset("broken")["error"].startswith(error)
+    with pytest.raises(HTTPException) as raised:
+        service.get_effective_config("minimal-1", "broken")
+    assert raised.value.status_code == 500
+
+def test_unknown_preset_is_404_and_new_files_are_found(template_service, presets_dir):
+    service = PresetService(presets_dir, template_service)
+    with pytest.raises(HTTPException) as raised:
+        service.get_effective_config("minimal-1", "minimalist")
+    assert raised.value.status_code == 404
+
+    (presets_dir / "minimalist.toml").write_text('[advanced]\njustify_text = true\n')
+    os.utime(presets_dir, ns=(0, presets_dir.stat().st_mtime_ns + 1_000_000))
+    assert service.get_effective_config("minimal-1", "minimalist").advanced.justify_text is True
@@ -0,0 +1,46 @@
+# Debouncing of live-preview sessions
+
+import asyncio
+
+from models import PreviewUpdate
+from services.compile_pool import CompilePool
+from services.pdf_cache import PDFCache
+from services.preview_session import PreviewSession
+from services.template_service import TemplateService
+from services.typst_compiler import TypstCompiler
+from tests.conftest import TEMPLATES_DIR
+
+def type_continuously(tmp_path, max_wait, updates: int = 20, interval: float = 0.05) -> list:
+    """Send an update every ``interval`` seconds, never pausing for the debounce; returns what was sent meanwhile."""
+    template_service = TemplateService(TEMPLATES_DIR)
+    typst_compiler = TypstCompiler(TEMPLATES_DIR, CompilePool(max_concurrency=2), scratch_root=tmp_path / "scratch",
+                                   cache=PDFCache(), template_service=template_service)
+
+    async def scenario():
+        sent = []
+
+        async def send(message, document):
+            sent.append(message)
+
+        session = PreviewSession(template_service, typst_compiler, "minimal-1", send,
+                                 debounce=4 * interval, max_wait=max_wait)
+        runner = asyncio.create_task(session.run())
+        try:
+            for revision in range(1, updates + 1):
+                session.submit(PreviewUpdate(revision=revision, content=f"= Revision {revision}"))
+                await asyncio.sleep(interval)
+            return list(sent)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+
+    return asyncio.run(scenario())
+
+def test_continuous_typing_is_compiled_within_max_wait(tmp_path, fake_typst):
+    sent = type_continuously(tmp_path, max_wait=0.3)
+    compiled = [message["revision"] for message in sent if message["type"] == "compiled"]
+    assert len(compiled) >= 2, sent
+    assert compiled == sorted(compiled)
+
+def test_without_max_wait_only_pauses_compile(tmp_path, fake_typst):
+    assert type_continuously(tmp_path, max_wait=None) == []
@@ -0,0 +1,108 @@
+# Escaping and validation in the JSON-to-Typst generator
+
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from models import ResumeData, TemplateConfig
+from services.typst_codegen import TypstGenerator, escape_markup, escape_string, typst_key, typst_value
+from services.typst_signatures import parse_function_schemas
+from tests.conftest import TEMPLATES_DIR
+
+HOSTILE = 'C# "lead" *dev* // 50% \\ #set page(width: 1pt)'
+
+def resume(items, **personal) -> ResumeData:
+    return ResumeData(
+        personalInfo={"firstname": "Ada", "lastname": "Lovelace", "email": "ada@example.com", **personal},
+        sections=[{"type": "experience", "title": "Experience", "items": items}],
+        theme="minimal-1",
+    )
+
+def config(functions=("experience", "skill-item")) -> TemplateConfig:
+    conf = json.loads((TEMPLATES_DIR / "minimal-1" / "conf.json").read_text())
+    return TemplateConfig(**{**conf, "functions": list(functions)})
+
+@pytest.mark.parametrize("value, literal", [
+    ('say "hi"', '"say \\"hi\\""'),
+    ("back\\slash", '"back\\\\slash"'),
+    ("line\nbreak\ttab", '"line\\nbreak\\ttab"'),
+    # Markup characters are plain text inside a string literal
+    ("#x *y* // z", '"#x *y* // z"'),
+])
+def test_escape_string(value, literal):
+    assert escape_string(value) == literal
+
+@pytest.mark.parametrize("value, markup", [
+    ("C# and *bold*", "C\\# and \\*bold\\*"),
+    ("see http://x // y", "see http:\\/\\/x \\/\\/ y"),
+    ("a \\ b", "a \\\\ b"),
+    ("[link] <label> @ref $x$ `code` ~ _u_", "\\[link\\] \\<label\\> \\@ref \\$x\\$ \\`code\\` \\~ \\_u\\_"),
+    ("= Not a heading", "\\= Not a heading"),
+    ("- not a list", "\\- not a list"),
+    ("1. not an enum", "\\1. not an enum"),
+    ("multi\n  line   text", "multi line text"),
+    ('quotes "stay"', 'quotes "stay"'),
+])
+def test_escape_markup(value, markup):
+    assert escape_markup(value) == markup
+
+def test_typst_value():
+    assert typst_value(True) == "true"
+    assert typst_value(None) == "none"
+    assert typst_value(3.5) == '"3.5"'
+    assert typst_value([]) == "()"
+    assert typst_value(["a"]) == '("a", )'
+    assert typst_value({}) == "(:)"
+    assert typst_value({"start-date": "2020", "two words": [None]}) == '(start-date: "2020", "two words": (none, ))'
+    assert typst_key('bad"key') == '"bad\\"key"'
+
+def test_hostile_values_stay_inside_literals_and_blocks():
+    source = TypstGenerator().generate_function("experience", {"title": HOSTILE, "description": [HOSTILE]})
+    assert source == (
+        "#experience(\n"
+        '  title: "C# \\"lead\\" *dev* // 50% \\\\ #set page(width: 1pt)",\n'
+        "  description: [\n"
+        "    - C\\# \"lead\" \\*dev\\* \\/\\/ 50% \\\\ \\#set page(width: 1pt)\n"
+        "  ],\n"
+        ")\n\n"
+    )
+
+def test_generated_document_escapes_personal_info_and_titles():
+    data = resume([{"type": "experience", "data": {"company": HOSTILE}}], firstname='Ada "The Countess"')
+    document = TypstGenerator().generate_document(data, config())
+    assert 'firstname: "Ada \\"The Countess\\""' in document.main
+    (section,) = document.files.values()
+    assert "= Experience\n" in section
+    assert 'company: "C# \\"lead\\" *dev* // 50% \\\\ #set page(width: 1pt)"' in section
+
+def test_unknown_function_and_bad_argument_names_fail_before_typst():
+    data = resume([
+        {"type": "publication", "data": {"title": "x"}},
+        {"type": "experience", "data": {"bad key": "x"}},
+    ])
+    with pytest.raises(HTTPException) as raised:
+        TypstGenerator().validate(data, config())
+    assert raised.value.status_code == 422
+    errors = raised.value.detail["errors"]
+    assert errors[0]["item"] == 0 and errors[0]["allowed"] == ["experience", "skill-item"]
+    assert errors[1] == {"section": 0, "item": 1, "type": "experience", "field": "bad key",
+                         "error": "Argument names must be Typst identifiers"}
+
+def test_schema_errors_are_reported_per_item():
+    schemas = parse_function_schemas(TEMPLATES_DIR / "minimal-1", ["experience"])
+    generator = TypstGenerator(schemas=lambda template: schemas)
+    data = resume([{"type": "experience", "data": {"company": "X", "salary": "lots"}}])
+    with pytest.raises(HTTPException) as raised:
+        generator.generate(data, config())
+    (error,) = raised.value.detail["errors"]
+    assert error["field"] == "salary" and error["error"] == "Unknown argument 'salary' for 'experience'"
+
+def test_unchanged_sections_are_reused_within_a_session():
+    generator = TypstGenerator()
+    first = generator.generate_document(resume([{"type": "experience", "data": {"company": "A"}}]), config(), "s")
+    second = generator.generate_document(resume([{"type": "experience", "data": {"company": "A"}}]), config(), "s")
+    assert second.reused == 1 and second.files == first.files
+    generator.forget("s")
+    assert generator.generate_document(resume([{"type": "experience", "data": {"company": "A"}}]), config(),
+                                       "s").reused == 0
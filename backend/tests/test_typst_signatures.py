@@ -0,0 +1,61 @@
+# Function schemas parsed from template sources, and the checks they make on resume items
+
+import pytest
+
+from services.typst_codegen import TypstGenerator
+from services.typst_signatures import parameter_kind, parse_function_schemas
+from tests.conftest import TEMPLATES_DIR
+
+@pytest.fixture(scope="module")
+def schemas():
+    return parse_function_schemas(TEMPLATES_DIR / "minimal-1", ["skill-item", "experience", "education", "missing"])
+
+def fields(errors):
+    return [(error.get("field"), error["error"]) for error in errors]
+
+@pytest.mark.parametrize("default, kind", [
+    ("()", "array"),
+    ('("Source Sans Pro", "Source Sans 3")', "array"),
+    ('("Roboto")', None),
+    ("(:)", "dict"),
+    ("(name: 1)", "dict"),
+    ("[]", "content"),
+    ('""', None),
+    ("none", None),
+])
+def test_parameter_kind_from_default(default, kind):
+    assert parameter_kind(default) == kind
+
+def test_schemas_follow_re_exports(schemas):
+    assert "missing" not in schemas
+    assert schemas["skill-item"].named["items"] == "()"
+    assert schemas["experience"].named["description"] == "[]"
+    assert not schemas["skill-item"].positional
+
+def test_valid_items_pass(schemas):
+    assert schemas["skill-item"].check({"category": "Languages", "items": ["Python", "Go", 3]}) == []
+    assert schemas["experience"].check({"company": "X", "description": ["Did this", "and that"]}) == []
+    assert schemas["experience"].check({"company": "X", "description": "One line", "title": None}) == []
+
+def test_unknown_argument_lists_allowed(schemas):
+    errors = schemas["skill-item"].check({"category": "A", "level": "expert"})
+    assert fields(errors) == [("level", "Unknown argument 'level' for 'skill-item'")]
+    assert errors[0]["allowed"] == ["category", "items"]
+
+@pytest.mark.parametrize("items", ["Python", ["Python", {"name": "Go"}], [["nested"]], [True]])
+def test_array_parameter_needs_a_list_of_strings(schemas, items):
+    assert fields(schemas["skill-item"].check({"items": items})) == [("items", "'items' must be a list of strings")]
+
+@pytest.mark.parametrize("description", [{"text": "x"}, ["a", 1], [["a"]]])
+def test_content_parameter_needs_text_or_string_list(schemas, description):
+    assert fields(schemas["experience"].check({"description": description})) == [
+        ("description", "'description' must be text or a list of strings")
+    ]
+
+def test_string_list_for_array_parameter_is_emitted_as_array(schemas):
+    source = TypstGenerator().generate_function("skill-item", {"items": ["Python", "C#"]}, schemas["skill-item"])
+    assert 'items: ("Python", "C#", ),' in source
+
+def test_string_list_for_content_parameter_is_emitted_as_bullets(schemas):
+    source = TypstGenerator().generate_function("experience", {"description": ["a", "b"]}, schemas["experience"])
+    assert "description: [\n    - a\n    - b\n  ]," in source
@@ -1,21 +1,67 @@
 # Utility functions for the Flash Resume backend
 
-import subprocess
+import os
+import asyncio
+import hashlib
 import logging
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
-def check_typst_availability() -> tuple[bool, str]:
-    """Check if Typst is available and return version info."""
+async def check_typst_availability(timeout: float = 5) -> tuple[bool, str]:
+    """Check if Typst is available and return version info without blocking the event loop."""
     try:
-        result = subprocess.run(["typst", "--version"], capture_output=True, text=True)
-        typst_version = result.stdout.strip() if result.returncode == 0 else "unknown"
-        return result.returncode == 0, typst_version
+        process = await asyncio.create_subprocess_exec(
+            "typst", "--version",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return False, "typst --version timed out"
+        typst_version = stdout.decode().strip() if process.returncode == 0 else "unknown"
+        return process.returncode == 0, typst_version
     except Exception as e:
         logger.error(f"Error checking Typst availability: {e}")
         return False, str(e)
 
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to a default."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid integer for {name}: {value!r}")
+        return default
+
+# Lock files held for the lifetime of the process
+_claimed_locks = []
+
+def claim_startup_task(lock_path: Path) -> bool:
+    """Return True in exactly one of several processes sharing lock_path (POSIX); elsewhere always True."""
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    try:
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(lock_path, "a")
+    except OSError as e:
+        logger.warning(f"Could not open lock file {lock_path}: {e}")
+        return True
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _claimed_locks.append(handle)
+    return True
+
 def setup_logging():
     """Setup logging configuration."""
     logging.basicConfig(
@@ -33,3 +79,46 @@ def validate_template_structure(template_dir: Path) -> bool:
             return False
     
     return True
+
+def template_fingerprint(template_dir: Path) -> str:
+    """Hash the names, sizes and mtimes of a template's files into a version string."""
+    digest = hashlib.sha256()
+    for path in sorted(template_dir.rglob("*")):
+        relative = path.relative_to(template_dir)
+        if any(part.startswith('.') for part in relative.parts) or not path.is_file():
+            continue
+        stat = path.stat()
+        digest.update(f"{relative.as_posix()}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header value against a strong ETag."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def parse_byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """Parse a single-range ``bytes=`` header into inclusive offsets; None means send everything."""
+    if not range_header or not range_header.startswith("bytes=") or size == 0:
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
@@ -0,0 +1,45 @@
+# Flash Resume - standalone compile job worker
+#
+# Runs queued compile jobs outside the API process. Point both at the same SQLite
+# store and results directory, and stop the API from running jobs itself:
+#
+#   FLASH_RESUME_JOB_STORE=/var/lib/flash-resume/jobs.db FLASH_RESUME_JOB_WORKERS=0 uvicorn main:app
+#   FLASH_RESUME_JOB_STORE=/var/lib/flash-resume/jobs.db python worker.py --workers 4
+
+import os
+import asyncio
+import logging
+import argparse
+
+from utils.helpers import env_int
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Flash Resume compile jobs from a shared queue.")
+    parser.add_argument("--workers", type=int, default=env_int("FLASH_RESUME_JOB_WORKERS", os.cpu_count() or 2))
+    args = parser.parse_args()
+
+    if not os.environ.get("FLASH_RESUME_JOB_STORE"):
+        parser.error("FLASH_RESUME_JOB_STORE must point at the SQLite job store shared with the API")
+
+    # The API module wires up the same services; importing it does not start a server
+    os.environ.setdefault("FLASH_RESUME_PRECOMPUTE_THUMBNAILS", "0")
+    from main import job_queue, template_service
+
+    async def run():
+        # Template edits must change cache keys here too, as they do in the API
+        template_service.start()
+        try:
+            await job_queue.run_forever(args.workers)
+        finally:
+            await template_service.close()
+
+    logger.info(f"Running {args.workers} job workers on {os.environ['FLASH_RESUME_JOB_STORE']}")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
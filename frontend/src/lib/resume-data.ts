@@ -6,6 +6,16 @@ export interface ResumeData {
   personalInfo: PersonalInfo;
   sections: ResumeSection[];
   theme: string;
+  overrides?: TemplateOverrides;
+}
+
+// Per-request style changes applied on top of the template's conf.json
+export interface TemplateOverrides {
+  style?: Partial<TemplateStyle>;
+  formatting?: Partial<TemplateFormatting>;
+  features?: Partial<TemplateFeatures>;
+  advanced?: Partial<TemplateAdvanced>;
+  output?: Partial<TemplateOutput>;
 }
 
 export interface PersonalInfo {
@@ -74,6 +84,14 @@ export interface TemplateAdvanced {
   hyphenation: boolean;
 }
 
+// Optional post-processing of the compiled output; all off by default
+export interface TemplateOutput {
+  optimize_images: boolean;
+  max_image_px: number;
+  image_quality: number;
+  compress_previews: boolean;
+}
+
 export interface TemplateConfig {
   name: string;
   displayName: string;
@@ -85,6 +103,7 @@ export interface TemplateConfig {
   formatting: TemplateFormatting;
   features: TemplateFeatures;
   advanced: TemplateAdvanced;
+  output: TemplateOutput;
 }
 
 export interface TemplateInfo {
@@ -95,9 +114,12 @@ export interface TemplateInfo {
 // API service functions
 export class ResumeApiService {
   private baseUrl: string;
+  // Identifies this editor to the backend so live previews can reuse a warm compiler
+  private sessionId: string;
 
   constructor(baseUrl: string = 'http://localhost:8000') {
     this.baseUrl = baseUrl;
+    this.sessionId = crypto.randomUUID();
   }
 
   async getTemplates(): Promise<TemplateInfo[]> {
@@ -123,6 +145,7 @@ export class ResumeApiService {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'X-Preview-Session': this.sessionId,
       },
       body: JSON.stringify(resumeData),
     });
@@ -140,6 +163,9 @@ export class ResumeApiService {
 
     const response = await fetch(`${this.baseUrl}/templates/${templateName}/compile`, {
       method: 'POST',
+      headers: {
+        'X-Preview-Session': this.sessionId,
+      },
       body: formData,
     });
 
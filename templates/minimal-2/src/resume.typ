@@ -7,14 +7,14 @@
 #let config = json("../conf.json")
 
 // Theme-specific wrapper function that loads configuration from JSON
-#let minimal2-resume(author-info, body) = {
+#let minimal2-resume(author-info, body, language: "en") = {
   lib.resume(
     // Pass the full author-info object as minimal-2 expects it
     author: author-info,
     // Apply configuration from conf.json
     profile-picture: if config.features.profile_picture { image } else { none },
     date: if config.features.show_date { datetime.today().display(config.features.date_format) } else { none },
-    language: "en",
+    language: language,
     colored-headers: config.features.colored_headers,
     show-footer: config.features.show_footer,
     paper-size: config.style.paper_size,
@@ -25,10 +25,26 @@
   )
 }
 
+// Cover letter in the same style, for variants generated next to the resume
+#let minimal2-coverletter(author-info, body, language: "en") = {
+  lib.coverletter(
+    author: author-info,
+    profile-picture: if config.features.profile_picture { image } else { none },
+    date: if config.features.show_date { datetime.today().display(config.features.date_format) } else { none },
+    language: language,
+    show-footer: config.features.show_footer,
+    paper-size: config.style.paper_size,
+    accent-color: rgb(config.style.accent_color),
+    font: (config.style.primary_font,),
+    body
+  )
+}
+
 // ==============================================================================
 // PUBLIC INTERFACE - Export all functions from lib and the configured resume
 // ==============================================================================
 #let resume = minimal2-resume
+#let coverletter = minimal2-coverletter
 
 // Re-export all other functions from lib.typ
 #let education = lib.education
@@ -41,3 +57,5 @@
 #let gpa = lib.gpa
 #let certification = lib.certification
 #let skill-item = lib.skill-item
+#let letter-heading = lib.letter-heading
+#let coverletter-content = lib.coverletter-content